@@ -0,0 +1,338 @@
+"""JWT token backend with a kid key ring, parsed keys and a verified-token cache."""
+
+import os
+import json
+import time
+import base64
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+import jwt
+from jwt import algorithms, InvalidAlgorithmError, InvalidTokenError
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.asymmetric import ec, ed25519, rsa
+from django.conf import settings
+from django.utils.translation import gettext_lazy as _
+from rest_framework_simplejwt.backends import TokenBackend
+from rest_framework_simplejwt.exceptions import TokenBackendError
+from rest_framework_simplejwt.settings import api_settings
+
+logger = logging.getLogger(__name__)
+
+EC_CURVES = {"ES256": ec.SECP256R1, "ES384": ec.SECP384R1, "ES512": ec.SECP521R1}
+
+
+def prepare_key(algorithm, key):
+    """Parse a PEM key once into the key object the algorithm signs with."""
+    if not key or algorithm.startswith("HS"):
+        return key
+    return algorithms.get_default_algorithms()[algorithm].prepare_key(key)
+
+
+def key_id(public_key):
+    """Stable kid of a public key, from the SHA-256 of its DER encoding."""
+    if not hasattr(public_key, "public_bytes"):
+        return None
+
+    der = public_key.public_bytes(
+        serialization.Encoding.DER, serialization.PublicFormat.SubjectPublicKeyInfo
+    )
+    return base64.urlsafe_b64encode(hashlib.sha256(der).digest()[:12]).decode()
+
+
+def generate_key_pair(algorithm):
+    """Generate a (private, public) PEM key pair for the algorithm."""
+    if algorithm == "EdDSA":
+        private_key = ed25519.Ed25519PrivateKey.generate()
+    elif algorithm in EC_CURVES:
+        private_key = ec.generate_private_key(EC_CURVES[algorithm]())
+    elif algorithm.startswith(("RS", "PS")):
+        private_key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    else:
+        raise ValueError(f"Unsupported key ring algorithm '{algorithm}'")
+
+    private_pem = private_key.private_bytes(
+        serialization.Encoding.PEM,
+        serialization.PrivateFormat.PKCS8,
+        serialization.NoEncryption(),
+    )
+    public_pem = private_key.public_key().public_bytes(
+        serialization.Encoding.PEM, serialization.PublicFormat.SubjectPublicKeyInfo
+    )
+    return private_pem.decode(), public_pem.decode()
+
+
+class SigningKey:
+    """Parsed key of the key ring."""
+
+    def __init__(  # pylint: disable=R0913,R0917
+        self, algorithm, public_key, private_key=None, kid=None, retire_at=None
+    ):
+        self.algorithm = algorithm
+        self.public_key = prepare_key(algorithm, public_key)
+        self.private_key = prepare_key(algorithm, private_key)
+        self.kid = kid or key_id(self.public_key)
+        self.retire_at = retire_at
+
+    @classmethod
+    def from_dict(cls, data):
+        """Build the key from its key ring file entry."""
+        return cls(
+            data["alg"],
+            data["public_key"],
+            data.get("private_key"),
+            kid=data.get("kid"),
+            retire_at=data.get("retire_at"),
+        )
+
+    def is_active(self, now=None):
+        """Whether the key may still verify tokens."""
+        return self.retire_at is None or self.retire_at > (now or time.time())
+
+    def jwk(self):
+        """Public JWK of the key."""
+        jwk = algorithms.get_default_algorithms()[self.algorithm].to_jwk(
+            self.public_key, as_dict=True
+        )
+        jwk.update({"kid": self.kid, "alg": self.algorithm, "use": "sig"})
+        return jwk
+
+
+class KeyRing:
+    """Signing keys by kid, from the key ring file or the configured key pair.
+
+    The last active key with a private key signs, every active key verifies.
+    The file is checked for changes at most every RELOAD_SECONDS, and right away
+    for an unknown kid."""
+
+    RELOAD_SECONDS = 60
+
+    def __init__(self, path, algorithm, signing_key=None, verifying_key=None):
+        self.path = path
+        # Key pair from the settings, also used for tokens issued without a kid
+        self.default = (
+            SigningKey(algorithm, verifying_key or signing_key, signing_key)
+            if verifying_key or signing_key
+            else None
+        )
+        self._keys = []
+        self._mtime = None
+        self._checked_at = 0
+        self._lock = threading.Lock()
+        self.reload()
+
+    def _file_mtime(self):
+        try:
+            return os.stat(self.path).st_mtime if self.path else None
+        except FileNotFoundError:
+            return None
+
+    def reload(self, force=True):
+        """Load the keys again if the key ring file changed."""
+        now = time.time()
+        if not force and now - self._checked_at < self.RELOAD_SECONDS:
+            return
+
+        with self._lock:
+            self._checked_at = now
+            mtime = self._file_mtime()
+            if self._keys and mtime == self._mtime:
+                return
+
+            if mtime is None:
+                keys = [self.default] if self.default else []
+            else:
+                with open(self.path, encoding="utf-8") as key_file:
+                    keys = [
+                        SigningKey.from_dict(k) for k in json.load(key_file)["keys"]
+                    ]
+                logger.info("Loaded %s JWT keys from %s", len(keys), self.path)
+
+            self._keys = keys
+            self._mtime = mtime
+
+    def signing_key(self):
+        """Key new tokens are signed with."""
+        self.reload(force=False)
+        for key in reversed(self._keys):
+            if key.private_key and key.retire_at is None:
+                return key
+        raise TokenBackendError(_("No signing key available"))
+
+    def verifying_key(self, kid):
+        """Active key for the token's kid, tokens without one use the default key."""
+        if kid is None:
+            kid = self.default.kid if self.default else None
+
+        self.reload(force=False)
+        key = self._find(kid)
+        if key is None:
+            self.reload()
+            key = self._find(kid)
+        return key
+
+    def _find(self, kid):
+        now = time.time()
+        for key in self._keys:
+            if key.kid == kid and key.is_active(now):
+                return key
+        return None
+
+    def active_keys(self):
+        """Keys that still verify tokens."""
+        self.reload(force=False)
+        now = time.time()
+        return [key for key in self._keys if key.is_active(now)]
+
+    def jwks(self):
+        """JWK set of the active public keys."""
+        return {"keys": [key.jwk() for key in self.active_keys() if key.kid]}
+
+
+class VerifiedTokenCache:
+    """Bounded LRU of verified token payloads, each kept until the token's exp."""
+
+    def __init__(self, max_size):
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _key(token):
+        if isinstance(token, str):
+            token = token.encode()
+        return hashlib.sha256(token).digest()
+
+    def get(self, token):
+        """Return a copy of the cached payload, or None if missing or expired."""
+        key = self._key(token)
+
+        with self._lock:
+            payload = self._entries.get(key)
+
+            if payload is not None and payload["exp"] > time.time():
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return dict(payload)
+
+            if payload is not None:
+                del self._entries[key]
+            self.misses += 1
+            return None
+
+    def set(self, token, payload):
+        """Remember a verified payload, evicting the least recently used one."""
+        if self.max_size <= 0 or not isinstance(payload.get("exp"), (int, float)):
+            return
+
+        key = self._key(token)
+
+        with self._lock:
+            self._entries[key] = dict(payload)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        """Drop every entry and reset the counters."""
+        with self._lock:
+            self._entries.clear()
+            self.hits = 0
+            self.misses = 0
+
+    def stats(self):
+        """Hit/miss counters of this process."""
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / total if total else 0.0,
+                "size": len(self._entries),
+                "max_size": self.max_size,
+            }
+
+
+class CachedTokenBackend(TokenBackend):
+    """Token backend signing with the key ring, parsing the keys once per process
+    and skipping the signature check for tokens it already verified."""
+
+    def __init__(self, *args, cache_size=0, key_ring_file=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.key_ring = KeyRing(
+            key_ring_file, self.algorithm, self.signing_key, self.verifying_key
+        )
+        self.verified = VerifiedTokenCache(cache_size)
+
+    def encode(self, payload):
+        key = self.key_ring.signing_key()
+        jwt_payload = payload.copy()
+        if self.audience is not None:
+            jwt_payload["aud"] = self.audience
+        if self.issuer is not None:
+            jwt_payload["iss"] = self.issuer
+
+        return jwt.encode(
+            jwt_payload,
+            key.private_key,
+            algorithm=key.algorithm,
+            headers={"kid": key.kid} if key.kid else None,
+            json_encoder=self.json_encoder,
+        )
+
+    def decode(self, token, verify=True):
+        if not verify:
+            return super().decode(token, verify=False)
+
+        payload = self.verified.get(token)
+
+        if payload is None:
+            payload = self.verify(token)
+            self.verified.set(token, payload)
+
+        return payload
+
+    def verify(self, token):
+        """Verify the token with the key ring key named by its kid."""
+        try:
+            kid = jwt.get_unverified_header(token).get("kid")
+            key = self.key_ring.verifying_key(kid)
+            if key is None:
+                raise TokenBackendError(_("Token is invalid or expired"))
+
+            return jwt.decode(
+                token,
+                key.public_key,
+                algorithms=[key.algorithm],
+                audience=self.audience,
+                issuer=self.issuer,
+                leeway=self.get_leeway(),
+                options={"verify_aud": self.audience is not None},
+            )
+        except InvalidAlgorithmError as ex:
+            raise TokenBackendError(_("Invalid algorithm specified")) from ex
+        except InvalidTokenError as ex:
+            raise TokenBackendError(_("Token is invalid or expired")) from ex
+
+    def stats(self):
+        """Verified-token cache metrics, logged for the process."""
+        stats = self.verified.stats()
+        logger.info("JWT verified-token cache: %s", stats)
+        return stats
+
+
+token_backend = CachedTokenBackend(
+    api_settings.ALGORITHM,
+    api_settings.SIGNING_KEY,
+    api_settings.VERIFYING_KEY,
+    api_settings.AUDIENCE,
+    api_settings.ISSUER,
+    api_settings.JWK_URL,
+    api_settings.LEEWAY,
+    api_settings.JSON_ENCODER,
+    cache_size=settings.JWT_VERIFIED_TOKEN_CACHE_SIZE,
+    key_ring_file=settings.JWT_KEY_RING_FILE,
+)
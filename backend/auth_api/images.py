@@ -0,0 +1,132 @@
+"""Profile image variants, made upright, stripped of metadata and resized."""
+
+import io
+from pathlib import PurePosixPath
+from PIL import Image, ImageOps
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from core_db.storage import MediaURLs
+
+VARIANT_PREFIX = "profile_images/variants/"
+
+# Pillow format and save options of each variant format, WebP with a JPEG fallback
+VARIANT_FORMATS = {
+    "webp": ("WEBP", "webp", {"quality": 80, "method": 4}),
+    "jpeg": ("JPEG", "jpg", {"quality": 85, "optimize": True, "progressive": True}),
+}
+
+
+def open_image(data):
+    """Decode the image upright, without its metadata (EXIF, GPS, ICC, comments)."""
+    with Image.open(io.BytesIO(data)) as image:
+        image = ImageOps.exif_transpose(image)
+        has_alpha = "A" in image.getbands() or "transparency" in image.info
+        image = image.convert("RGBA" if has_alpha else "RGB")
+
+    image.info = {}
+    return image
+
+
+def square(image, size):
+    """Center crop of the image resized to size, never upscaled."""
+    size = min(size, *image.size)
+    return ImageOps.fit(image, (size, size), Image.Resampling.LANCZOS)
+
+
+def encode(image, variant_format):
+    """Encode the image in one of VARIANT_FORMATS."""
+    pil_format, _, options = VARIANT_FORMATS[variant_format]
+
+    if pil_format == "JPEG" and image.mode == "RGBA":
+        background = Image.new("RGB", image.size, "white")
+        background.paste(image, mask=image.getchannel("A"))
+        image = background
+
+    output = io.BytesIO()
+    image.save(output, pil_format, **options)
+    return output.getvalue()
+
+
+def render_variants(data, sizes=None):
+    """Encoded variants of the image, {size: {format: bytes}}."""
+    image = open_image(data)
+    variants = {}
+
+    for size in sizes or settings.PROFILE_IMAGE_SIZES:
+        resized = square(image, size)
+        variants[str(size)] = {
+            variant_format: encode(resized, variant_format)
+            for variant_format in VARIANT_FORMATS
+        }
+
+    return variants
+
+
+def save_variants(name, variants):
+    """Store the rendered variants of the image at name.
+
+    Returns the names to keep on the user, {"source": name, size: {format: name}}."""
+    stem = PurePosixPath(name).stem
+    stored = {"source": name}
+
+    for size, encoded in variants.items():
+        stored[size] = {
+            variant_format: default_storage.save(
+                f"{VARIANT_PREFIX}{stem}_{size}.{VARIANT_FORMATS[variant_format][1]}",
+                ContentFile(content),
+            )
+            for variant_format, content in encoded.items()
+        }
+
+    return stored
+
+
+def delete_variants(stored):
+    """Delete the stored variants of an image."""
+    for size, names in (stored or {}).items():
+        if size != "source":
+            for variant_name in names.values():
+                default_storage.delete(variant_name)
+
+
+def discard_profile_image(name, variants):
+    """Delete a replaced profile image and its variants, unless it is a
+    default image."""
+    if name and name not in settings.DEFAULT_PROFILE_IMAGES:
+        default_storage.delete(name)
+
+    # The variants of the previous image go with it
+    delete_variants(variants)
+
+
+def variant_urls(user):
+    """URLs of the user's profile image variants, {size: {format: url}}.
+
+    None until the current image is processed."""
+    variants = user.profile_img_variants or {}
+    if not user.profile_img or variants.get("source") != user.profile_img.name:
+        return None
+
+    return {
+        size: {
+            variant_format: MediaURLs.url(variant_name)
+            for variant_format, variant_name in names.items()
+        }
+        for size, names in variants.items()
+        if size != "source"
+    }
+
+
+def profile_image_url(user):
+    """URL of the user's profile image, the largest fallback variant once
+    processed, else the original (or the provider's URL)."""
+    if not user.profile_img:
+        return None
+
+    urls = variant_urls(user)
+    if urls:
+        return urls[max(urls, key=int)]["jpeg"]
+    if user.profile_img.name.startswith("http"):
+        return user.profile_img.name
+    return MediaURLs.url(user.profile_img.name)
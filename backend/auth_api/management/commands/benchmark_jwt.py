@@ -0,0 +1,87 @@
+"""Microbenchmark of JWT signing and verification."""
+
+import timeit
+from functools import partial
+from django.core.management.base import BaseCommand
+from rest_framework_simplejwt.backends import TokenBackend
+from rest_framework_simplejwt.settings import api_settings
+from auth_api.backends import CachedTokenBackend, generate_key_pair, token_backend
+from auth_api.tokens import ClaimsAccessToken
+
+
+class Command(BaseCommand):
+    """Compare the default token backend with the cached one, and the algorithms."""
+
+    help = "Benchmark JWT encoding and decoding with and without the key caches."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--number", type=int, default=1000)
+        parser.add_argument(
+            "--algorithms",
+            default="RS256,ES256,EdDSA",
+            help="Comma separated algorithms to compare with fresh keys.",
+        )
+
+    def report(self, label, seconds, number):
+        """Write the time per operation and the throughput."""
+        self.stdout.write(
+            f"{label:<40} {seconds / number * 1e6:10.1f} us/op"
+            f" {number / seconds:12.0f} ops/s"
+        )
+
+    def handle(self, *args, **options):
+        number = options["number"]
+        backend = TokenBackend(
+            api_settings.ALGORITHM, api_settings.SIGNING_KEY, api_settings.VERIFYING_KEY
+        )
+        token = ClaimsAccessToken()
+        token["user_id"] = 1
+        payload = token.payload
+        encoded = str(token)
+
+        self.stdout.write(f"Configured keys ({api_settings.ALGORITHM})")
+        self.report(
+            "encode (PEM key)",
+            timeit.timeit(lambda: backend.encode(payload), number=number),
+            number,
+        )
+        self.report(
+            "encode (parsed key)",
+            timeit.timeit(lambda: token_backend.encode(payload), number=number),
+            number,
+        )
+        self.report(
+            "decode (PEM key)",
+            timeit.timeit(lambda: backend.decode(encoded), number=number),
+            number,
+        )
+        self.report(
+            "decode (parsed key)",
+            timeit.timeit(lambda: token_backend.verify(encoded), number=number),
+            number,
+        )
+
+        token_backend.verified.clear()
+        self.report(
+            "decode (parsed key, verified cache)",
+            timeit.timeit(lambda: token_backend.decode(encoded), number=number),
+            number,
+        )
+        self.stdout.write(str(token_backend.stats()))
+
+        for algorithm in options["algorithms"].split(","):
+            private_pem, public_pem = generate_key_pair(algorithm)
+            backend = CachedTokenBackend(algorithm, private_pem, public_pem)
+            encoded = backend.encode(payload)
+
+            self.stdout.write(f"\nFresh {algorithm} key, parsed")
+            self.report(
+                "encode",
+                timeit.timeit(partial(backend.encode, payload), number=number),
+                number,
+            )
+            self.report(
+                "decode",
+                timeit.timeit(partial(backend.verify, encoded), number=number),
+                number,
+            )
@@ -0,0 +1,109 @@
+"""Generate a new JWT signing key and retire the current ones."""
+
+import os
+import json
+import time
+import tempfile
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from rest_framework_simplejwt.settings import api_settings
+from auth_api.backends import SigningKey, generate_key_pair
+
+
+class Command(BaseCommand):
+    """Rotate the keys of the JWT key ring file."""
+
+    help = (
+        "Add a new JWT signing key to the key ring. The current keys keep "
+        "verifying tokens during the overlap window, expired keys are removed."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--algorithm",
+            default=api_settings.ALGORITHM,
+            help="Algorithm of the new key (EdDSA, ES256, RS256, ...).",
+        )
+        parser.add_argument(
+            "--overlap",
+            type=int,
+            default=int(api_settings.REFRESH_TOKEN_LIFETIME.total_seconds()),
+            help="Seconds the current keys keep verifying tokens.",
+        )
+
+    def load_keys(self, path):
+        """Keys of the key ring file, seeded with the configured key pair."""
+        if os.path.exists(path):
+            with open(path, encoding="utf-8") as key_file:
+                return json.load(key_file)["keys"]
+
+        if not api_settings.VERIFYING_KEY or not api_settings.SIGNING_KEY:
+            return []
+
+        # Tokens signed with the settings key pair stay valid during the overlap
+        key = SigningKey(
+            api_settings.ALGORITHM, api_settings.VERIFYING_KEY, api_settings.SIGNING_KEY
+        )
+        return [
+            {
+                "kid": key.kid,
+                "alg": key.algorithm,
+                "private_key": api_settings.SIGNING_KEY,
+                "public_key": api_settings.VERIFYING_KEY,
+                "created_at": None,
+                "retire_at": None,
+            }
+        ]
+
+    def save_keys(self, path, keys):
+        """Replace the key ring file atomically, readable by the owner only."""
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        descriptor, temp_path = tempfile.mkstemp(dir=directory)
+
+        try:
+            with os.fdopen(descriptor, "w", encoding="utf-8") as key_file:
+                json.dump({"keys": keys}, key_file, indent=2)
+            os.chmod(temp_path, 0o600)
+            os.replace(temp_path, path)
+        except BaseException:
+            os.unlink(temp_path)
+            raise
+
+    def handle(self, *args, **options):
+        path = settings.JWT_KEY_RING_FILE
+        if not path:
+            raise CommandError("JWT_KEY_RING_FILE is not set")
+
+        try:
+            private_pem, public_pem = generate_key_pair(options["algorithm"])
+        except ValueError as e:
+            raise CommandError(str(e)) from e
+
+        now = int(time.time())
+        keys = []
+        for key in self.load_keys(path):
+            if key.get("retire_at") is None:
+                key["retire_at"] = now + options["overlap"]
+            if key["retire_at"] > now:
+                keys.append(key)
+
+        new_key = SigningKey(options["algorithm"], public_pem, private_pem)
+        keys.append(
+            {
+                "kid": new_key.kid,
+                "alg": new_key.algorithm,
+                "private_key": private_pem,
+                "public_key": public_pem,
+                "created_at": now,
+                "retire_at": None,
+            }
+        )
+        self.save_keys(path, keys)
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Signing with {new_key.algorithm} key {new_key.kid}, "
+                f"{len(keys) - 1} previous key(s) verify until retired"
+            )
+        )
@@ -1,37 +1,54 @@
 """Custom user creation pipeline function."""
 
+from functools import partial
+from django.conf import settings
 from django.contrib.auth import get_user_model
 from django.contrib.auth.models import BaseUserManager
+from django.db import transaction
 from rest_framework.response import Response
 from rest_framework import status
+from .tasks import import_profile_image
+
+
+def _profile_image_url(provider, response):
+    # Avatar URL of the provider response
+    if provider == "google-oauth2":
+        picture = response.get("picture")
+        if picture:
+            return picture.replace("=s96-c", f"=s{settings.SOCIAL_AVATAR_SIZE}-c")
+    elif provider in ["facebook", "instagram"]:
+        image_data = response.get("picture")
+        if image_data:
+            return image_data["data"]["url"]
+    elif provider == "github":
+        return response.get("avatar_url")
+    return None
 
 
 def _set_profile_image(provider, user, response, update=True):
-    # Set or update the Image
+    # Set or update the Image, the avatar itself is imported by a task
     profile_image = user.profile_img
     if profile_image and str(profile_image).startswith("https://localhost"):
         update = False
 
     if update is True:
-        profile_img_url = None
-        if provider == "google-oauth2":
-            picture = response.get("picture")
-            if picture:
-                profile_img_url = picture.replace("=s96-c", "=s720-c")
-        elif provider in ["facebook", "instagram"]:
-            image_data = response.get("picture")
-            if image_data:
-                profile_img_url = image_data["data"]["url"]
-        elif provider == "github":
-            profile_img_url = response.get("avatar_url")
-
-        if profile_img_url is None:
+        profile_img_url = _profile_image_url(provider, response)
+
+        # Same avatar as the last login, nothing to write
+        if user.pk and profile_img_url == user.profile_img_source:
+            return user
+
+        user.profile_img_source = profile_img_url
+        if profile_img_url is None or not user.profile_img:
             user.profile_img = "profile_images/default.png"
-        elif profile_img_url != user.profile_img:
-            user.profile_img = profile_img_url
 
         user.save()
 
+        if profile_img_url is not None:
+            transaction.on_commit(
+                partial(import_profile_image.delay, user.id, profile_img_url)
+            )
+
     return user
 
 
@@ -0,0 +1,102 @@
+"""Cached auth principals (user snapshot and role) used by the auth views."""
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db.models import Case, CharField, Exists, OuterRef, Value, When
+
+PRINCIPAL_FIELDS = (
+    "id",
+    "email",
+    "auth_provider",
+    "is_active",
+    "is_staff",
+    "is_superuser",
+    "is_email_verified",
+    "is_two_fa",
+)
+PRINCIPAL_TIMEOUT = 60 * 60  # 1 hour, signals invalidate it on every change
+
+# Checked in order, the first group the user belongs to is the role
+ROLE_GROUPS = ("Default", "Admin", "Superuser")
+DEFAULT_ROLE = "UnAuthorized"
+
+
+def role_expression():
+    """Resolve the user's role inside the user query itself."""
+    memberships = get_user_model().groups.through.objects.filter(user_id=OuterRef("pk"))
+
+    return Case(
+        *[
+            When(Exists(memberships.filter(group__name=group)), then=Value(group))
+            for group in ROLE_GROUPS
+        ],
+        default=Value(DEFAULT_ROLE),
+        output_field=CharField(),
+    )
+
+
+def with_role(queryset):
+    """Annotate a user queryset with the role of each user."""
+    return queryset.annotate(role=role_expression())
+
+
+class Principal:
+    """Compact snapshot of a user and its role."""
+
+    def __init__(self, **snapshot):
+        for field in PRINCIPAL_FIELDS:
+            setattr(self, field, snapshot.get(field))
+        self.role = snapshot.get("role", DEFAULT_ROLE)
+
+    @property
+    def pk(self):
+        """Primary key of the user."""
+        return self.id
+
+    def as_user(self):
+        """Unsaved user instance carrying the snapshot (e.g. for token creation).
+        It is not loaded from the database and must not be saved."""
+        return get_user_model()(
+            **{field: getattr(self, field) for field in PRINCIPAL_FIELDS}
+        )
+
+
+def principal_key(user_id):
+    """Cache key of the user's principal."""
+    return f"principal_{user_id}"
+
+
+def get_principal(user_id):
+    """Return the user's principal from the cache, loading it in one query."""
+    snapshot = cache.get(principal_key(user_id))
+
+    if snapshot is None:
+        snapshot = (
+            with_role(get_user_model().objects.filter(id=user_id))
+            .values(*PRINCIPAL_FIELDS, "role")
+            .first()
+        )
+
+        if snapshot is None:
+            return None
+
+        cache.set(principal_key(user_id), snapshot, timeout=PRINCIPAL_TIMEOUT)
+
+    return Principal(**snapshot)
+
+
+def get_user_role(user):
+    """Get user role, from the query annotation if present or the principal."""
+    user_role = getattr(user, "role", None)
+
+    if user_role is None:
+        principal = get_principal(user.id)
+        user_role = principal.role if principal else DEFAULT_ROLE
+
+    return user_role
+
+
+def invalidate_principals(*user_ids):
+    """Drop the cached principals of the given users."""
+    if user_ids:
+        cache.delete_many([principal_key(user_id) for user_id in user_ids])
@@ -1,7 +1,18 @@
 import re
+from django.conf import settings
 from django.contrib.auth import get_user_model
+from django.utils.translation import gettext_lazy as _
 from rest_framework import serializers
 from drf_spectacular.utils import extend_schema_field
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, TokenError
+from rest_framework_simplejwt.serializers import (
+    TokenObtainPairSerializer,
+    TokenRefreshSerializer,
+)
+from rest_framework_simplejwt.settings import api_settings
+from .images import profile_image_url, variant_urls
+from .principals import get_principal
+from .tokens import ClaimsRefreshToken
 
 # import logging
 
@@ -91,7 +102,25 @@ class PasswordResetSerializer(serializers.ModelSerializer):
         return instance
 
 
-class UserListSerializer(serializers.ModelSerializer):
+class ProfileImageFieldsMixin(metaclass=serializers.SerializerMetaclass):
+    """Profile image URL and the URLs of its resized variants."""
+
+    profile_img = serializers.SerializerMethodField()
+    profile_img_urls = serializers.SerializerMethodField()
+
+    @extend_schema_field(serializers.CharField())
+    def get_profile_img(self, obj):
+        return profile_image_url(obj)
+
+    @extend_schema_field(
+        serializers.DictField(child=serializers.DictField(child=serializers.URLField()))
+    )
+    def get_profile_img_urls(self, obj):
+        """{size: {"webp": url, "jpeg": url}}, null until the image is processed."""
+        return variant_urls(obj)
+
+
+class UserListSerializer(ProfileImageFieldsMixin, serializers.ModelSerializer):
     """List User Serializer"""
 
     class Meta:
@@ -104,6 +133,7 @@ class UserListSerializer(serializers.ModelSerializer):
             "last_name",
             "bio",
             "profile_img",
+            "profile_img_urls",
         )
         read_only_fields = (
             "id",
@@ -112,7 +142,6 @@ class UserListSerializer(serializers.ModelSerializer):
             "first_name",
             "last_name",
             "bio",
-            "profile_img",
         )
 
 
@@ -141,11 +170,9 @@ class UserActionSerializer(serializers.ModelSerializer):
         read_only_fields = ("id",)
 
 
-class UserSerializer(serializers.ModelSerializer):
+class UserSerializer(ProfileImageFieldsMixin, serializers.ModelSerializer):
     """User Serializer"""
 
-    profile_img = serializers.SerializerMethodField()
-
     class Meta:
         model = get_user_model()
         fields = (
@@ -158,6 +185,7 @@ class UserSerializer(serializers.ModelSerializer):
             "bio",
             "phone_number",
             "profile_img",
+            "profile_img_urls",
             "strikes",
             "slug",
             "is_active",
@@ -219,14 +247,6 @@ class UserSerializer(serializers.ModelSerializer):
 
         return attrs
 
-    @extend_schema_field(serializers.CharField())
-    def get_profile_img(self, obj):
-        if obj.profile_img:
-            if obj.profile_img.name.startswith("http"):
-                return obj.profile_img.name
-            return obj.profile_img.url
-        return None
-
     def create(self, validated_data):
         # Need to check this
         """Create and return a user with encrypted password."""
@@ -258,7 +278,7 @@ class UserImageSerializer(serializers.ModelSerializer):
             raise serializers.ValidationError("Profile image is required.")
 
         errors = {}
-        max_size = 2 * 1024 * 1024  # 2MB
+        max_size = settings.PROFILE_IMAGE_MAX_BYTES
         valid_file_types = ["image/jpeg", "image/png"]  # valid image types
 
         if value.size > max_size:
@@ -276,6 +296,14 @@ class UserImageSerializer(serializers.ModelSerializer):
         return value
 
 
+class ImagePresignSerializer(serializers.Serializer):  # pylint: disable=W0223
+    content_type = serializers.CharField(required=True)
+
+
+class ImageConfirmSerializer(serializers.Serializer):  # pylint: disable=W0223
+    upload_id = serializers.CharField(required=True)
+
+
 class RecaptchaSerializer(serializers.Serializer):  # pylint: disable=W0223
     recaptcha_token = serializers.CharField(required=True)
 
@@ -338,3 +366,45 @@ class UpdateUserSerializer(serializers.Serializer):  # pylint: disable=W0223
 class SocialOAuthSerializer(serializers.Serializer):  # pylint: disable=W0223
     token = serializers.CharField(required=True)
     provider = serializers.CharField(required=True)
+
+
+class ClaimsTokenObtainPairSerializer(
+    TokenObtainPairSerializer
+):  # pylint: disable=W0223
+    """Token pair serializer stamping the user claims on the tokens."""
+
+    token_class = ClaimsRefreshToken
+
+
+class ClaimsTokenRefreshSerializer(TokenRefreshSerializer):  # pylint: disable=W0223
+    """Refresh serializer checking the cached principal instead of the user row,
+    the claims are stamped again so role or status changes reach the new tokens."""
+
+    token_class = ClaimsRefreshToken
+
+    def validate(self, attrs):
+        refresh = self.token_class(attrs["refresh"])
+        principal = get_principal(refresh.payload.get(api_settings.USER_ID_CLAIM))
+
+        if principal is None or not principal.is_active:
+            raise AuthenticationFailed(
+                self.error_messages["no_active_account"],
+                "no_active_account",
+            )
+
+        refresh.set_user_claims(principal)
+        data = {"access": str(refresh.access_token)}
+
+        if api_settings.ROTATE_REFRESH_TOKENS:
+            # Only one of the refreshes racing with the same token rotates it
+            if api_settings.BLACKLIST_AFTER_ROTATION and not refresh.blacklist():
+                raise TokenError(_("Token is blacklisted"))
+
+            refresh.set_jti()
+            refresh.set_exp()
+            refresh.set_iat()
+            refresh.outstand()
+
+            data["refresh"] = str(refresh)
+
+        return data
@@ -0,0 +1,79 @@
+"""Signals keeping the cached auth principals and token claims up to date"""
+
+from django.db.models.signals import (
+    post_init,
+    post_save,
+    post_delete,
+    m2m_changed,
+    pre_delete,
+)
+from django.contrib.auth.models import Group
+from django.dispatch import receiver
+from core_db.models import User
+from .principals import invalidate_principals
+from .tokens import CLAIM_FIELDS, revoke_user_tokens
+
+
+def invalidate_users(*user_ids, revoke=True):
+    """Drop the cached principals and, if the claims changed, the issued tokens"""
+    invalidate_principals(*user_ids)
+    if revoke:
+        revoke_user_tokens(*user_ids)
+
+
+def user_claims(instance):
+    """Claim fields of a user instance, deferred fields are skipped"""
+    return tuple(instance.__dict__.get(field) for field in CLAIM_FIELDS)
+
+
+@receiver(post_init, sender=User)
+def remember_user_claims(sender, instance, **kwargs):  # pylint: disable=unused-argument
+    """Keep the loaded claims to detect changes on save"""
+    instance._loaded_claims = user_claims(instance)  # pylint: disable=W0212
+
+
+@receiver(post_save, sender=User)
+def invalidate_user_principal(
+    sender, instance, created, **kwargs
+):  # pylint: disable=unused-argument
+    """Drop the cached principal when the user changes, and the tokens when its
+    claims changed"""
+    claims = user_claims(instance)
+    changed = not created and claims != instance._loaded_claims  # pylint: disable=W0212
+    instance._loaded_claims = claims  # pylint: disable=W0212
+    invalidate_users(instance.pk, revoke=changed)
+
+
+@receiver(post_delete, sender=User)
+def invalidate_deleted_user(
+    sender, instance, **kwargs
+):  # pylint: disable=unused-argument
+    """Drop the cached principal and the tokens of a deleted user"""
+    invalidate_users(instance.pk)
+
+
+@receiver(m2m_changed, sender=User.groups.through)
+def invalidate_membership_principals(
+    sender, instance, action, reverse, pk_set, **kwargs
+):  # pylint: disable=unused-argument
+    """Drop the cached principals and tokens when group memberships change"""
+    if reverse and action == "pre_clear":
+        # group.user_set.clear(), members are gone after the clear
+        invalidate_users(*instance.user_set.values_list("id", flat=True))
+    elif action in ("post_add", "post_remove", "post_clear"):
+        if reverse:
+            # group.user_set.add(...) or group.user_set.remove(...)
+            invalidate_users(*(pk_set or ()))
+        else:
+            # user.groups.add(...), user.groups.remove(...) or user.groups.clear()
+            invalidate_users(instance.pk)
+
+
+@receiver(post_save, sender=Group)
+@receiver(pre_delete, sender=Group)
+def invalidate_group_principals(
+    sender, instance, **kwargs
+):  # pylint: disable=unused-argument
+    """Drop the cached principals and tokens of a renamed or deleted group's members"""
+    if instance.pk:
+        invalidate_users(*instance.user_set.values_list("id", flat=True))
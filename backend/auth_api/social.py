@@ -0,0 +1,212 @@
+"""Async provider calls of the social login, with cached provider metadata."""
+
+import time
+import hmac
+import asyncio
+import hashlib
+import weakref
+from urllib.parse import urljoin
+import jwt
+import aiohttp
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from social_core.exceptions import (
+    AuthCanceled,
+    AuthForbidden,
+    AuthUnreachableProvider,
+)
+from social_core.backends.facebook import API_VERSION as FACEBOOK_API_VERSION
+
+GOOGLE_ISSUERS = ["https://accounts.google.com", "accounts.google.com"]
+
+
+class ProviderMetadata:
+    """Discovery documents and JWKS of the providers, kept in the process for
+    METADATA_TIMEOUT seconds (they change a few times a year)."""
+
+    METADATA_TIMEOUT = settings.SOCIAL_AUTH_METADATA_TIMEOUT
+
+    _documents = {}
+
+    @classmethod
+    async def get(cls, session, url, refresh=False):
+        """Return the JSON document at url, fetching it when missing or stale."""
+        cached = cls._documents.get(url)
+        if cached is not None and not refresh and cached[0] > time.monotonic():
+            return cached[1]
+
+        async with session.get(url) as response:
+            document = await response.json(content_type=None)
+        cls._documents[url] = (time.monotonic() + cls.METADATA_TIMEOUT, document)
+        return document
+
+    @classmethod
+    def clear(cls):
+        """Forget every cached document."""
+        cls._documents.clear()
+
+
+class SocialProviders:
+    """Fetches the user data of a social login without blocking the event loop.
+
+    Google, Facebook and GitHub are called with aiohttp over one keep-alive
+    session per event loop, Google ID tokens are verified locally with the
+    cached JWKS. Other backends fall back to their own (blocking) user_data in
+    a thread."""
+
+    GOOGLE_DISCOVERY_URL = settings.SOCIAL_AUTH_GOOGLE_DISCOVERY_URL
+    TIMEOUT = settings.SOCIAL_AUTH_PROVIDER_TIMEOUT  # seconds per provider call
+
+    _sessions = weakref.WeakKeyDictionary()
+
+    @classmethod
+    def session(cls):
+        """Keep-alive session of the running event loop."""
+        loop = asyncio.get_running_loop()
+        session = cls._sessions.get(loop)
+        if session is None or session.closed:
+            session = aiohttp.ClientSession(
+                timeout=aiohttp.ClientTimeout(total=cls.TIMEOUT),
+                raise_for_status=True,
+            )
+            cls._sessions[loop] = session
+        return session
+
+    @classmethod
+    async def close(cls):
+        """Close the session of the running event loop (e.g. when the loop only
+        lives for one request under WSGI)."""
+        session = cls._sessions.pop(asyncio.get_running_loop(), None)
+        if session is not None:
+            await session.close()
+
+    @classmethod
+    async def user_data(cls, backend, token):
+        """Provider response of the token, as backend.do_auth builds it."""
+        fetchers = {
+            "google-oauth2": cls._google,
+            "facebook": cls._facebook,
+            "github": cls._github,
+        }
+        fetch = fetchers.get(backend.name)
+
+        try:
+            if fetch is None:
+                data = await sync_to_async(backend.user_data, thread_sensitive=False)(
+                    token
+                )
+            else:
+                data = await fetch(cls.session(), backend, token)
+        except aiohttp.ClientResponseError as e:
+            # Same mapping as social_core's handle_http_errors
+            if e.status == 400:
+                raise AuthCanceled(backend) from e
+            if e.status == 401:
+                raise AuthForbidden(backend) from e
+            if e.status == 503:
+                raise AuthUnreachableProvider(backend) from e
+            raise
+        except (aiohttp.ClientConnectionError, asyncio.TimeoutError) as e:
+            raise AuthUnreachableProvider(backend) from e
+
+        response = dict(data or {})
+        response.setdefault("access_token", token)
+        return response
+
+    @staticmethod
+    async def _get_json(session, url, **kwargs):
+        async with session.get(url, **kwargs) as response:
+            return await response.json(content_type=None)
+
+    @classmethod
+    async def _google(cls, session, backend, token):
+        discovery = await ProviderMetadata.get(session, cls.GOOGLE_DISCOVERY_URL)
+
+        try:
+            header = jwt.get_unverified_header(token)
+        except jwt.DecodeError:
+            header = None
+
+        # An access token, the profile comes from the userinfo endpoint
+        if header is None:
+            return await cls._get_json(
+                session,
+                discovery["userinfo_endpoint"],
+                headers={"Authorization": f"Bearer {token}"},
+            )
+
+        # An ID token, verified with the cached keys instead of calling Google
+        jwks = await ProviderMetadata.get(session, discovery["jwks_uri"])
+        key = cls._find_key(jwks, header.get("kid"))
+        if key is None:
+            # Google rotated its keys since they were cached
+            jwks = await ProviderMetadata.get(
+                session, discovery["jwks_uri"], refresh=True
+            )
+            key = cls._find_key(jwks, header.get("kid"))
+        if key is None:
+            raise AuthForbidden(backend)
+
+        try:
+            return jwt.decode(
+                token,
+                key,
+                algorithms=["RS256"],
+                audience=backend.setting("KEY"),
+                issuer=GOOGLE_ISSUERS,
+            )
+        except jwt.InvalidTokenError as e:
+            raise AuthForbidden(backend) from e
+
+    @staticmethod
+    def _find_key(jwks, kid):
+        for jwk in jwks.get("keys", []):
+            if jwk.get("kid") == kid:
+                return jwt.PyJWK(jwk).key
+        return None
+
+    @classmethod
+    async def _facebook(cls, session, backend, token):
+        params = backend.setting("PROFILE_EXTRA_PARAMS", {}).copy()
+        params["access_token"] = token
+
+        if backend.setting("APPSECRET_PROOF", True):
+            _, secret = backend.get_key_and_secret()
+            params["appsecret_proof"] = hmac.new(
+                secret.encode("utf8"),
+                msg=token.encode("utf8"),
+                digestmod=hashlib.sha256,
+            ).hexdigest()
+
+        version = backend.setting("API_VERSION", FACEBOOK_API_VERSION)
+        return await cls._get_json(
+            session, backend.USER_DATA_URL.format(version=version), params=params
+        )
+
+    @classmethod
+    async def _github(cls, session, backend, token):
+        headers = {"Authorization": f"token {token}"}
+        data = await cls._get_json(
+            session, urljoin(backend.api_url(), "user"), headers=headers
+        )
+
+        if not data.get("email"):
+            try:
+                emails = await cls._get_json(
+                    session, urljoin(backend.api_url(), "user/emails"), headers=headers
+                )
+            except (aiohttp.ClientError, ValueError):
+                emails = []
+
+            if emails:
+                email = emails[0]
+                primary_emails = [
+                    e for e in emails if not isinstance(e, dict) or e.get("primary")
+                ]
+                if primary_emails:
+                    email = primary_emails[0]
+                if isinstance(email, dict):
+                    email = email.get("email", "")
+                data["email"] = email
+
+        return data
@@ -0,0 +1,226 @@
+import time
+import hashlib
+import smtplib
+import logging
+import threading
+import requests
+from PIL import Image, UnidentifiedImageError
+from celery import shared_task
+from celery.signals import worker_process_shutdown
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.mail import EmailMessage, get_connection
+from django.utils.timezone import now
+from .images import (
+    delete_variants,
+    discard_profile_image,
+    encode,
+    open_image,
+    render_variants,
+    save_variants,
+    square,
+)
+from .token_state import RedisTokenState
+
+
+logger = logging.getLogger(__name__)
+
+
+class EmailConnection:
+    """SMTP connection shared by the email tasks of a worker process.
+
+    The session is opened once and reused by `send_messages`, it is reopened
+    after MAX_AGE_SECONDS or when the server dropped it.
+    """
+
+    MAX_AGE_SECONDS = settings.EMAIL_CONNECTION_MAX_AGE
+    _connection = None
+    _opened_at = 0
+    _lock = threading.Lock()
+
+    @classmethod
+    def _get(cls):
+        """Open connection, created on first use."""
+        if (
+            cls._connection is None
+            or time.monotonic() - cls._opened_at > cls.MAX_AGE_SECONDS
+        ):
+            cls.close()
+            cls._connection = get_connection()
+            cls._connection.open()
+            cls._opened_at = time.monotonic()
+        return cls._connection
+
+    @classmethod
+    def send_messages(cls, messages):
+        """Send the messages over the shared connection."""
+        with cls._lock:
+            try:
+                return cls._get().send_messages(messages)
+            except (smtplib.SMTPServerDisconnected, ConnectionError):
+                # The server closed the idle session, retry once on a new one
+                cls.close()
+                return cls._get().send_messages(messages)
+
+    @classmethod
+    def close(cls):
+        """Close the shared connection."""
+        if cls._connection is not None:
+            try:
+                cls._connection.close()
+            except Exception as e:  # pylint: disable=W0718
+                logger.warning("Error closing email connection: %s", e)
+            cls._connection = None
+
+
+@worker_process_shutdown.connect
+def close_email_connection(**kwargs):  # pylint: disable=unused-argument
+    """Close the shared SMTP connection with the worker process."""
+    EmailConnection.close()
+
+
+# Background task to send emails, routed to the email queue
+@shared_task(
+    autoretry_for=(smtplib.SMTPException, ConnectionError),
+    retry_backoff=True,
+    max_retries=3,
+)
+def send_emails(messages):
+    """Send the messages over the worker's shared SMTP connection."""
+    sent = EmailConnection.send_messages(
+        [
+            EmailMessage(
+                subject=message["subject"], body=message["body"], to=message["to"]
+            )
+            for message in messages
+        ]
+    )
+    logger.info("Sent %s of %s emails", sent, len(messages))
+    return sent
+
+
+# Background task to archive the Redis refresh token state to the database
+@shared_task
+def archive_refresh_tokens():
+    """Write the queued refresh token records to the token_blacklist tables."""
+    if not settings.TOKEN_STATE_ARCHIVE:
+        return 0
+
+    token_state = RedisTokenState(archive=True)
+    archived = 0
+
+    while True:
+        count = token_state.archive_pending(settings.TOKEN_ARCHIVE_BATCH_SIZE)
+        archived += count
+        if count < settings.TOKEN_ARCHIVE_BATCH_SIZE:
+            break
+
+    logger.info("Archived %s refresh token records", archived)
+    return archived
+
+
+# Imported avatars, replaced by the next import of the user
+SOCIAL_AVATAR_PREFIX = "profile_images/social/"
+
+
+def download_image(url):
+    """Download an image, refusing bodies over SOCIAL_AVATAR_MAX_BYTES."""
+    with requests.get(url, timeout=settings.SOCIAL_AVATAR_TIMEOUT, stream=True) as res:
+        res.raise_for_status()
+        data = res.raw.read(settings.SOCIAL_AVATAR_MAX_BYTES + 1, decode_content=True)
+
+    if len(data) > settings.SOCIAL_AVATAR_MAX_BYTES:
+        raise ValueError("Image is too large")
+    return data
+
+
+# Background task to store a social login avatar in the media storage
+@shared_task(
+    autoretry_for=(requests.ConnectionError, requests.Timeout),
+    retry_backoff=True,
+    max_retries=3,
+)
+def import_profile_image(user_id, url):
+    """Download the provider avatar once, resize it and make it the user's
+    profile image. Skipped if a later login changed the source meanwhile."""
+    User = get_user_model()
+    if not User.objects.filter(pk=user_id, profile_img_source=url).exists():
+        return None
+
+    try:
+        image = open_image(download_image(url))
+        content = encode(square(image, settings.SOCIAL_AVATAR_SIZE), "jpeg")
+    except (requests.ConnectionError, requests.Timeout):
+        raise  # retried
+    except (
+        requests.RequestException,
+        UnidentifiedImageError,
+        OSError,
+        ValueError,
+    ) as e:
+        logger.warning("Could not import avatar of user %s: %s", user_id, e)
+        return None
+
+    previous = (
+        User.objects.filter(pk=user_id)
+        .values_list("profile_img", "profile_img_variants")
+        .first()
+    )
+    digest = hashlib.sha256(url.encode()).hexdigest()[:16]
+    name = default_storage.save(
+        f"{SOCIAL_AVATAR_PREFIX}{user_id}-{digest}.jpg", ContentFile(content)
+    )
+
+    # Conditional, a login with another avatar may have run during the download
+    updated = User.objects.filter(pk=user_id, profile_img_source=url).update(
+        profile_img=name, profile_img_variants={}, updated_at=now()
+    )
+    if not updated:
+        default_storage.delete(name)
+        return None
+
+    # Uploaded or imported before, the replaced image is released with its variants
+    if previous:
+        discard_profile_image(*previous)
+
+    logger.info("Imported avatar of user %s", user_id)
+    process_profile_image.delay(user_id, name)
+    return name
+
+
+# Background task to render the profile image variants, routed to the media queue
+@shared_task
+def process_profile_image(user_id, name):
+    """Render the variants of the user's profile image at name. Skipped if the
+    user changed the image meanwhile."""
+    User = get_user_model()
+    if not User.objects.filter(pk=user_id, profile_img=name).exists():
+        return None
+
+    try:
+        with default_storage.open(name) as image_file:
+            variants = render_variants(image_file.read())
+    except (UnidentifiedImageError, Image.DecompressionBombError, OSError) as e:
+        logger.warning("Could not process image of user %s: %s", user_id, e)
+        return None
+
+    stored = save_variants(name, variants)
+    previous = (
+        User.objects.filter(pk=user_id)
+        .values_list("profile_img_variants", flat=True)
+        .first()
+    )
+
+    # Conditional, the user may have uploaded another image meanwhile
+    updated = User.objects.filter(pk=user_id, profile_img=name).update(
+        profile_img_variants=stored, updated_at=now()
+    )
+    if not updated:
+        delete_variants(stored)
+        return None
+
+    delete_variants(previous)
+    logger.info("Processed profile image of user %s", user_id)
+    return stored
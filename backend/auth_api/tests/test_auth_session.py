@@ -0,0 +1,95 @@
+# pylint: skip-file
+
+from django.conf import settings
+from django.core.cache import cache
+from django.test import TestCase
+from auth_api.utils import AuthSession
+
+
+class AuthSessionTests(TestCase):
+    """Test the Redis backed auth session"""
+
+    def setUp(self):
+        cache.clear()
+        AuthSession.create(1, "session@example.com", 123456)
+
+    def tearDown(self):
+        cache.clear()
+
+    def test_create_session(self):
+        """All login state is stored in one hash with one TTL"""
+        session = AuthSession.get(1)
+        connection = AuthSession._connection()
+
+        self.assertEqual(session["email"], "session@example.com")
+        self.assertEqual(session["otp"], "123456")
+        self.assertEqual(session["attempts"], "0")
+        self.assertLessEqual(
+            connection.ttl(AuthSession._key(1)), AuthSession.EXPIRY_SECONDS
+        )
+        self.assertTrue(AuthSession.recently_sent(1))
+
+    def test_missing_session(self):
+        """Missing sessions return None"""
+        self.assertIsNone(AuthSession.get(2))
+        self.assertFalse(AuthSession.recently_sent(2))
+
+    def test_verify_otp_consumes_session(self):
+        """A correct OTP ends the session"""
+        AuthSession.verify_otp(1, "123456")
+        self.assertIsNone(AuthSession.get(1))
+
+        with self.assertRaisesMessage(ValueError, "Session expired"):
+            AuthSession.verify_otp(1, "123456")
+
+    def test_wrong_otp_counts_attempts(self):
+        """A wrong OTP keeps the session and increments the attempts"""
+        with self.assertRaisesMessage(ValueError, "Invalid OTP"):
+            AuthSession.verify_otp(1, "654321")
+
+        with self.assertRaisesMessage(ValueError, "Invalid OTP"):
+            AuthSession.verify_otp(1, "not-a-number")
+
+        self.assertEqual(AuthSession.get(1)["attempts"], "2")
+
+    def test_too_many_attempts(self):
+        """The session is destroyed once the attempts are used up"""
+        for _ in range(settings.MAX_OTP_ATTEMPTS - 1):
+            with self.assertRaisesMessage(ValueError, "Invalid OTP"):
+                AuthSession.verify_otp(1, "654321")
+
+        with self.assertRaisesMessage(ValueError, "Too many invalid OTP attempts"):
+            AuthSession.verify_otp(1, "654321")
+
+        # The correct OTP no longer works
+        with self.assertRaisesMessage(ValueError, "Session expired"):
+            AuthSession.verify_otp(1, "123456")
+
+    def test_new_session_replaces_old(self):
+        """Logging in again resets the OTP and the attempts"""
+        with self.assertRaisesMessage(ValueError, "Invalid OTP"):
+            AuthSession.verify_otp(1, "654321")
+
+        AuthSession.create(1, "session@example.com", 111111)
+        session = AuthSession.get(1)
+
+        self.assertEqual(session["otp"], "111111")
+        self.assertEqual(session["attempts"], "0")
+        AuthSession.verify_otp(1, "111111")
+        self.assertIsNone(AuthSession.get(1))
+
+    def test_resend_keeps_attempts(self):
+        """A resent OTP does not restore the attempts already used"""
+        for _ in range(settings.MAX_OTP_ATTEMPTS - 1):
+            with self.assertRaisesMessage(ValueError, "Invalid OTP"):
+                AuthSession.verify_otp(1, "654321")
+
+        AuthSession.resend(1, "session@example.com", 111111)
+        session = AuthSession.get(1)
+        self.assertEqual(session["otp"], "111111")
+        self.assertEqual(session["attempts"], str(settings.MAX_OTP_ATTEMPTS - 1))
+
+        with self.assertRaisesMessage(ValueError, "Too many invalid OTP attempts"):
+            AuthSession.verify_otp(1, "654321")
+        with self.assertRaisesMessage(ValueError, "Session expired"):
+            AuthSession.verify_otp(1, "111111")
@@ -0,0 +1,143 @@
+# pylint: skip-file
+
+from django.urls import reverse
+from django.contrib.auth import get_user_model
+from django.contrib.auth.models import Group
+from django.core.cache import cache
+from rest_framework import status
+from rest_framework.test import APITestCase, APIClient, APIRequestFactory
+from rest_framework_simplejwt.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.tokens import RefreshToken
+from auth_api.authentication import ClaimsJWTAuthentication, ClaimsUser
+from auth_api.tokens import ClaimsRefreshToken
+
+
+TOKEN_REFRESH_URL = reverse("token-refresh")
+USER_CATEGORY_URL = reverse("user-category")
+
+
+def create_user(**params):
+    """Create and return a new user"""
+    return get_user_model().objects.create_user(**params)
+
+
+class ClaimsAuthenticationTests(APITestCase):
+    """Test the stateless JWT authentication"""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.factory = APIRequestFactory()
+        self.user = create_user(
+            email="claims@example.com",
+            password="Django@123",
+            is_email_verified=True,
+        )
+        self.user.groups.add(Group.objects.get_or_create(name="Default")[0])
+        cache.clear()
+
+    def tearDown(self):
+        cache.clear()
+
+    def authenticate(self, token):
+        request = self.factory.get("/", HTTP_AUTHORIZATION=f"Bearer {token}")
+        return ClaimsJWTAuthentication().authenticate(request)
+
+    def test_authenticate_without_queries(self):
+        """The user is built from the token claims"""
+        token = ClaimsRefreshToken.for_user(self.user).access_token
+
+        with self.assertNumQueries(0):
+            user, _ = self.authenticate(token)
+            self.assertIsInstance(user, ClaimsUser)
+            self.assertEqual(user.id, self.user.id)
+            self.assertEqual(user.role, "Default")
+            self.assertTrue(user.is_authenticated)
+            self.assertFalse(user.is_staff)
+
+    def test_other_fields_load_the_user(self):
+        """Fields missing from the claims load the user lazily"""
+        token = ClaimsRefreshToken.for_user(self.user).access_token
+        user, _ = self.authenticate(token)
+
+        with self.assertNumQueries(1):
+            self.assertEqual(user.email, self.user.email)
+            self.assertEqual(user.email, self.user.email)
+        self.assertEqual(user, self.user)
+
+    def test_deactivation_revokes_tokens(self):
+        """Changing the user claims rejects the tokens issued before"""
+        token = ClaimsRefreshToken.for_user(self.user).access_token
+        token["iat"] -= 1
+        self.user.is_active = False
+        self.user.save()
+
+        with self.assertRaises(AuthenticationFailed):
+            self.authenticate(token)
+
+    def test_same_second_revokes_tokens(self):
+        """Tokens issued in the second of the change are rejected too"""
+        token = ClaimsRefreshToken.for_user(self.user).access_token
+        self.user.is_active = False
+        self.user.save()
+
+        with self.assertRaises(AuthenticationFailed):
+            self.authenticate(token)
+
+    def test_claims_users_equal_by_pk(self):
+        """Claims users compare by primary key, without loading the user"""
+        other = create_user(email="other@example.com", password="Django@123")
+        first, _ = self.authenticate(
+            ClaimsRefreshToken.for_user(self.user).access_token
+        )
+        second, _ = self.authenticate(
+            ClaimsRefreshToken.for_user(self.user).access_token
+        )
+        third, _ = self.authenticate(ClaimsRefreshToken.for_user(other).access_token)
+
+        with self.assertNumQueries(0):
+            self.assertEqual(first, second)
+            self.assertNotEqual(first, third)
+            self.assertEqual(first, self.user)
+            self.assertEqual(len({first, second}), 1)
+
+    def test_unrelated_save_keeps_tokens(self):
+        """Saving fields outside the claims keeps the tokens valid"""
+        token = ClaimsRefreshToken.for_user(self.user).access_token
+        token["iat"] -= 1
+        self.user.first_name = "Claims"
+        self.user.save()
+
+        user, _ = self.authenticate(token)
+        self.assertEqual(user.id, self.user.id)
+
+    def test_legacy_token_loads_the_user(self):
+        """Tokens without claims fall back to the database lookup"""
+        token = RefreshToken.for_user(self.user).access_token
+
+        with self.assertNumQueries(1):
+            user, _ = self.authenticate(token)
+        self.assertIsInstance(user, get_user_model())
+
+    def test_refresh_stamps_new_claims(self):
+        """Refreshing a token picks up role changes"""
+        refresh = ClaimsRefreshToken.for_user(self.user)
+        self.user.groups.add(Group.objects.get_or_create(name="Admin")[0])
+        self.user.groups.remove(Group.objects.get(name="Default"))
+
+        res = self.client.post(
+            TOKEN_REFRESH_URL, {"refresh": str(refresh)}, format="json"
+        )
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data["user_role"], "Admin")
+        user, _ = self.authenticate(res.data["access_token"])
+        self.assertEqual(user.role, "Admin")
+
+    def test_view_with_claims_user(self):
+        """Views work with the claims user"""
+        token = ClaimsRefreshToken.for_user(self.user).access_token
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {token}")
+
+        res = self.client.get(USER_CATEGORY_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
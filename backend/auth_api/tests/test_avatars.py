@@ -0,0 +1,179 @@
+# pylint: skip-file
+
+import io
+import shutil
+import tempfile
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from PIL import Image
+from django.contrib.auth import get_user_model
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.test import TestCase, override_settings
+from auth_api.pipeline import _set_profile_image
+from auth_api.tasks import SOCIAL_AVATAR_PREFIX, import_profile_image
+from core_db.models import MediaBlob
+
+
+User = get_user_model()
+
+
+def create_user(email="user@example.com", **kwargs):
+    """Helper function to create a user"""
+    return User.objects.create_user(
+        email=email, username=email, password="Testpass123!", **kwargs
+    )
+
+
+def image_bytes(size=(400, 300), color="red"):
+    """PNG image of the given size"""
+    output = io.BytesIO()
+    Image.new("RGB", size, color).save(output, "PNG")
+    return output.getvalue()
+
+
+class AvatarHandler(BaseHTTPRequestHandler):
+    """Stand-in for the provider's avatar CDN"""
+
+    def do_GET(self):
+        self.server.calls.append(self.path)
+        body = self.server.images.get(self.path)
+        if body is None:
+            self.send_response(404)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+
+        self.send_response(200)
+        self.send_header("Content-Type", "image/png")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+class SocialAvatarTests(TestCase):
+    """Test the import of social login avatars"""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.server = ThreadingHTTPServer(("127.0.0.1", 0), AvatarHandler)
+        cls.server.daemon_threads = True
+        threading.Thread(target=cls.server.serve_forever, daemon=True).start()
+        cls.base = f"http://127.0.0.1:{cls.server.server_port}"
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        cls.server.server_close()
+        super().tearDownClass()
+
+    def setUp(self):
+        self.server.calls = []
+        self.server.images = {
+            "/a.png": image_bytes(),
+            "/b.png": image_bytes(color="blue"),
+            "/text": b"not an image",
+        }
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root, ignore_errors=True)
+        settings_override = override_settings(MEDIA_ROOT=media_root)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        self.user = create_user(auth_provider="github")
+
+    def login(self, avatar):
+        response = {"avatar_url": f"{self.base}{avatar}"}
+        with self.captureOnCommitCallbacks(execute=True):
+            _set_profile_image("github", self.user, response)
+        self.user.refresh_from_db()
+
+    def test_import_avatar(self):
+        """The avatar is downloaded once, stored and processed"""
+        self.login("/a.png")
+
+        self.assertEqual(self.user.profile_img_source, f"{self.base}/a.png")
+        self.assertTrue(self.user.profile_img.name.startswith(SOCIAL_AVATAR_PREFIX))
+        with default_storage.open(self.user.profile_img.name) as image_file:
+            with Image.open(image_file) as image:
+                self.assertEqual(image.size, (300, 300))
+                self.assertEqual(image.format, "JPEG")
+        self.assertEqual(
+            self.user.profile_img_variants["source"], self.user.profile_img.name
+        )
+        self.assertEqual(self.server.calls, ["/a.png"])
+
+    def test_same_avatar_skips_write(self):
+        """A later login with the same avatar writes nothing"""
+        self.login("/a.png")
+
+        with self.assertNumQueries(0):
+            with self.captureOnCommitCallbacks() as callbacks:
+                _set_profile_image(
+                    "github", self.user, {"avatar_url": f"{self.base}/a.png"}
+                )
+
+        self.assertEqual(callbacks, [])
+        self.assertEqual(self.server.calls, ["/a.png"])
+
+    def test_changed_avatar(self):
+        """A new avatar replaces the imported one"""
+        self.login("/a.png")
+        previous = self.user.profile_img.name
+
+        self.login("/b.png")
+
+        self.assertNotEqual(self.user.profile_img.name, previous)
+        self.assertFalse(default_storage.exists(previous))
+        self.assertTrue(default_storage.exists(self.user.profile_img.name))
+
+    def test_uploaded_image_replaced(self):
+        """An uploaded image replaced by a social avatar is released with its
+        variants"""
+        uploaded = default_storage.save(
+            "profile_images/upload.png", ContentFile(image_bytes(color="green"))
+        )
+        variant = default_storage.save(
+            "profile_images/variants/upload.webp", ContentFile(b"webp")
+        )
+        self.user.profile_img = uploaded
+        self.user.profile_img_variants = {
+            "source": uploaded,
+            "64": {"webp": variant},
+        }
+        self.user.save()
+
+        self.login("/a.png")
+
+        self.assertTrue(self.user.profile_img.name.startswith(SOCIAL_AVATAR_PREFIX))
+        self.assertFalse(default_storage.exists(uploaded))
+        self.assertFalse(default_storage.exists(variant))
+        self.assertFalse(MediaBlob.objects.filter(name=uploaded).exists())
+
+    def test_stale_import(self):
+        """An import for an avatar replaced meanwhile is dropped"""
+        self.login("/a.png")
+        imported = self.user.profile_img.name
+
+        self.assertIsNone(import_profile_image(self.user.id, f"{self.base}/b.png"))
+
+        self.user.refresh_from_db()
+        self.assertEqual(self.user.profile_img.name, imported)
+        self.assertEqual(self.server.calls, ["/a.png"])
+
+    def test_invalid_avatar(self):
+        """Missing or invalid images keep the default image"""
+        for avatar in ("/missing.png", "/text"):
+            self.login(avatar)
+
+            self.assertEqual(self.user.profile_img.name, "profile_images/default.png")
+
+    @override_settings(SOCIAL_AVATAR_MAX_BYTES=100)
+    def test_large_avatar(self):
+        """Images over the size limit are not imported"""
+        self.login("/a.png")
+
+        self.assertEqual(self.user.profile_img.name, "profile_images/default.png")
@@ -0,0 +1,212 @@
+# pylint: skip-file
+
+import os
+import json
+import time
+import tempfile
+from unittest.mock import patch
+import jwt
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from rest_framework_simplejwt.backends import TokenBackend
+from rest_framework_simplejwt.exceptions import TokenBackendError
+from rest_framework_simplejwt.settings import api_settings
+from auth_api.backends import (
+    CachedTokenBackend,
+    KeyRing,
+    VerifiedTokenCache,
+    generate_key_pair,
+)
+
+
+JWKS_URL = reverse("jwks")
+
+
+def create_backend(cache_size=2, key_ring_file=None):
+    """Create a cached backend with the project keys"""
+    return CachedTokenBackend(
+        api_settings.ALGORITHM,
+        api_settings.SIGNING_KEY,
+        api_settings.VERIFYING_KEY,
+        cache_size=cache_size,
+        key_ring_file=key_ring_file,
+    )
+
+
+def payload(user_id, lifetime=300):
+    return {"user_id": user_id, "exp": int(time.time()) + lifetime}
+
+
+class CachedTokenBackendTests(TestCase):
+    """Test the cached JWT token backend"""
+
+    def test_keys_are_parsed_once(self):
+        """PEM keys are parsed into key objects at creation"""
+        key = create_backend().key_ring.signing_key()
+
+        self.assertNotIsInstance(key.private_key, str)
+        self.assertNotIsInstance(key.public_key, str)
+
+    def test_tokens_interoperate_with_default_backend(self):
+        """Tokens signed with parsed keys verify with the PEM keys and back"""
+        backend = create_backend()
+        default = TokenBackend(
+            api_settings.ALGORITHM, api_settings.SIGNING_KEY, api_settings.VERIFYING_KEY
+        )
+
+        self.assertEqual(default.decode(backend.encode(payload(1)))["user_id"], 1)
+        self.assertEqual(backend.decode(default.encode(payload(2)))["user_id"], 2)
+
+    def test_repeated_token_skips_verification(self):
+        """A verified token is served from the cache"""
+        backend = create_backend()
+        token = backend.encode(payload(1))
+
+        backend.decode(token)
+        with patch("jwt.decode") as mock_decode:
+            claims = backend.decode(token)
+
+        mock_decode.assert_not_called()
+        self.assertEqual(claims["user_id"], 1)
+        self.assertEqual(backend.stats()["hits"], 1)
+        self.assertEqual(backend.stats()["misses"], 1)
+
+    def test_cached_payload_is_a_copy(self):
+        """Changing a returned payload does not change the cache"""
+        backend = create_backend()
+        token = backend.encode(payload(1))
+
+        backend.decode(token)["user_id"] = 2
+
+        self.assertEqual(backend.decode(token)["user_id"], 1)
+
+    def test_expired_entry_is_dropped(self):
+        """Tokens are only cached until their exp"""
+        backend = create_backend()
+        token = backend.encode(payload(1, lifetime=1))
+        backend.decode(token)
+
+        with patch("auth_api.backends.time.time", return_value=time.time() + 2):
+            self.assertIsNone(backend.verified.get(token))
+        self.assertEqual(backend.stats()["size"], 0)
+
+    def test_invalid_token_is_not_cached(self):
+        """Tokens failing verification are never remembered"""
+        backend = create_backend()
+        token = backend.encode(payload(1)) + "x"
+
+        for _ in range(2):
+            with self.assertRaises(TokenBackendError):
+                backend.decode(token)
+        self.assertEqual(backend.stats()["size"], 0)
+
+    def test_cache_is_bounded(self):
+        """The least recently used token is evicted"""
+        cache = VerifiedTokenCache(max_size=2)
+        cache.set("a", payload(1))
+        cache.set("b", payload(2))
+        cache.get("a")
+        cache.set("c", payload(3))
+
+        self.assertIsNotNone(cache.get("a"))
+        self.assertIsNone(cache.get("b"))
+        self.assertEqual(cache.stats()["size"], 2)
+
+
+class KeyRingTests(TestCase):
+    """Test kid based signing and key rotation"""
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.directory.name, "jwt_keys.json")
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def rotate(self, algorithm="EdDSA", overlap=60):
+        with override_settings(JWT_KEY_RING_FILE=self.path):
+            call_command(
+                "rotate_jwt_keys",
+                algorithm=algorithm,
+                overlap=overlap,
+                stdout=open(os.devnull, "w"),
+            )
+        # Skip the reload interval, as another process would after it
+        self.backend.key_ring.reload()
+
+    def test_tokens_carry_kid(self):
+        """Tokens name the key they were signed with"""
+        self.backend = create_backend(key_ring_file=self.path)
+        token = self.backend.encode(payload(1))
+
+        kid = jwt.get_unverified_header(token)["kid"]
+        self.assertEqual(kid, self.backend.key_ring.default.kid)
+
+    def test_tokens_without_kid_use_the_default_key(self):
+        """Tokens issued before the key ring still verify"""
+        self.backend = create_backend(key_ring_file=self.path)
+        token = TokenBackend(api_settings.ALGORITHM, api_settings.SIGNING_KEY).encode(
+            payload(1)
+        )
+
+        self.assertEqual(self.backend.decode(token)["user_id"], 1)
+
+    def test_rotation_keeps_old_tokens_during_overlap(self):
+        """Old tokens verify until the previous key retires"""
+        self.backend = create_backend(cache_size=0, key_ring_file=self.path)
+        old_token = self.backend.encode(payload(1))
+
+        self.rotate()
+        new_token = self.backend.encode(payload(2))
+
+        new_header = jwt.get_unverified_header(new_token)
+        self.assertEqual(new_header["alg"], "EdDSA")
+        self.assertNotEqual(
+            new_header["kid"], jwt.get_unverified_header(old_token)["kid"]
+        )
+        self.assertEqual(self.backend.decode(old_token)["user_id"], 1)
+        self.assertEqual(self.backend.decode(new_token)["user_id"], 2)
+
+        with patch("auth_api.backends.time.time", return_value=time.time() + 61):
+            with self.assertRaises(TokenBackendError):
+                self.backend.decode(old_token)
+            self.assertEqual(self.backend.decode(new_token)["user_id"], 2)
+
+    def test_rotation_removes_retired_keys(self):
+        """Keys past their overlap are dropped from the file"""
+        self.backend = create_backend(key_ring_file=self.path)
+        self.rotate(overlap=0)
+        self.rotate(algorithm="ES256", overlap=0)
+
+        with open(self.path) as key_file:
+            keys = json.load(key_file)["keys"]
+        self.assertEqual([key["alg"] for key in keys], ["ES256"])
+        self.assertEqual(os.stat(self.path).st_mode & 0o777, 0o600)
+
+    def test_unknown_kid_is_rejected(self):
+        """Tokens signed with a key outside the ring fail"""
+        self.backend = create_backend(key_ring_file=self.path)
+        private_pem, public_pem = generate_key_pair("ES256")
+        token = CachedTokenBackend("ES256", private_pem, public_pem).encode(payload(1))
+
+        with self.assertRaises(TokenBackendError):
+            self.backend.decode(token)
+
+    def test_jwks_lists_active_keys(self):
+        """The JWKS has the public key of every active key"""
+        self.backend = create_backend(key_ring_file=self.path)
+        self.rotate()
+
+        keys = self.backend.key_ring.jwks()["keys"]
+        self.assertEqual(len(keys), 2)
+        self.assertEqual(keys[1]["alg"], "EdDSA")
+        self.assertNotIn("d", keys[1])
+
+    def test_jwks_endpoint(self):
+        """The JWKS endpoint publishes the key of the running backend"""
+        res = self.client.get(JWKS_URL)
+
+        self.assertEqual(res.status_code, 200)
+        self.assertIn("max-age", res["Cache-Control"])
+        self.assertEqual(res.json()["keys"][0]["alg"], api_settings.ALGORITHM)
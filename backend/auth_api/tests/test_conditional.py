@@ -0,0 +1,111 @@
+# pylint: skip-file
+
+from unittest.mock import patch
+from django.contrib.auth import get_user_model
+from django.test import TestCase
+from django.urls import reverse
+from django.utils.http import http_date
+from rest_framework import status
+from rest_framework.permissions import BasePermission
+from rest_framework.test import APIClient
+from auth_api.views import UserViewSet
+
+
+User = get_user_model()
+
+
+def detail_url(user_id):
+    """Create and return a user detail URL"""
+    return reverse("user-detail", args=[user_id])
+
+
+def create_user(email="user@example.com", **kwargs):
+    """Helper function to create a user"""
+    return User.objects.create_user(
+        email=email, username=email, password="Testpass123!", **kwargs
+    )
+
+
+class DenyObject(BasePermission):
+    """Permission refusing every object"""
+
+    def has_object_permission(self, request, view, obj):
+        return False
+
+
+class ConditionalUserRetrieveTests(TestCase):
+    """Test conditional GETs of a user"""
+
+    def setUp(self):
+        self.user = create_user()
+        self.other = create_user(email="other@example.com")
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+
+    def test_validators(self):
+        """Retrieved users carry their ETag and Last-Modified"""
+        res = self.client.get(detail_url(self.user.id))
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertTrue(res["ETag"].startswith(f'"user-{self.user.id}-'))
+        self.assertEqual(
+            res["Last-Modified"], http_date(self.user.updated_at.timestamp())
+        )
+        self.assertEqual(res["Cache-Control"], "no-cache, private")
+
+    def test_not_modified(self):
+        """A current copy is not loaded or serialized again"""
+        etag = self.client.get(detail_url(self.user.id))["ETag"]
+
+        with self.assertNumQueries(1):
+            res = self.client.get(detail_url(self.user.id), HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(res.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertEqual(res.content, b"")
+        self.assertEqual(res["ETag"], etag)
+
+    def test_not_modified_since(self):
+        """If-Modified-Since is answered from updated_at"""
+        res = self.client.get(
+            detail_url(self.user.id),
+            HTTP_IF_MODIFIED_SINCE=http_date(self.user.updated_at.timestamp() + 1),
+        )
+
+        self.assertEqual(res.status_code, status.HTTP_304_NOT_MODIFIED)
+
+    def test_modified(self):
+        """Saving the user outdates its ETag"""
+        etag = self.client.get(detail_url(self.user.id))["ETag"]
+        self.user.bio = "New bio"
+        self.user.save()
+
+        res = self.client.get(detail_url(self.user.id), HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data["bio"], "New bio")
+        self.assertNotEqual(res["ETag"], etag)
+
+    def test_etag_per_representation(self):
+        """Another user's view of the same row gets another ETag"""
+        etag = self.client.get(detail_url(self.user.id))["ETag"]
+        self.client.force_authenticate(user=self.other)
+
+        res = self.client.get(detail_url(self.user.id), HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertNotIn("phone_number", res.data)
+
+    def test_missing_user(self):
+        """Conditional GETs of missing users are not found"""
+        for user_id in (999999, "abc"):
+            res = self.client.get(detail_url(user_id), HTTP_IF_NONE_MATCH="*")
+            self.assertEqual(res.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_object_permissions_before_not_modified(self):
+        """A current copy of a refused object is not answered with a 304"""
+        etag = self.client.get(detail_url(self.user.id))["ETag"]
+
+        with patch.object(UserViewSet, "get_permissions", return_value=[DenyObject()]):
+            res = self.client.get(detail_url(self.user.id), HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(res.status_code, status.HTTP_403_FORBIDDEN)
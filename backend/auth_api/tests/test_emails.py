@@ -0,0 +1,82 @@
+# pylint: skip-file
+
+import smtplib
+from unittest.mock import MagicMock, patch
+from django.core import mail
+from django.test import TestCase
+from auth_api.tasks import EmailConnection, send_emails
+from auth_api.utils import AuthSession, EmailLink, EmailOtp
+
+
+MESSAGE = {"subject": "Subject", "body": "Body", "to": ["queue@example.com"]}
+
+
+class EmailQueueTests(TestCase):
+    """Test the email queue"""
+
+    def tearDown(self):
+        EmailConnection.close()
+
+    @patch("auth_api.utils.send_emails.apply_async")
+    def test_otp_email_is_queued_with_expiry(self, mock_apply_async):
+        """The request only queues the OTP email, expiring with the OTP"""
+        self.assertTrue(EmailOtp.send_email_otp("queue@example.com", 123456))
+
+        mock_apply_async.assert_called_once()
+        kwargs = mock_apply_async.call_args.kwargs
+        self.assertEqual(kwargs["expires"], AuthSession.EXPIRY_SECONDS)
+        self.assertIn("123456", kwargs["args"][0][0]["body"])
+        self.assertEqual(len(mail.outbox), 0)
+
+    @patch("auth_api.utils.send_emails.apply_async")
+    def test_link_emails_are_queued_with_expiry(self, mock_apply_async):
+        """Verification and reset links expire with the link"""
+        EmailLink.send_email_link("queue@example.com")
+        EmailLink.send_password_reset_link("queue@example.com")
+
+        for call in mock_apply_async.call_args_list:
+            self.assertEqual(call.kwargs["expires"], EmailLink.EXPIRY_SECONDS)
+
+    @patch("auth_api.utils.send_emails.apply_async", side_effect=OSError)
+    def test_queue_failure(self, mock_apply_async):
+        """A broker failure is reported as a failed send"""
+        self.assertFalse(EmailOtp.send_email_otp("queue@example.com", 123456))
+
+    def test_task_sends_email(self):
+        """The task sends the queued messages"""
+        self.assertEqual(send_emails([MESSAGE, MESSAGE]), 2)
+
+        self.assertEqual(len(mail.outbox), 2)
+        self.assertEqual(mail.outbox[0].to, MESSAGE["to"])
+
+    @patch("auth_api.tasks.get_connection")
+    def test_connection_is_reused(self, mock_get_connection):
+        """One SMTP session is shared by the tasks of a worker"""
+        send_emails([MESSAGE])
+        send_emails([MESSAGE])
+
+        mock_get_connection.assert_called_once()
+        mock_get_connection.return_value.open.assert_called_once()
+        self.assertEqual(mock_get_connection.return_value.send_messages.call_count, 2)
+
+    @patch("auth_api.tasks.get_connection")
+    def test_dropped_connection_is_reopened(self, mock_get_connection):
+        """A session closed by the server is replaced once"""
+        dropped, fresh = MagicMock(), MagicMock()
+        dropped.send_messages.side_effect = smtplib.SMTPServerDisconnected
+        fresh.send_messages.return_value = 1
+        mock_get_connection.side_effect = [dropped, fresh]
+
+        self.assertEqual(send_emails([MESSAGE]), 1)
+        dropped.close.assert_called_once()
+
+    @patch("auth_api.tasks.time.monotonic")
+    @patch("auth_api.tasks.get_connection")
+    def test_old_connection_is_replaced(self, mock_get_connection, mock_monotonic):
+        """Sessions are not kept past their max age"""
+        mock_monotonic.return_value = 0
+        send_emails([MESSAGE])
+        mock_monotonic.return_value = EmailConnection.MAX_AGE_SECONDS + 1
+        send_emails([MESSAGE])
+
+        self.assertEqual(mock_get_connection.call_count, 2)
@@ -0,0 +1,177 @@
+# pylint: skip-file
+
+import io
+import shutil
+import tempfile
+from unittest.mock import patch
+from PIL import Image
+from django.contrib.auth import get_user_model
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APIClient
+from auth_api.images import open_image, render_variants
+from auth_api.serializers import UserListSerializer
+from core_db.storage import ContentAddressedFileSystemStorage
+
+
+User = get_user_model()
+
+
+def create_user(email="user@example.com", **kwargs):
+    """Helper function to create a user"""
+    return User.objects.create_user(
+        email=email, username=email, password="Testpass123!", **kwargs
+    )
+
+
+def image_upload_url(user_id):
+    """Return the image upload URL of the user"""
+    return reverse("user-upload-image", args=[user_id])
+
+
+def image_bytes(size=(800, 600), image_format="JPEG", color="red", exif=None):
+    """Encoded image of the given size"""
+    output = io.BytesIO()
+    mode = "RGBA" if isinstance(color, tuple) else "RGB"
+    Image.new(mode, size, color).save(output, image_format, exif=exif or b"")
+    return output.getvalue()
+
+
+def rotated_exif():
+    """EXIF asking for a 90 degree rotation, with a GPS position"""
+    exif = Image.Exif()
+    exif[0x0112] = 6  # Orientation
+    exif[0x010F] = "Camera"  # Make
+    exif[0x8825] = {2: (1.0, 2.0, 3.0)}  # GPSInfo
+    return exif.tobytes()
+
+
+class RenderVariantsTests(TestCase):
+    """Test the profile image variants"""
+
+    def test_exif_orientation(self):
+        """The image is turned upright and its metadata dropped"""
+        image = open_image(image_bytes(size=(200, 100), exif=rotated_exif()))
+
+        self.assertEqual(image.size, (100, 200))
+        self.assertEqual(image.info, {})
+
+    def test_variants(self):
+        """Each size is rendered in WebP and JPEG, never upscaled"""
+        variants = render_variants(image_bytes(size=(800, 600), exif=rotated_exif()))
+
+        self.assertEqual(list(variants), ["64", "256", "720"])
+        for size, expected in (("64", 64), ("256", 256), ("720", 600)):
+            for variant_format, pil_format in (("webp", "WEBP"), ("jpeg", "JPEG")):
+                with Image.open(io.BytesIO(variants[size][variant_format])) as image:
+                    self.assertEqual(image.format, pil_format)
+                    self.assertEqual(image.size, (expected, expected))
+                    self.assertEqual(len(image.getexif()), 0)
+
+    def test_transparent_image(self):
+        """Transparency is kept in WebP and flattened in JPEG"""
+        variants = render_variants(
+            image_bytes(image_format="PNG", color=(255, 0, 0, 128)), sizes=(64,)
+        )
+
+        with Image.open(io.BytesIO(variants["64"]["webp"])) as image:
+            self.assertEqual(image.mode, "RGBA")
+        with Image.open(io.BytesIO(variants["64"]["jpeg"])) as image:
+            self.assertEqual(image.mode, "RGB")
+
+
+class ProfileImageUploadTests(TestCase):
+    """Test the processing of uploaded profile images"""
+
+    def setUp(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root, ignore_errors=True)
+        settings_override = override_settings(
+            MEDIA_ROOT=media_root, MEDIA_URL="/media/"
+        )
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        self.user = create_user()
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+
+    def upload(self, name="avatar.png", color="red"):
+        output = io.BytesIO()
+        Image.new("RGB", (300, 300), color).save(output, "PNG")
+        image = SimpleUploadedFile(name, output.getvalue(), "image/png")
+        with self.captureOnCommitCallbacks(execute=True):
+            res = self.client.patch(
+                image_upload_url(self.user.id), {"profile_img": image}
+            )
+        self.user.refresh_from_db()
+        return res
+
+    def test_upload_renders_variants(self):
+        """The variants are rendered after the upload and exposed by size"""
+        res = self.upload()
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        variants = self.user.profile_img_variants
+        self.assertEqual(variants["source"], self.user.profile_img.name)
+        self.assertTrue(default_storage.exists(variants["64"]["webp"]))
+
+        data = UserListSerializer(self.user).data
+        self.assertEqual(set(data["profile_img_urls"]), {"64", "256", "720"})
+        self.assertTrue(data["profile_img_urls"]["64"]["webp"].endswith(".webp"))
+        self.assertEqual(data["profile_img"], data["profile_img_urls"]["720"]["jpeg"])
+
+    def test_new_upload_replaces_variants(self):
+        """Uploading another image deletes the previous variants"""
+        self.upload()
+        previous = self.user.profile_img_variants
+
+        self.upload(name="other.png", color="blue")
+
+        self.assertNotEqual(self.user.profile_img_variants, previous)
+        self.assertFalse(default_storage.exists(previous["64"]["webp"]))
+        self.assertTrue(
+            default_storage.exists(self.user.profile_img_variants["64"]["webp"])
+        )
+
+    def test_unprocessed_image(self):
+        """The original is served until the variants are rendered"""
+        self.user.profile_img = "profile_images/avatar.png"
+        self.user.profile_img_variants = {"source": "profile_images/old.png"}
+
+        data = UserListSerializer(self.user).data
+
+        self.assertIsNone(data["profile_img_urls"])
+        self.assertTrue(data["profile_img"].endswith("profile_images/avatar.png"))
+
+    def test_list_without_storage_calls(self):
+        """Listing users does not call the storage for each image"""
+        for i in range(5):
+            create_user(
+                email=f"user{i}@example.com",
+                profile_img=f"profile_images/{i}.png",
+                profile_img_variants={
+                    "source": f"profile_images/{i}.png",
+                    "64": {
+                        "webp": f"profile_images/variants/{i}_64.webp",
+                        "jpeg": f"profile_images/variants/{i}_64.jpg",
+                    },
+                },
+            )
+
+        with patch.object(
+            ContentAddressedFileSystemStorage,
+            "url",
+            autospec=True,
+            side_effect=ContentAddressedFileSystemStorage.url,
+        ) as url:
+            res = self.client.get(reverse("user-list"), {"page_size": 50})
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertLessEqual(url.call_count, 1)
+        self.assertIn(
+            "/media/profile_images/variants/4_64.jpg",
+            [user["profile_img"] for user in res.data["results"]],
+        )
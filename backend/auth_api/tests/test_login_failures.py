@@ -0,0 +1,130 @@
+# pylint: skip-file
+
+from django.conf import settings
+from django.urls import reverse
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from rest_framework import status
+from rest_framework.test import APITestCase, APIClient
+from auth_api.utils import LoginFailures
+
+
+LOGIN_URL = reverse("login")
+
+
+def create_user(**params):
+    """Create and return a new user"""
+    return get_user_model().objects.create_user(**params)
+
+
+class LoginFailuresTests(APITestCase):
+    """Test the Redis failed login counter"""
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.password = "Django@123"
+        self.user = create_user(
+            email="failures@example.com",
+            password=self.password,
+            is_email_verified=True,
+            is_two_fa=False,
+        )
+
+    def tearDown(self):
+        cache.clear()
+
+    def login(self, password="Wrong@123"):
+        return self.client.post(
+            LOGIN_URL, {"email": self.user.email, "password": password}, format="json"
+        )
+
+    def test_failures_do_not_write_the_user(self):
+        """A failed login only reads the user"""
+        with self.assertNumQueries(1):
+            res = self.login()
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(res.data["error"], "Invalid credentials")
+        self.user.refresh_from_db()
+        self.assertEqual(self.user.failed_login_attempts, 0)
+
+    def test_failure_messages(self):
+        """The remaining attempts are shown from the third failure"""
+        self.login()
+        self.login()
+
+        for remaining in (2, 1):
+            res = self.login()
+            self.assertEqual(
+                res.data["error"],
+                f"Invalid credentials. You have {remaining} "
+                "more attempt(s) before your account is deactivated.",
+            )
+
+    def test_lockout_deactivates_user(self):
+        """Reaching the limit deactivates the account"""
+        for _ in range(settings.MAX_LOGIN_FAILURE_LIMIT - 1):
+            self.login()
+
+        res = self.login()
+
+        self.assertEqual(
+            res.data["error"],
+            "Invalid credentials. Your account is deactivated. Contact an admin.",
+        )
+        self.user.refresh_from_db()
+        self.assertFalse(self.user.is_active)
+        self.assertEqual(
+            self.user.failed_login_attempts, settings.MAX_LOGIN_FAILURE_LIMIT
+        )
+
+    def test_failures_past_limit_lock_out(self):
+        """A count pushed past the limit by concurrent failures still locks out"""
+        for _ in range(settings.MAX_LOGIN_FAILURE_LIMIT):
+            LoginFailures.register(self.user.id)
+
+        res = self.login()
+
+        self.assertEqual(
+            res.data["error"],
+            "Invalid credentials. Your account is deactivated. Contact an admin.",
+        )
+        self.user.refresh_from_db()
+        self.assertFalse(self.user.is_active)
+
+    def test_lockout_unverifies_superuser(self):
+        """Reaching the limit makes a superuser verify the email again"""
+        self.user.is_superuser = True
+        self.user.save()
+
+        for _ in range(settings.MAX_LOGIN_FAILURE_LIMIT - 1):
+            self.login()
+
+        res = self.login()
+
+        self.assertEqual(
+            res.data["error"],
+            "Invalid credentials. Your account is deactivated. Verify your email.",
+        )
+        self.user.refresh_from_db()
+        self.assertTrue(self.user.is_active)
+        self.assertFalse(self.user.is_email_verified)
+
+    def test_success_resets_failures(self):
+        """A successful login starts the count again"""
+        self.login()
+        self.login()
+
+        res = self.login(self.password)
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+
+        self.assertEqual(LoginFailures.register(self.user.id), 1)
+
+    def test_failures_expire(self):
+        """The count expires 10 minutes after the last failure"""
+        LoginFailures.register(self.user.id)
+
+        ttl = LoginFailures._connection().ttl(LoginFailures._key(self.user.id))
+        self.assertGreater(ttl, 0)
+        self.assertLessEqual(ttl, LoginFailures.EXPIRY_SECONDS)
@@ -0,0 +1,123 @@
+# pylint: skip-file
+
+from unittest.mock import patch
+from django.urls import reverse
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from rest_framework import status
+from rest_framework.test import APITestCase, APIClient
+from auth_api.utils import AuthSession
+
+
+LOGIN_URL = reverse("login")
+RESEND_OTP_URL = reverse("resend-otp")
+TOKEN_USER_URL = reverse("token")
+
+
+def create_user(**params):
+    """Create and return a new user"""
+    return get_user_model().objects.create_user(**params)
+
+
+class LoginTicketTests(APITestCase):
+    """Test the 2FA login ticket flow"""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.password = "Django@123"
+        self.user = create_user(
+            email="ticket@example.com",
+            password=self.password,
+            is_email_verified=True,
+        )
+        cache.clear()
+
+    def tearDown(self):
+        cache.clear()
+
+    @patch("auth_api.views.EmailOtp.generate_otp", return_value=123456)
+    def login(self, mock_generate_otp):
+        return self.client.post(
+            LOGIN_URL,
+            {"email": self.user.email, "password": self.password},
+            format="json",
+        )
+
+    def test_login_does_not_cache_password(self):
+        """Password is never stored in the cache during 2FA login"""
+        res = self.login()
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertTrue(res.data["otp"])
+        self.assertIsNone(cache.get(f"password_{self.user.id}"))
+        self.assertNotIn("password", AuthSession.get(self.user.id))
+
+    def test_token_view_does_not_hash_password_again(self):
+        """TokenView mints tokens from the ticket without re-authenticating"""
+        self.login()
+
+        with patch(
+            "django.contrib.auth.base_user.AbstractBaseUser.check_password"
+        ) as mock_check_password:
+            res = self.client.post(
+                TOKEN_USER_URL,
+                {"user_id": self.user.id, "otp": "123456"},
+                format="json",
+            )
+
+        mock_check_password.assert_not_called()
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertIn("access_token", res.data)
+        self.assertIn("refresh_token", res.data)
+        self.assertEqual(res.data["user_id"], self.user.id)
+        self.assertEqual(res.data["user_role"], "Default")
+        self.assertIsNone(AuthSession.get(self.user.id))
+
+    def test_ticket_is_single_use(self):
+        """A ticket cannot be redeemed twice"""
+        self.login()
+        payload = {"user_id": self.user.id, "otp": "123456"}
+
+        res = self.client.post(TOKEN_USER_URL, payload, format="json")
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+
+        res = self.client.post(TOKEN_USER_URL, payload, format="json")
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(res.data["error"], "Session expired. Please login again.")
+
+    def test_wrong_otp_keeps_ticket(self):
+        """A wrong OTP does not consume the pending login"""
+        self.login()
+
+        res = self.client.post(
+            TOKEN_USER_URL, {"user_id": self.user.id, "otp": "654321"}, format="json"
+        )
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(res.data["error"], "Invalid OTP")
+
+        res = self.client.post(
+            TOKEN_USER_URL, {"user_id": self.user.id, "otp": "123456"}, format="json"
+        )
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+
+    def test_resend_otp_without_session(self):
+        """Resending an OTP requires a pending login"""
+        res = self.client.post(RESEND_OTP_URL, {"user_id": self.user.id}, format="json")
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(res.data["error"], "Session expired. Please login again.")
+
+    def test_non_two_fa_login_returns_tokens(self):
+        """Users without 2FA get tokens directly from the login view"""
+        self.user.is_two_fa = False
+        self.user.save()
+
+        res = self.client.post(
+            LOGIN_URL,
+            {"email": self.user.email, "password": self.password},
+            format="json",
+        )
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertIn("access_token", res.data)
+        self.assertEqual(res.data["user_id"], self.user.id)
@@ -0,0 +1,107 @@
+# pylint: skip-file
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.models import Group
+from django.core.cache import cache
+from django.test import TestCase
+from auth_api.principals import get_principal, principal_key
+
+
+def create_user(**params):
+    """Create and return a new user"""
+    return get_user_model().objects.create_user(**params)
+
+
+class PrincipalTests(TestCase):
+    """Test the cached auth principal"""
+
+    def setUp(self):
+        cache.clear()
+        self.user = create_user(email="principal@example.com", password="Django@123")
+
+    def tearDown(self):
+        cache.clear()
+
+    def test_principal_loads_role_in_one_query(self):
+        """User and role are fetched with a single query"""
+        with self.assertNumQueries(1):
+            principal = get_principal(self.user.id)
+
+        self.assertEqual(principal.id, self.user.id)
+        self.assertEqual(principal.email, self.user.email)
+        self.assertEqual(principal.role, "Default")
+        self.assertTrue(principal.is_active)
+
+    def test_principal_is_cached(self):
+        """A cached principal does not hit the database"""
+        get_principal(self.user.id)
+
+        with self.assertNumQueries(0):
+            principal = get_principal(self.user.id)
+
+        self.assertEqual(principal.role, "Default")
+
+    def test_missing_principal(self):
+        """Unknown users have no principal"""
+        self.assertIsNone(get_principal(999))
+
+    def test_role_order(self):
+        """Roles are resolved in the same order as before"""
+        admin = create_user(
+            email="admin@example.com", password="Django@123", is_staff=True
+        )
+        superuser = get_user_model().objects.create_superuser(
+            email="super@example.com", password="Django@123"
+        )
+        no_group = create_user(email="nogroup@example.com", password="Django@123")
+        no_group.groups.clear()
+
+        self.assertEqual(get_principal(admin.id).role, "Admin")
+        self.assertEqual(get_principal(superuser.id).role, "Superuser")
+        self.assertEqual(get_principal(no_group.id).role, "UnAuthorized")
+
+    def test_user_save_invalidates_principal(self):
+        """Saving the user drops the cached principal"""
+        get_principal(self.user.id)
+
+        self.user.is_active = False
+        self.user.save()
+
+        self.assertIsNone(cache.get(principal_key(self.user.id)))
+        self.assertFalse(get_principal(self.user.id).is_active)
+
+    def test_user_delete_invalidates_principal(self):
+        """Deleting the user drops the cached principal"""
+        user_id = self.user.id
+        get_principal(user_id)
+
+        self.user.delete()
+
+        self.assertIsNone(get_principal(user_id))
+
+    def test_group_membership_invalidates_principal(self):
+        """Adding or removing groups drops the cached principal"""
+        admin_group, _ = Group.objects.get_or_create(name="Admin")
+        default_group = Group.objects.get(name="Default")
+        get_principal(self.user.id)
+
+        self.user.groups.remove(default_group)
+        self.user.groups.add(admin_group)
+        self.assertEqual(get_principal(self.user.id).role, "Admin")
+
+        admin_group.user_set.remove(self.user)
+        self.assertEqual(get_principal(self.user.id).role, "UnAuthorized")
+
+        default_group.user_set.add(self.user)
+        self.assertEqual(get_principal(self.user.id).role, "Default")
+
+        default_group.user_set.clear()
+        self.assertEqual(get_principal(self.user.id).role, "UnAuthorized")
+
+    def test_group_delete_invalidates_principal(self):
+        """Deleting a group drops the cached principals of its members"""
+        get_principal(self.user.id)
+
+        Group.objects.get(name="Default").delete()
+
+        self.assertEqual(get_principal(self.user.id).role, "UnAuthorized")
@@ -0,0 +1,158 @@
+# pylint: skip-file
+
+import json
+import time
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest.mock import patch
+from urllib.parse import parse_qs
+from django.core.cache import cache
+from django.test import TestCase
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APIClient
+from auth_api.utils import Recaptcha
+
+
+RECAPTCHA_URL = reverse("recaptcha-verify")
+
+
+class SiteVerifyHandler(BaseHTTPRequestHandler):
+    """Stand-in for Google's siteverify endpoint"""
+
+    protocol_version = "HTTP/1.1"  # keep-alive
+
+    def do_POST(self):
+        data = parse_qs(self.rfile.read(int(self.headers["Content-Length"])).decode())
+        token = data["response"][0]
+        self.server.calls.append(token)
+        self.server.connections.add(self.client_address)
+
+        if token == "slow":
+            time.sleep(0.5)
+        if token == "error":
+            self.send_response(500)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+
+        body = json.dumps({"success": token == "valid"}).encode()
+        try:
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+        except (BrokenPipeError, ConnectionResetError):
+            pass  # the client gave up on a slow response
+
+    def log_message(self, *args):
+        pass
+
+
+class RecaptchaTests(TestCase):
+    """Test the reCAPTCHA verifier against a local server"""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.server = ThreadingHTTPServer(("127.0.0.1", 0), SiteVerifyHandler)
+        cls.server.daemon_threads = True
+        threading.Thread(target=cls.server.serve_forever, daemon=True).start()
+        cls.url = f"http://127.0.0.1:{cls.server.server_port}/siteverify"
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        cls.server.server_close()
+        super().tearDownClass()
+
+    def setUp(self):
+        self.server.calls = []
+        self.server.connections = set()
+        self.client = APIClient()
+        cache.clear()
+        Recaptcha.reset()
+        patcher = patch.multiple(
+            Recaptcha, VERIFY_URL=self.url, TIMEOUT=(0.2, 0.2), _session=None
+        )
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.addCleanup(Recaptcha.reset)
+
+    def tearDown(self):
+        cache.clear()
+
+    def test_valid_token(self):
+        """A token accepted by Google passes the view"""
+        res = self.client.post(
+            RECAPTCHA_URL, {"recaptcha_token": "valid"}, format="json"
+        )
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data["success"], "reCAPTCHA validation successful.")
+
+    def test_invalid_token(self):
+        """A token rejected by Google fails the view"""
+        res = self.client.post(
+            RECAPTCHA_URL, {"recaptcha_token": "invalid"}, format="json"
+        )
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(res.data["error"], "Invalid reCAPTCHA token.")
+
+    def test_results_are_cached_per_token(self):
+        """Retries with the same token do not call Google again"""
+        for _ in range(3):
+            self.assertTrue(Recaptcha.verify("valid"))
+            self.assertFalse(Recaptcha.verify("invalid"))
+
+        self.assertEqual(self.server.calls, ["valid", "invalid"])
+
+    def test_session_is_kept_alive(self):
+        """Verifications reuse one connection"""
+        for token in ("valid", "invalid", "other"):
+            Recaptcha.verify(token)
+
+        self.assertEqual(len(self.server.calls), 3)
+        self.assertEqual(len(self.server.connections), 1)
+
+    def test_slow_upstream_fails_fast(self):
+        """A slow Google is abandoned after the timeout"""
+        started = time.monotonic()
+
+        with self.assertRaises(ValueError):
+            Recaptcha.verify("slow")
+
+        self.assertLess(time.monotonic() - started, 0.45)
+
+    def test_fail_open(self):
+        """With fail open, tokens are accepted while Google is unavailable"""
+        with patch.object(Recaptcha, "FAIL_OPEN", True):
+            self.assertTrue(Recaptcha.verify("error"))
+        self.assertIsNone(cache.get(Recaptcha._key("error")))
+
+    def test_fail_closed_view(self):
+        """With fail closed, the view rejects tokens while Google is unavailable"""
+        res = self.client.post(
+            RECAPTCHA_URL, {"recaptcha_token": "error"}, format="json"
+        )
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(
+            res.data["error"], "reCAPTCHA validation is unavailable. Try again later."
+        )
+
+    def test_circuit_opens_after_failures(self):
+        """Google is not called while the breaker is open, then probed again"""
+        for _ in range(Recaptcha.FAILURE_THRESHOLD):
+            with self.assertRaises(ValueError):
+                Recaptcha.verify("error")
+
+        with self.assertRaises(ValueError):
+            Recaptcha.verify("valid")
+        self.assertEqual(len(self.server.calls), Recaptcha.FAILURE_THRESHOLD)
+
+        with patch.object(Recaptcha, "RESET_SECONDS", 0):
+            self.assertTrue(Recaptcha.verify("valid"))
+        self.assertFalse(Recaptcha.is_open())
@@ -0,0 +1,259 @@
+# pylint: skip-file
+
+import json
+import time
+import asyncio
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest.mock import patch
+import jwt
+from cryptography.hazmat.primitives.asymmetric import rsa
+from asgiref.sync import async_to_sync
+from django.contrib.auth import get_user_model
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APIClient
+from social_core.backends.facebook import FacebookOAuth2
+from social_core.backends.github import GithubOAuth2
+from social_django.utils import load_backend, load_strategy
+from auth_api.social import ProviderMetadata, SocialProviders
+
+
+SOCIAL_AUTH_URL = reverse("social-auth-async")
+CLIENT_ID = "client-id"
+
+User = get_user_model()
+
+
+def create_user(email="user@example.com", **kwargs):
+    """Helper function to create a user"""
+    return User.objects.create_user(
+        email=email, username=email, password="Testpass123!", **kwargs
+    )
+
+
+class ProviderHandler(BaseHTTPRequestHandler):
+    """Stand-in for the Google, Facebook and GitHub endpoints"""
+
+    protocol_version = "HTTP/1.1"  # keep-alive
+
+    def do_GET(self):
+        server = self.server
+        path = self.path.split("?")[0]
+        server.calls.append(path)
+        base = f"http://127.0.0.1:{server.server_port}"
+
+        if path == "/slow/user":
+            time.sleep(0.3)
+
+        bodies = {
+            "/google/discovery": {
+                "issuer": "https://accounts.google.com",
+                "userinfo_endpoint": f"{base}/google/userinfo",
+                "jwks_uri": f"{base}/google/jwks",
+            },
+            "/google/jwks": {"keys": server.jwks},
+            "/google/userinfo": {
+                "sub": "1",
+                "email": "google@example.com",
+                "given_name": "Google",
+                "family_name": "User",
+            },
+            "/facebook/me": {"id": "2", "name": "Face Book", "email": "fb@example.com"},
+            "/github/user": {"id": 3, "login": "octo", "name": "Octo Cat"},
+            "/github/user/emails": [
+                {"email": "other@example.com", "primary": False},
+                {"email": "octo@example.com", "primary": True},
+            ],
+            "/slow/user": {"id": 4, "login": "slow", "email": "slow@example.com"},
+        }
+
+        if self.headers.get("Authorization", "").endswith("expired"):
+            self.send_response(401)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+
+        body = json.dumps(bodies[path]).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+def signing_key():
+    """RSA key and its public JWK"""
+    key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    jwk = json.loads(jwt.algorithms.RSAAlgorithm.to_jwk(key.public_key()))
+    return key, jwk
+
+
+@override_settings(
+    SOCIAL_AUTH_GOOGLE_OAUTH2_KEY=CLIENT_ID,
+    SOCIAL_AUTH_FACEBOOK_SECRET="facebook-secret",
+)
+class AsyncSocialAuthTests(TestCase):
+    """Test the async social login against a local provider"""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.server = ThreadingHTTPServer(("127.0.0.1", 0), ProviderHandler)
+        cls.server.daemon_threads = True
+        threading.Thread(target=cls.server.serve_forever, daemon=True).start()
+        cls.base = f"http://127.0.0.1:{cls.server.server_port}"
+        cls.key, jwk = signing_key()
+        cls.jwk = {**jwk, "kid": "key-1", "alg": "RS256", "use": "sig"}
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        cls.server.server_close()
+        super().tearDownClass()
+
+    def setUp(self):
+        self.server.calls = []
+        self.server.jwks = [self.jwk]
+        self.client = APIClient()
+        ProviderMetadata.clear()
+        self.addCleanup(ProviderMetadata.clear)
+        for patcher in (
+            patch.object(
+                SocialProviders,
+                "GOOGLE_DISCOVERY_URL",
+                f"{self.base}/google/discovery",
+            ),
+            patch.object(FacebookOAuth2, "USER_DATA_URL", f"{self.base}/facebook/me"),
+            patch.object(GithubOAuth2, "API_URL", f"{self.base}/github/"),
+        ):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def id_token(self, key=None, kid="key-1", **claims):
+        payload = {
+            "iss": "https://accounts.google.com",
+            "aud": CLIENT_ID,
+            "sub": "10",
+            "email": "id@example.com",
+            "given_name": "Id",
+            "family_name": "Token",
+            "exp": int(time.time()) + 300,
+            **claims,
+        }
+        return jwt.encode(
+            payload, key or self.key, algorithm="RS256", headers={"kid": kid}
+        )
+
+    def login(self, provider, token):
+        return self.client.post(
+            SOCIAL_AUTH_URL, {"provider": provider, "token": token}, format="json"
+        )
+
+    def test_google_id_token(self):
+        """A Google ID token is verified with the cached JWKS and creates the user"""
+        res = self.login("google-oauth2", self.id_token())
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertIn("access_token", res.json())
+        user = User.objects.get(email="id@example.com")
+        self.assertEqual(user.auth_provider, "google")
+        self.assertEqual(res.json()["user_id"], user.id)
+
+        res = self.login("google-oauth2", self.id_token())
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(self.server.calls, ["/google/discovery", "/google/jwks"])
+
+    def test_google_rotated_key(self):
+        """An unknown kid fetches the JWKS again"""
+        self.login("google-oauth2", self.id_token())
+        key, jwk = signing_key()
+        self.server.jwks = [self.jwk, {**jwk, "kid": "key-2", "alg": "RS256"}]
+
+        res = self.login("google-oauth2", self.id_token(key=key, kid="key-2"))
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(self.server.calls.count("/google/jwks"), 2)
+
+    def test_google_id_token_other_audience(self):
+        """An ID token issued to another client is rejected"""
+        res = self.login("google-oauth2", self.id_token(aud="other-client"))
+
+        self.assertEqual(res.status_code, status.HTTP_500_INTERNAL_SERVER_ERROR)
+        self.assertIn("errors", res.json())
+        self.assertFalse(User.objects.filter(email="id@example.com").exists())
+
+    def test_google_access_token(self):
+        """A Google access token is exchanged at the userinfo endpoint"""
+        res = self.login("google-oauth2", "ya29.access")
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertIn("/google/userinfo", self.server.calls)
+        self.assertTrue(User.objects.filter(email="google@example.com").exists())
+
+    def test_expired_access_token(self):
+        """A token refused by the provider fails the login"""
+        res = self.login("github", "expired")
+
+        self.assertEqual(res.status_code, status.HTTP_500_INTERNAL_SERVER_ERROR)
+        self.assertIn("errors", res.json())
+
+    def test_facebook(self):
+        """Facebook user data is loaded from the Graph API"""
+        res = self.login("facebook", "fb-token")
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        user = User.objects.get(email="fb@example.com")
+        self.assertEqual(user.auth_provider, "facebook")
+        self.assertEqual(user.first_name, "Face")
+
+    def test_github_primary_email(self):
+        """GitHub users without a public email get their primary email"""
+        res = self.login("github", "gh-token")
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(self.server.calls, ["/github/user", "/github/user/emails"])
+        self.assertTrue(User.objects.filter(email="octo@example.com").exists())
+
+    def test_email_user(self):
+        """A social login for a password account is refused"""
+        create_user(email="octo@example.com", auth_provider="email")
+
+        res = self.login("github", "gh-token")
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn("Please login using password", res.json()["errors"])
+
+    def test_missing_token(self):
+        """The token and provider are required"""
+        res = self.client.post(SOCIAL_AUTH_URL, {"provider": "github"}, format="json")
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(res.json(), {"errors": "Token and provider are required"})
+
+    def test_concurrent_provider_calls(self):
+        """Provider calls of concurrent logins overlap instead of queueing"""
+        backend = load_backend(load_strategy(), "github", redirect_uri=None)
+
+        async def fetch_all():
+            try:
+                return await asyncio.gather(
+                    *[SocialProviders.user_data(backend, "token") for _ in range(5)]
+                )
+            finally:
+                await SocialProviders.close()
+
+        with patch.object(GithubOAuth2, "API_URL", f"{self.base}/slow/"):
+            start = time.monotonic()
+            results = async_to_sync(fetch_all)()
+            elapsed = time.monotonic() - start
+
+        self.assertEqual(len(results), 5)
+        self.assertEqual(results[0]["email"], "slow@example.com")
+        self.assertEqual(results[0]["access_token"], "token")
+        self.assertLess(elapsed, 5 * 0.3)
@@ -0,0 +1,90 @@
+# pylint: skip-file
+
+import json
+from django.contrib.auth import get_user_model
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APIClient
+
+
+User = get_user_model()
+
+USER_LIST_URL = reverse("user-list")
+
+
+def create_user(email="user@example.com", **kwargs):
+    """Helper function to create a user"""
+    return User.objects.create_user(
+        email=email, username=email, password="Testpass123!", **kwargs
+    )
+
+
+@override_settings(STREAM_CHUNK_SIZE=2)
+class StreamedUserListTests(TestCase):
+    """Test the streamed user list"""
+
+    def setUp(self):
+        self.admin = create_user(email="admin@example.com", is_staff=True)
+        for i in range(4):
+            create_user(email=f"user{i}@example.com")
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.admin)
+
+    def test_stream_json(self):
+        """Every user is streamed as one JSON array, in chunks of rows"""
+        res = self.client.get(USER_LIST_URL, {"stream": "json"})
+        chunks = list(res.streaming_content)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res["Content-Type"], "application/json")
+        self.assertGreater(len(chunks), 3)
+        users = json.loads(b"".join(chunks))
+        self.assertEqual(len(users), 5)
+        self.assertEqual(
+            set(users[0]),
+            {"id", "email", "username", "is_active", "is_staff", "strikes"},
+        )
+
+    def test_stream_ndjson(self):
+        """NDJSON streams one user per line, with the list filters"""
+        res = self.client.get(USER_LIST_URL, {"stream": "ndjson", "search": "user"})
+        body = b"".join(res.streaming_content)
+
+        self.assertEqual(res["Content-Type"], "application/x-ndjson")
+        self.assertTrue(body.endswith(b"\n"))
+        emails = [json.loads(line)["email"] for line in body.splitlines()]
+        self.assertEqual(emails, [f"user{i}@example.com" for i in range(4)])
+
+    def test_stream_empty(self):
+        """Empty lists stream an empty array"""
+        res = self.client.get(USER_LIST_URL, {"stream": "json", "search": "nobody"})
+
+        self.assertEqual(json.loads(b"".join(res.streaming_content)), [])
+
+    def test_invalid_format(self):
+        """Unknown formats are rejected with the errors envelope"""
+        res = self.client.get(USER_LIST_URL, {"stream": "csv"})
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(
+            res.json(), {"errors": "Stream format should be json or ndjson."}
+        )
+
+    def test_not_staff(self):
+        """Only admins stream the whole list"""
+        self.client.force_authenticate(user=User.objects.get(email="user0@example.com"))
+
+        res = self.client.get(USER_LIST_URL, {"stream": "json"})
+
+        self.assertEqual(res.status_code, status.HTTP_403_FORBIDDEN)
+        self.assertEqual(
+            res.json(), {"errors": "You do not have permission to stream this list."}
+        )
+
+    def test_paginated_without_stream(self):
+        """The list stays paginated without stream"""
+        res = self.client.get(USER_LIST_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data["count"], 5)
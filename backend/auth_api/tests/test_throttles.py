@@ -0,0 +1,94 @@
+# pylint: skip-file
+
+import threading
+from django.core.cache import cache
+from django.test import TestCase
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory
+from auth_api.throttles import RedisScopedRateThrottle, check_throttle_duration
+
+
+class BurstThrottle(RedisScopedRateThrottle):
+    THROTTLE_RATES = {"burst": "5/min", "single": "1/min"}
+
+
+class ThrottledView:
+    """Minimal view for the throttle helpers"""
+
+    def __init__(self, scope):
+        self.throttle_scope = scope
+
+    def get_throttles(self):
+        return [BurstThrottle()]
+
+
+class RedisScopedRateThrottleTests(TestCase):
+    """Test the Redis GCRA throttle"""
+
+    def setUp(self):
+        cache.clear()
+        self.factory = APIRequestFactory()
+
+    def tearDown(self):
+        cache.clear()
+
+    def request(self, ip="10.0.0.1"):
+        return Request(self.factory.post("/", REMOTE_ADDR=ip))
+
+    def test_allows_rate_then_throttles(self):
+        """The scope rate is admitted, the next request has to wait"""
+        view = ThrottledView("burst")
+        throttle = BurstThrottle()
+
+        for _ in range(5):
+            self.assertTrue(throttle.allow_request(self.request(), view))
+            self.assertIsNone(throttle.wait())
+
+        self.assertFalse(throttle.allow_request(self.request(), view))
+        self.assertGreater(throttle.wait(), 0)
+        self.assertLessEqual(throttle.wait(), 12)
+
+    def test_keys_are_per_client(self):
+        """Clients are throttled separately"""
+        view = ThrottledView("single")
+
+        self.assertTrue(BurstThrottle().allow_request(self.request("10.0.0.1"), view))
+        self.assertFalse(BurstThrottle().allow_request(self.request("10.0.0.1"), view))
+        self.assertTrue(BurstThrottle().allow_request(self.request("10.0.0.2"), view))
+
+    def test_without_scope_is_not_throttled(self):
+        """Views without a throttle scope are never throttled"""
+        view = ThrottledView(None)
+
+        for _ in range(10):
+            self.assertTrue(BurstThrottle().allow_request(self.request(), view))
+
+    def test_check_throttle_duration(self):
+        """The view throttle helper gets the wait of a throttled request"""
+        view = ThrottledView("single")
+
+        self.assertEqual(check_throttle_duration(view, self.request()), [])
+        durations = check_throttle_duration(view, self.request())
+
+        self.assertEqual(len(durations), 1)
+        self.assertAlmostEqual(durations[0], 60, delta=1)
+
+    def test_concurrent_requests_are_not_over_admitted(self):
+        """Concurrent requests never get more than the rate admitted"""
+        view = ThrottledView("burst")
+        barrier = threading.Barrier(20)
+        results = []
+
+        def hit():
+            barrier.wait()
+            for _ in range(5):
+                results.append(BurstThrottle().allow_request(self.request(), view))
+
+        threads = [threading.Thread(target=hit) for _ in range(20)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(len(results), 100)
+        self.assertEqual(results.count(True), 5)
@@ -0,0 +1,164 @@
+# pylint: skip-file
+
+from unittest.mock import patch
+from django.urls import reverse
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import DatabaseError
+from django.test import override_settings
+from django_redis import get_redis_connection
+from rest_framework import status
+from rest_framework.test import APITestCase, APIClient
+from rest_framework_simplejwt.exceptions import TokenError
+from rest_framework_simplejwt.token_blacklist.models import (
+    BlacklistedToken,
+    OutstandingToken,
+)
+from auth_api.principals import get_principal
+from auth_api.tasks import archive_refresh_tokens
+from auth_api.tokens import ClaimsRefreshToken
+from auth_api.token_state import DatabaseTokenState, RedisTokenState
+
+
+TOKEN_REFRESH_URL = reverse("token-refresh")
+LOGOUT_URL = reverse("logout")
+
+
+def create_user(**params):
+    """Create and return a new user"""
+    return get_user_model().objects.create_user(**params)
+
+
+class RedisTokenStateTests(APITestCase):
+    """Test the Redis refresh token state"""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = create_user(
+            email="state@example.com",
+            password="Django@123",
+            is_email_verified=True,
+        )
+        get_redis_connection("default").delete(RedisTokenState.ARCHIVE_KEY)
+        cache.clear()
+
+    def tearDown(self):
+        get_redis_connection("default").delete(RedisTokenState.ARCHIVE_KEY)
+        cache.clear()
+
+    def test_refresh_and_logout_do_no_sql(self):
+        """Rotating and revoking refresh tokens only touch Redis"""
+        refresh = ClaimsRefreshToken.for_user(self.user)
+        get_principal(self.user.id)  # warm the principal cache
+
+        with self.assertNumQueries(0):
+            res = self.client.post(
+                TOKEN_REFRESH_URL, {"refresh": str(refresh)}, format="json"
+            )
+            self.assertEqual(res.status_code, status.HTTP_200_OK)
+
+            res = self.client.post(
+                LOGOUT_URL, {"refresh": res.data["refresh_token"]}, format="json"
+            )
+            self.assertEqual(res.status_code, status.HTTP_200_OK)
+
+        self.assertFalse(OutstandingToken.objects.exists())
+        self.assertFalse(BlacklistedToken.objects.exists())
+
+    def test_rotated_token_is_revoked(self):
+        """A refresh token cannot be used after rotation"""
+        refresh = str(ClaimsRefreshToken.for_user(self.user))
+
+        res = self.client.post(TOKEN_REFRESH_URL, {"refresh": refresh}, format="json")
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+
+        res = self.client.post(TOKEN_REFRESH_URL, {"refresh": refresh}, format="json")
+        self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_logout_revokes_token(self):
+        """A logged out refresh token is rejected"""
+        refresh = str(ClaimsRefreshToken.for_user(self.user))
+
+        self.client.post(LOGOUT_URL, {"refresh": refresh}, format="json")
+
+        with self.assertRaises(TokenError):
+            ClaimsRefreshToken(refresh)
+
+    def test_revoke_is_won_once(self):
+        """Only the first of two racing revocations succeeds"""
+        refresh = ClaimsRefreshToken.for_user(self.user)
+
+        self.assertTrue(refresh.blacklist())
+        self.assertFalse(refresh.blacklist())
+
+    def test_state_expires_with_token(self):
+        """Redis keys expire with the refresh token"""
+        refresh = ClaimsRefreshToken.for_user(self.user)
+        refresh.blacklist()
+        redis = get_redis_connection("default")
+        jti = refresh["jti"]
+
+        for key in (f"refresh_token_{jti}", f"refresh_revoked_{jti}"):
+            ttl = redis.ttl(key)
+            self.assertGreater(ttl, 0)
+            self.assertLessEqual(ttl, int(refresh.lifetime.total_seconds()))
+
+    def test_database_blacklist_before_switch(self):
+        """Tokens blacklisted in the database before Redis stay revoked"""
+        with patch.object(ClaimsRefreshToken, "token_state", DatabaseTokenState()):
+            revoked = ClaimsRefreshToken.for_user(self.user)
+            revoked.blacklist()
+            valid = ClaimsRefreshToken.for_user(self.user)
+
+        with self.assertRaises(TokenError):
+            ClaimsRefreshToken(str(revoked))
+        ClaimsRefreshToken(str(valid))
+
+    @override_settings(TOKEN_STATE_ARCHIVE=True)
+    def test_archive_to_database(self):
+        """Queued records are written to the token_blacklist tables"""
+        with patch.object(ClaimsRefreshToken, "token_state", RedisTokenState()):
+            refresh = ClaimsRefreshToken.for_user(self.user)
+            refresh.blacklist()
+            ClaimsRefreshToken.for_user(self.user)
+
+        self.assertEqual(archive_refresh_tokens(), 3)
+        self.assertEqual(OutstandingToken.objects.count(), 2)
+        self.assertEqual(BlacklistedToken.objects.get().token.jti, refresh["jti"])
+        self.assertEqual(archive_refresh_tokens(), 0)
+
+    @override_settings(TOKEN_STATE_ARCHIVE=True)
+    def test_failed_archive_kept(self):
+        """Records of a failed database write are archived by the next run"""
+        with patch.object(ClaimsRefreshToken, "token_state", RedisTokenState()):
+            refresh = ClaimsRefreshToken.for_user(self.user)
+            refresh.blacklist()
+
+        with patch.object(
+            BlacklistedToken.objects, "bulk_create", side_effect=DatabaseError
+        ), self.assertRaises(DatabaseError):
+            archive_refresh_tokens()
+        self.assertFalse(OutstandingToken.objects.exists())
+
+        self.assertEqual(archive_refresh_tokens(), 2)
+        self.assertEqual(BlacklistedToken.objects.get().token.jti, refresh["jti"])
+        self.assertEqual(archive_refresh_tokens(), 0)
+
+
+class DatabaseTokenStateTests(APITestCase):
+    """Test the database refresh token state"""
+
+    def setUp(self):
+        self.user = create_user(email="state@example.com", password="Django@123")
+
+    def test_database_state(self):
+        """The database backend uses the token_blacklist tables"""
+        with patch.object(ClaimsRefreshToken, "token_state", DatabaseTokenState()):
+            refresh = ClaimsRefreshToken.for_user(self.user)
+            self.assertEqual(OutstandingToken.objects.get().jti, refresh["jti"])
+
+            self.assertTrue(refresh.blacklist())
+            self.assertFalse(refresh.blacklist())
+
+            with self.assertRaises(TokenError):
+                ClaimsRefreshToken(str(refresh))
@@ -0,0 +1,323 @@
+# pylint: skip-file
+
+import io
+import json
+import base64
+import shutil
+import tempfile
+import boto3
+import requests
+from moto import mock_aws
+from PIL import Image
+from django.contrib.auth import get_user_model
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.files.uploadhandler import StopUpload
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APIClient
+from auth_api.uploads import ProfileImageUploadHandler
+
+
+User = get_user_model()
+
+BUCKET = "media-bucket"
+S3_STORAGES = {
+    "default": {
+        "BACKEND": "storages.backends.s3.S3Storage",
+        "OPTIONS": {
+            "bucket_name": BUCKET,
+            "region_name": "us-east-1",
+            "access_key": "testing",
+            "secret_key": "testing",
+        },
+    },
+    "staticfiles": {
+        "BACKEND": "django.contrib.staticfiles.storage.StaticFilesStorage",
+    },
+}
+
+
+def create_user(email="user@example.com", **kwargs):
+    """Helper function to create a user"""
+    return User.objects.create_user(
+        email=email, username=email, password="Testpass123!", **kwargs
+    )
+
+
+def presign_url(user_id):
+    """Return the presign URL of the user's profile image"""
+    return reverse("user-presign-image", args=[user_id])
+
+
+def confirm_url(user_id):
+    """Return the confirm URL of the user's profile image"""
+    return reverse("user-confirm-image", args=[user_id])
+
+
+def png_bytes(size=(300, 300), mode="RGB", **kwargs):
+    """PNG image of the given size"""
+    output = io.BytesIO()
+    Image.new(mode, size).save(output, "PNG", **kwargs)
+    return output.getvalue()
+
+
+def image_upload_url(user_id):
+    """Return the image upload URL of the user"""
+    return reverse("user-upload-image", args=[user_id])
+
+
+@override_settings(STORAGES=S3_STORAGES)
+class DirectUploadTests(TestCase):
+    """Test the direct profile image uploads against a mocked S3"""
+
+    def setUp(self):
+        mock = mock_aws()
+        mock.start()
+        self.addCleanup(mock.stop)
+        self.s3 = boto3.client("s3", region_name="us-east-1")
+        self.s3.create_bucket(Bucket=BUCKET)
+
+        self.user = create_user()
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+
+    def presign(self, content_type="image/png", user=None):
+        return self.client.post(
+            presign_url((user or self.user).id),
+            {"content_type": content_type},
+            format="json",
+        )
+
+    def post_file(self, upload, content, content_type="image/png"):
+        """Post the file with the presigned form, as the client would"""
+        return requests.post(
+            upload["url"],
+            data=upload["fields"],
+            files={"file": ("avatar", content, content_type)},
+        )
+
+    def confirm(self, upload_id):
+        with self.captureOnCommitCallbacks(execute=True):
+            res = self.client.post(
+                confirm_url(self.user.id), {"upload_id": upload_id}, format="json"
+            )
+        self.user.refresh_from_db()
+        return res
+
+    def test_direct_upload(self):
+        """A posted image is attached to the user and processed"""
+        upload = self.presign().data
+
+        self.assertEqual(self.post_file(upload, png_bytes()).status_code, 204)
+        res = self.confirm(upload["upload_id"])
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        name = self.user.profile_img.name
+        self.assertTrue(name.startswith(f"profile_images/uploads/{self.user.id}/"))
+        self.assertEqual(self.user.profile_img_variants["source"], name)
+        self.assertTrue(
+            default_storage.exists(self.user.profile_img_variants["64"]["webp"])
+        )
+
+    def test_presign_policy(self):
+        """The form only accepts one key, the content type and the size limit"""
+        upload = self.presign().data
+
+        policy = json.loads(base64.b64decode(upload["fields"]["policy"]))
+        self.assertIn({"key": upload["fields"]["key"]}, policy["conditions"])
+        self.assertIn({"Content-Type": "image/png"}, policy["conditions"])
+        self.assertIn(
+            ["content-length-range", 1, 2 * 1024 * 1024], policy["conditions"]
+        )
+
+    def test_too_large(self):
+        """Objects over the size limit are deleted on confirmation"""
+        upload = self.presign().data
+        self.s3.put_object(
+            Bucket=BUCKET,
+            Key=upload["fields"]["key"],
+            Body=png_bytes() + b"0" * (2 * 1024 * 1024),
+            ContentType="image/png",
+        )
+
+        res = self.confirm(upload["upload_id"])
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(res.data["error"], "Profile image size should not exceed 2MB.")
+        self.assertEqual(self.s3.list_objects_v2(Bucket=BUCKET)["KeyCount"], 0)
+
+    def test_invalid_content_type(self):
+        """Only JPEG and PNG images can be presigned"""
+        res = self.presign(content_type="image/gif")
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(res.data["error"], "Profile image type should be JPEG, PNG")
+
+    def test_other_user(self):
+        """Users cannot presign uploads for other users"""
+        other = create_user(email="other@example.com")
+
+        res = self.presign(user=other)
+
+        self.assertEqual(res.status_code, status.HTTP_403_FORBIDDEN)
+
+    def test_not_uploaded(self):
+        """Confirming before the upload fails"""
+        upload = self.presign().data
+
+        res = self.confirm(upload["upload_id"])
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(res.data["error"], "The profile image was not uploaded.")
+
+    def test_not_an_image(self):
+        """Objects that are not the declared image are deleted"""
+        upload = self.presign().data
+        self.post_file(upload, b"not an image")
+
+        res = self.confirm(upload["upload_id"])
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(self.s3.list_objects_v2(Bucket=BUCKET)["KeyCount"], 0)
+        self.assertFalse(self.user.profile_img)
+
+    def test_tampered_upload_id(self):
+        """Upload ids are signed"""
+        upload = self.presign().data
+
+        res = self.confirm(upload["upload_id"] + "x")
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(res.data["error"], "Invalid or expired upload.")
+
+    def test_replaces_previous_upload(self):
+        """A new upload deletes the previous image, confirming twice keeps it"""
+        first = self.presign().data
+        self.post_file(first, png_bytes())
+        self.confirm(first["upload_id"])
+        previous = self.user.profile_img.name
+
+        second = self.presign().data
+        self.post_file(second, png_bytes(size=(100, 100)))
+        self.confirm(second["upload_id"])
+        self.confirm(second["upload_id"])
+
+        self.assertFalse(default_storage.exists(previous))
+        self.assertTrue(default_storage.exists(self.user.profile_img.name))
+
+    @override_settings(
+        STORAGES={
+            **S3_STORAGES,
+            "default": {
+                "BACKEND": "django.core.files.storage.FileSystemStorage",
+            },
+        }
+    )
+    def test_local_storage(self):
+        """Direct uploads need the S3 storage"""
+        res = self.presign()
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(res.data["error"], "Direct uploads are not available.")
+
+
+class ProfileImageUploadHandlerTests(TestCase):
+    """Test the checks of profile images while they are received"""
+
+    def setUp(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root, ignore_errors=True)
+        settings_override = override_settings(
+            MEDIA_ROOT=media_root, MEDIA_URL="/media/"
+        )
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        self.user = create_user()
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+
+    def handler(self, content_type="image/png"):
+        handler = ProfileImageUploadHandler()
+        handler.new_file("profile_img", "avatar", content_type, None)
+        return handler
+
+    def upload(self, content, content_type="image/png"):
+        image = SimpleUploadedFile("avatar.png", content, content_type)
+        with self.captureOnCommitCallbacks(execute=True):
+            res = self.client.patch(
+                image_upload_url(self.user.id), {"profile_img": image}
+            )
+        self.user.refresh_from_db()
+        return res
+
+    def test_valid_image(self):
+        """Images are passed on once their header is checked"""
+        res = self.upload(png_bytes())
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertTrue(default_storage.exists(self.user.profile_img.name))
+
+    def test_request_too_large(self):
+        """Requests over the size limit are refused without reading the body"""
+        res = self.upload(png_bytes() + b"0" * (3 * 1024 * 1024))
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(res.data["error"], "Profile image size should not exceed 2MB.")
+        self.assertFalse(self.user.profile_img)
+
+    def test_not_an_image(self):
+        """Files without the image's leading bytes stop at the first chunk"""
+        handler = self.handler()
+
+        with self.assertRaises(StopUpload):
+            handler.receive_data_chunk(b"not an image" * 1000, 0)
+        self.assertEqual(handler.error, "Profile image type should be JPEG, PNG")
+
+        res = self.upload(b"not an image")
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertFalse(self.user.profile_img)
+
+    def test_declared_type_mismatch(self):
+        """The image must be of its declared type"""
+        res = self.upload(png_bytes(), content_type="image/jpeg")
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(res.data["error"], "Profile image type should be JPEG, PNG")
+
+    def test_stream_too_large(self):
+        """The upload stops at the first chunk over the size limit"""
+        handler = self.handler()
+        handler.receive_data_chunk(png_bytes(), 0)
+
+        with self.assertRaises(StopUpload):
+            handler.receive_data_chunk(b"0" * 1024, 2 * 1024 * 1024)
+        self.assertEqual(handler.error, "Profile image size should not exceed 2MB.")
+
+    def test_header_across_chunks(self):
+        """A header split over chunks is parsed once complete"""
+        content = png_bytes()
+        handler = self.handler()
+
+        handler.receive_data_chunk(content[:20], 0)
+        self.assertFalse(handler.checked)
+        handler.receive_data_chunk(content[20:], 20)
+        self.assertTrue(handler.checked)
+
+    def test_truncated_header(self):
+        """Files ending before their header are refused"""
+        handler = self.handler()
+        handler.receive_data_chunk(png_bytes()[:20], 0)
+
+        with self.assertRaises(StopUpload):
+            handler.file_complete(20)
+        self.assertEqual(handler.error, "Profile image type should be JPEG, PNG")
+
+    def test_too_many_pixels(self):
+        """Images too large to decode are refused from their header"""
+        handler = self.handler()
+
+        with self.assertRaises(StopUpload):
+            handler.receive_data_chunk(png_bytes(size=(15000, 15000), mode="1"), 0)
+        self.assertEqual(handler.error, "Profile image size should not exceed 2MB.")
@@ -1,4 +1,67 @@
+from django_redis import get_redis_connection
 from rest_framework.exceptions import Throttled
+from rest_framework.throttling import ScopedRateThrottle
+
+
+class RedisScopedRateThrottle(ScopedRateThrottle):
+    """Scoped rate throttle checked atomically in Redis (GCRA).
+
+    One Lua round trip per request stores a single timestamp per key (the
+    theoretical arrival time), so concurrent requests cannot be over-admitted
+    and the cost does not grow with the request history.
+
+    The rate is a burst and a refill, not a hard cap per window: a scope of
+    N/period admits N requests at once, then one every period / N, so a window
+    of one period can see up to 2N - 1 requests when N > 1. Scopes of 1/period
+    are a strict cap."""
+
+    # Allows `num_requests` in a burst, then one every `duration / num_requests`.
+    # Returns {1, 0} when allowed or {0, wait in milliseconds}.
+    GCRA_SCRIPT = """
+    local time = redis.call("TIME")
+    local now = tonumber(time[1]) * 1000 + math.floor(tonumber(time[2]) / 1000)
+    local period = tonumber(ARGV[2]) * 1000
+    local interval = period / tonumber(ARGV[1])
+    local tat = tonumber(redis.call("GET", KEYS[1]) or now)
+    local new_tat = math.max(tat, now) + interval
+    local allow_at = new_tat - period
+    if now < allow_at then
+        return {0, math.ceil(allow_at - now)}
+    end
+    redis.call("SET", KEYS[1], new_tat, "PX", math.ceil(new_tat - now))
+    return {1, 0}
+    """
+
+    wait_seconds = None
+
+    def allow_request(self, request, view):
+        self.scope = getattr(view, self.scope_attr, None)
+        self.wait_seconds = None
+
+        if not self.scope:
+            return True
+
+        self.rate = self.get_rate()
+        self.num_requests, self.duration = self.parse_rate(self.rate)
+        if self.rate is None:
+            return True
+
+        key = self.get_cache_key(request, view)
+        if key is None:
+            return True
+
+        # Runs with EVALSHA, the script body is only sent the first time
+        gcra_script = get_redis_connection("default").register_script(self.GCRA_SCRIPT)
+        allowed, wait = gcra_script(
+            keys=[f"gcra_{key}"], args=[self.num_requests, self.duration]
+        )
+
+        if not allowed:
+            self.wait_seconds = wait / 1000
+        return bool(allowed)
+
+    def wait(self):
+        return self.wait_seconds
 
 
 def check_throttle_duration(self, request):
@@ -0,0 +1,223 @@
+"""Refresh token state backends, tracking issued and revoked refresh tokens."""
+
+import json
+import time
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.utils.module_loading import import_string
+from django_redis import get_redis_connection
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.token_blacklist.models import (
+    BlacklistedToken,
+    OutstandingToken,
+)
+from rest_framework_simplejwt.utils import datetime_from_epoch
+
+
+def token_record(token):
+    """Columns of the outstanding token row of a refresh token."""
+    return {
+        "jti": token[api_settings.JTI_CLAIM],
+        "user_id": token.get(api_settings.USER_ID_CLAIM),
+        "token": str(token),
+        "created_at": int(token.current_time.timestamp()),
+        "expires_at": token["exp"],
+    }
+
+
+class DatabaseTokenState:
+    """simplejwt's token_blacklist tables, one INSERT per issued or revoked token."""
+
+    def outstand(self, token):
+        """Record an issued refresh token."""
+        record = token_record(token)
+        OutstandingToken.objects.get_or_create(
+            jti=record["jti"],
+            defaults={
+                "user_id": record["user_id"],
+                "token": record["token"],
+                "created_at": token.current_time,
+                "expires_at": datetime_from_epoch(record["expires_at"]),
+            },
+        )
+
+    def is_revoked(self, token):
+        """Check if the refresh token was revoked."""
+        return BlacklistedToken.objects.filter(
+            token__jti=token[api_settings.JTI_CLAIM]
+        ).exists()
+
+    def revoke(self, token):
+        """Revoke the refresh token, False if it was already revoked."""
+        record = token_record(token)
+        outstanding, _ = OutstandingToken.objects.get_or_create(
+            jti=record["jti"],
+            defaults={
+                "user_id": record["user_id"],
+                "token": record["token"],
+                "created_at": token.current_time,
+                "expires_at": datetime_from_epoch(record["expires_at"]),
+            },
+        )
+        _, created = BlacklistedToken.objects.get_or_create(token=outstanding)
+        return created
+
+
+class RedisTokenState:
+    """Refresh token JTIs and revocations in Redis, expiring with the tokens.
+
+    Every call is O(1) with no SQL. With TOKEN_STATE_ARCHIVE the records are
+    also queued and written to the token_blacklist tables in bulk by a task.
+    Tokens issued before the switch to Redis have no record here, their
+    revocation is still read from the token_blacklist tables."""
+
+    ARCHIVE_KEY = "refresh_token_archive"
+    PROCESSING_KEY = "refresh_token_archive_processing"
+
+    # Atomically move up to ARGV[1] records, oldest first, from the archive
+    # queue to the processing list, unless a batch is still being processed.
+    # Returns the records in the processing list.
+    CLAIM_SCRIPT = """
+    if redis.call("EXISTS", KEYS[2]) == 0 then
+        for _ = 1, tonumber(ARGV[1]) do
+            local record = redis.call("LPOP", KEYS[1])
+            if not record then
+                break
+            end
+            redis.call("RPUSH", KEYS[2], record)
+        end
+    end
+    return redis.call("LRANGE", KEYS[2], 0, -1)
+    """
+
+    def __init__(self, archive=None):
+        self.archive = settings.TOKEN_STATE_ARCHIVE if archive is None else archive
+
+    @staticmethod
+    def _connection():
+        return get_redis_connection("default")
+
+    @staticmethod
+    def _key(jti):
+        return f"refresh_token_{jti}"
+
+    @staticmethod
+    def _revoked_key(jti):
+        return f"refresh_revoked_{jti}"
+
+    @staticmethod
+    def _ttl(token):
+        return max(int(token["exp"] - time.time()), 1)
+
+    def _queue(self, pipeline, token, **extra):
+        # Only archived records need the encoded token, which signs it again
+        if self.archive:
+            pipeline.rpush(
+                self.ARCHIVE_KEY, json.dumps({**token_record(token), **extra})
+            )
+
+    def outstand(self, token):
+        """Record an issued refresh token."""
+        pipeline = self._connection().pipeline(transaction=False)
+        pipeline.set(
+            self._key(token[api_settings.JTI_CLAIM]),
+            token.get(api_settings.USER_ID_CLAIM),
+            ex=self._ttl(token),
+        )
+        self._queue(pipeline, token)
+        pipeline.execute()
+
+    def is_revoked(self, token):
+        """Check if the refresh token was revoked."""
+        jti = token[api_settings.JTI_CLAIM]
+        pipeline = self._connection().pipeline(transaction=False)
+        pipeline.exists(self._revoked_key(jti))
+        pipeline.exists(self._key(jti))
+        revoked, outstanding = pipeline.execute()
+
+        if revoked:
+            return True
+        # Not issued through Redis, it may be blacklisted in the database
+        if not outstanding:
+            return DatabaseTokenState().is_revoked(token)
+        return False
+
+    def revoke(self, token):
+        """Revoke the refresh token, False if it was already revoked (e.g. two
+        refreshes racing with the same token)."""
+        pipeline = self._connection().pipeline(transaction=False)
+        pipeline.set(
+            self._revoked_key(token[api_settings.JTI_CLAIM]),
+            1,
+            ex=self._ttl(token),
+            nx=True,
+        )
+        self._queue(pipeline, token, revoked=True)
+        return bool(pipeline.execute()[0])
+
+    def archive_pending(self, batch_size):
+        """Write up to batch_size queued records to the token_blacklist tables.
+        Returns the number of records taken from the queue.
+
+        The batch stays in the processing list until the rows are committed, a
+        batch left there by a failed run is written again first (the inserts
+        ignore conflicts)."""
+        connection = self._connection()
+        claim_script = connection.register_script(self.CLAIM_SCRIPT)
+        records = [
+            json.loads(record)
+            for record in claim_script(
+                keys=[self.ARCHIVE_KEY, self.PROCESSING_KEY], args=[batch_size]
+            )
+        ]
+
+        if not records:
+            return 0
+
+        with transaction.atomic():
+            self._write_records(records)
+        connection.delete(self.PROCESSING_KEY)
+        return len(records)
+
+    @staticmethod
+    def _write_records(records):
+        """Insert the outstanding and blacklisted token rows of the records."""
+        # Tokens of users deleted in the meantime cannot reference them
+        user_ids = set(
+            get_user_model()
+            .objects.filter(id__in={record["user_id"] for record in records})
+            .values_list("id", flat=True)
+        )
+        OutstandingToken.objects.bulk_create(
+            [
+                OutstandingToken(
+                    jti=record["jti"],
+                    user_id=(
+                        record["user_id"] if record["user_id"] in user_ids else None
+                    ),
+                    token=record["token"],
+                    created_at=datetime_from_epoch(record["created_at"]),
+                    expires_at=datetime_from_epoch(record["expires_at"]),
+                )
+                for record in records
+            ],
+            ignore_conflicts=True,
+        )
+
+        revoked = {record["jti"] for record in records if record.get("revoked")}
+        if revoked:
+            BlacklistedToken.objects.bulk_create(
+                [
+                    BlacklistedToken(token_id=token_id)
+                    for token_id in OutstandingToken.objects.filter(
+                        jti__in=revoked
+                    ).values_list("id", flat=True)
+                ],
+                ignore_conflicts=True,
+            )
+
+
+def get_token_state():
+    """Token state backend configured by TOKEN_STATE_BACKEND."""
+    return import_string(settings.TOKEN_STATE_BACKEND)()
@@ -0,0 +1,93 @@
+"""JWT tokens carrying the user claims and their revocation."""
+
+import time
+from django.core.cache import cache
+from django.utils.translation import gettext_lazy as _
+from rest_framework_simplejwt.exceptions import TokenError
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.tokens import AccessToken, BlacklistMixin, RefreshToken
+from .backends import token_backend
+from .principals import get_user_role
+from .token_state import get_token_state
+
+CLAIM_FIELDS = ("is_active", "is_staff", "is_superuser")
+
+# Access tokens issued before a revocation are dead after their lifetime anyway
+REVOCATION_TIMEOUT = int(api_settings.ACCESS_TOKEN_LIFETIME.total_seconds())
+
+
+class PreciseIssuedAtMixin:
+    """Issue time with microseconds (a NumericDate may have decimals), told
+    apart from a revocation in the same second."""
+
+    def set_iat(self, claim="iat", at_time=None):
+        if at_time is None:
+            at_time = self.current_time
+        self.payload[claim] = at_time.timestamp()
+
+
+class ClaimsAccessToken(PreciseIssuedAtMixin, AccessToken):
+    """Access token verified through the cached token backend."""
+
+    _token_backend = token_backend
+
+
+class ClaimsRefreshToken(PreciseIssuedAtMixin, RefreshToken):
+    """Refresh token carrying the user claims, copied into every access token.
+    Issued and revoked tokens are tracked by the token state backend."""
+
+    _token_backend = token_backend
+    access_token_class = ClaimsAccessToken
+    # Access tokens keep their own issue time, checked against revocations
+    no_copy_claims = (*RefreshToken.no_copy_claims, "iat")
+    token_state = get_token_state()
+
+    def set_user_claims(self, user):
+        """Stamp the role and flags of the user (or its principal) on the token."""
+        self["role"] = get_user_role(user)
+        for field in CLAIM_FIELDS:
+            self[field] = getattr(user, field)
+
+    @classmethod
+    def for_user(cls, user):
+        """Create a refresh token with the user claims."""
+        # Skip BlacklistMixin.for_user, the state backend records the token
+        token = super(BlacklistMixin, cls).for_user(user)
+        token.set_user_claims(user)
+        token.outstand()
+        return token
+
+    def outstand(self):
+        """Record the token as issued."""
+        self.token_state.outstand(self)
+
+    def check_blacklist(self):
+        """Raise TokenError if the token was revoked."""
+        if self.token_state.is_revoked(self):
+            raise TokenError(_("Token is blacklisted"))
+
+    def blacklist(self):
+        """Revoke the token, False if it was already revoked."""
+        return self.token_state.revoke(self)
+
+
+def revocation_key(user_id):
+    """Cache key of the user's token revocation time."""
+    return f"revoked_{user_id}"
+
+
+def revoke_user_tokens(*user_ids):
+    """Reject the access tokens already issued to the given users."""
+    if user_ids:
+        revoked_at = time.time()
+        cache.set_many(
+            {revocation_key(user_id): revoked_at for user_id in user_ids},
+            timeout=REVOCATION_TIMEOUT,
+        )
+
+
+def is_token_revoked(token):
+    """Check if the token was issued before the user's claims changed. Both
+    times have microseconds, a token issued right after the change works."""
+    revoked_at = cache.get(revocation_key(token[api_settings.USER_ID_CLAIM]))
+    return revoked_at is not None and token.get("iat", 0) < revoked_at
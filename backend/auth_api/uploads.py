@@ -0,0 +1,216 @@
+"""Profile image uploads, checked while streamed to the app servers or going
+from the client straight to S3."""
+
+import io
+import uuid
+from PIL import Image
+from botocore.exceptions import ClientError
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.core.files.uploadhandler import FileUploadHandler, StopUpload
+from django.http import QueryDict
+from django.utils.datastructures import MultiValueDict
+from itsdangerous import URLSafeTimedSerializer, BadSignature, SignatureExpired
+from storages.backends.s3 import S3Storage
+
+SIZE_ERROR = "Profile image size should not exceed 2MB."
+TYPE_ERROR = "Profile image type should be JPEG, PNG"
+
+# Extension, leading bytes and Pillow format of each accepted content type
+IMAGE_CONTENT_TYPES = {
+    "image/jpeg": ("jpg", b"\xff\xd8\xff", "JPEG"),
+    "image/png": ("png", b"\x89PNG\r\n\x1a\n", "PNG"),
+}
+
+
+class ProfileImageUploadHandler(FileUploadHandler):
+    """Checks a profile image upload while it is received, before it is buffered.
+
+    Requests too large for an image are refused without reading the body. The
+    leading bytes of the file are sniffed and its header parsed by Pillow, no
+    pixels are decoded, as soon as they arrive. The upload stops at the first
+    byte over PROFILE_IMAGE_MAX_BYTES or the first invalid header, the reason is
+    kept as `error` and the file is dropped.
+    """
+
+    chunk_size = 16 * 1024
+    MAX_BYTES = settings.PROFILE_IMAGE_MAX_BYTES
+    # JPEG headers can come after a large EXIF segment
+    HEADER_BYTES = 128 * 1024
+    # Room for the multipart form around the file
+    FORM_BYTES = 16 * 1024
+
+    def __init__(self, request=None):
+        super().__init__(request)
+        self.error = None
+        self.head = b""
+        self.checked = False
+
+    def handle_raw_input(
+        self, input_data, META, content_length, boundary, encoding=None
+    ):  # pylint: disable=C0103,R0913,R0917
+        if content_length > self.MAX_BYTES + self.FORM_BYTES:
+            self.error = SIZE_ERROR
+            # Handled as an empty form, the body is never read
+            return QueryDict(encoding=encoding), MultiValueDict()
+        return None
+
+    def new_file(self, *args, **kwargs):
+        super().new_file(*args, **kwargs)
+        self.head = b""
+        self.checked = False
+
+    def receive_data_chunk(self, raw_data, start):
+        if start + len(raw_data) > self.MAX_BYTES:
+            self.stop(SIZE_ERROR)
+
+        if not self.checked:
+            self.head += raw_data
+            self.check_header()
+        return raw_data
+
+    def file_complete(self, file_size):
+        # Files smaller than a header are checked once complete
+        if not self.checked:
+            self.check_header(complete=True)
+        # The file itself is kept by the next handlers
+
+    def check_header(self, complete=False):
+        """Sniff the leading bytes and parse the image header received so far."""
+        if self.content_type not in IMAGE_CONTENT_TYPES:
+            self.stop(TYPE_ERROR)
+
+        _, magic, image_format = IMAGE_CONTENT_TYPES[self.content_type]
+        if len(self.head) < len(magic) and not complete:
+            return
+        if not self.head.startswith(magic):
+            self.stop(TYPE_ERROR)
+
+        try:
+            with Image.open(io.BytesIO(self.head), formats=(image_format,)) as image:
+                pixels = image.width * image.height
+        except Image.DecompressionBombError:
+            self.stop(SIZE_ERROR)
+        except (OSError, SyntaxError):
+            # The header may still be incomplete
+            if complete or len(self.head) >= self.HEADER_BYTES:
+                self.stop(TYPE_ERROR)
+            return
+
+        if pixels > Image.MAX_IMAGE_PIXELS:
+            self.stop(SIZE_ERROR)
+        self.checked = True
+        self.head = b""
+
+    def stop(self, error):
+        """Abort the upload without reading the rest of the body."""
+        self.error = error
+        raise StopUpload(connection_reset=True)
+
+
+class DirectUpload:
+    """Presigned POST uploads of profile images to the S3 media bucket.
+
+    `presign` returns a POST form restricted to a single key, the image content
+    type and PROFILE_IMAGE_MAX_BYTES, with a signed upload id. Once the client
+    posted the file, `confirm` checks the object and returns its storage name.
+    The image bytes never go through the app servers.
+    """
+
+    SECRET_KEY = settings.SECRET_KEY
+    SALT = "direct-upload"
+    EXPIRY_SECONDS = settings.DIRECT_UPLOAD_EXPIRY_SECONDS
+    MAX_BYTES = settings.PROFILE_IMAGE_MAX_BYTES
+    UPLOAD_PREFIX = "profile_images/uploads/"
+    CONTENT_TYPES = IMAGE_CONTENT_TYPES
+
+    @staticmethod
+    def is_available():
+        """Whether the media storage is S3, direct uploads need a bucket."""
+        return isinstance(default_storage, S3Storage)
+
+    @staticmethod
+    def _client():
+        return default_storage.connection.meta.client
+
+    @staticmethod
+    def _key(name):
+        """S3 key of a storage name."""
+        return default_storage._normalize_name(name)  # pylint: disable=W0212
+
+    @classmethod
+    def presign(cls, user_id, content_type):
+        """Presigned POST for one profile image of the user."""
+        if not cls.is_available():
+            raise ValueError("Direct uploads are not available.")
+        if content_type not in cls.CONTENT_TYPES:
+            raise ValueError(TYPE_ERROR)
+
+        extension = cls.CONTENT_TYPES[content_type][0]
+        name = f"{cls.UPLOAD_PREFIX}{user_id}/{uuid.uuid4().hex}.{extension}"
+        post = cls._client().generate_presigned_post(
+            Bucket=default_storage.bucket_name,
+            Key=cls._key(name),
+            Fields={"Content-Type": content_type},
+            Conditions=[
+                {"Content-Type": content_type},
+                ["content-length-range", 1, cls.MAX_BYTES],
+            ],
+            ExpiresIn=cls.EXPIRY_SECONDS,
+        )
+
+        upload_id = URLSafeTimedSerializer(cls.SECRET_KEY).dumps(
+            {"user_id": user_id, "name": name, "content_type": content_type},
+            salt=cls.SALT,
+        )
+        return {
+            "url": post["url"],
+            "fields": post["fields"],
+            "upload_id": upload_id,
+            "expires_in": cls.EXPIRY_SECONDS,
+        }
+
+    @classmethod
+    def confirm(cls, user_id, upload_id):
+        """Check the uploaded object and return its storage name, objects that
+        are too large or not a JPEG or PNG image are deleted."""
+        if not cls.is_available():
+            raise ValueError("Direct uploads are not available.")
+
+        try:
+            # The upload may start until the form expires, then takes a while
+            payload = URLSafeTimedSerializer(cls.SECRET_KEY).loads(
+                upload_id, salt=cls.SALT, max_age=2 * cls.EXPIRY_SECONDS
+            )
+        except (SignatureExpired, BadSignature) as e:
+            raise ValueError("Invalid or expired upload.") from e
+
+        if payload.get("user_id") != user_id:
+            raise ValueError("Invalid or expired upload.")
+
+        client = cls._client()
+        bucket = default_storage.bucket_name
+        key = cls._key(payload["name"])
+
+        try:
+            head = client.head_object(Bucket=bucket, Key=key)
+        except ClientError as e:
+            raise ValueError("The profile image was not uploaded.") from e
+
+        # Only the first bytes are read, to check the file is what it claims
+        magic = cls.CONTENT_TYPES[payload["content_type"]][1]
+        start = client.get_object(
+            Bucket=bucket, Key=key, Range=f"bytes=0-{len(magic) - 1}"
+        )["Body"].read()
+
+        error = None
+        if head["ContentLength"] > cls.MAX_BYTES:
+            error = SIZE_ERROR
+        elif head.get("ContentType") != payload["content_type"] or start != magic:
+            error = TYPE_ERROR
+
+        if error:
+            client.delete_object(Bucket=bucket, Key=key)
+            raise ValueError(error)
+
+        return payload["name"]
@@ -28,4 +28,9 @@ urlpatterns = [
     path("token/", views.TokenView.as_view(), name="token"),
     path("token/refresh/", views.RefreshTokenView.as_view(), name="token-refresh"),
     path("social-auth/", views.SocialAuthView.as_view(), name="social-auth"),
+    path(
+        "social-auth/async/",
+        views.AsyncSocialAuthView.as_view(),
+        name="social-auth-async",
+    ),
 ]
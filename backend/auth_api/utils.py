@@ -1,11 +1,17 @@
+import time
 import random
+import hashlib
 import logging
+import threading
 from datetime import datetime, timezone, timedelta
 from urllib.parse import urlencode
+import requests
+from requests.adapters import HTTPAdapter
 from django.core.cache import cache
 from django.conf import settings
-from django.core.mail import EmailMessage
+from django_redis import get_redis_connection
 from itsdangerous import URLSafeTimedSerializer, BadSignature, SignatureExpired
+from .tasks import send_emails
 
 # from twilio.rest import Client
 
@@ -15,6 +21,14 @@ APP_NAME = settings.APP_NAME
 logger = logging.getLogger(__name__)
 
 
+def queue_email(subject, body, to, expires=None):
+    """Send an email from the email queue, the request does not wait for SMTP.
+    Emails still queued after `expires` seconds are dropped."""
+    send_emails.apply_async(
+        args=[[{"subject": subject, "body": body, "to": to}]], expires=expires
+    )
+
+
 class EmailOtp:
     """Email Otp Sender (used during Login)"""
 
@@ -26,9 +40,9 @@ class EmailOtp:
 
     @staticmethod
     def send_email_otp(email, otp):
-        """Send an OTP to the user's email."""
+        """Queue an OTP email, dropped if not sent before the OTP expires."""
         try:
-            email = EmailMessage(
+            queue_email(
                 subject="2 Factor Login Authentication",
                 body=(
                     f"Hi {email}, Welcome to {APP_NAME}\n\n"
@@ -36,29 +50,161 @@ class EmailOtp:
                     "The OTP will expire in 10 minutes"
                 ),
                 to=[email],
+                expires=AuthSession.EXPIRY_SECONDS,
             )
-            email.send()
 
             return True
         except Exception as e:  # pylint: disable=W0718
             logger.error("Error sending email: %s", e)
             return False
 
+
+class AuthSession:
+    """Per login auth state (used during 2FA).
+
+    Everything is kept in a single Redis hash with one TTL, so every read,
+    write and OTP check is a single round trip. A session is only started
+    after the password was verified, so consuming it with the right OTP is the
+    single use login ticket: the password is never cached or hashed again.
+    """
+
+    EXPIRY_SECONDS = 600  # 10 minutes
+    RESEND_SECONDS = 60  # OTP resend throttle window
+    MAX_OTP_ATTEMPTS = settings.MAX_OTP_ATTEMPTS
+
+    # Atomically count the attempt, compare the OTP and consume the session.
+    # Returns {1} on success, {0} if the session is gone,
+    # {-1} when the last attempt was used and {-2} on a wrong OTP.
+    VERIFY_SCRIPT = """
+    if redis.call("EXISTS", KEYS[1]) == 0 then
+        return {0}
+    end
+    local attempts = redis.call("HINCRBY", KEYS[1], "attempts", 1)
+    if redis.call("HGET", KEYS[1], "otp") ~= ARGV[1] then
+        if attempts >= tonumber(ARGV[2]) then
+            redis.call("DEL", KEYS[1])
+            return {-1}
+        end
+        return {-2}
+    end
+    redis.call("DEL", KEYS[1])
+    return {1}
+    """
+
     @staticmethod
-    def verify_otp(user_id, request_otp):
-        """Verify the OTP sent to the user's email."""
-        stored_otp = cache.get(f"otp_{user_id}")
+    def _key(user_id):
+        """Redis key of the user's auth session."""
+        return f"auth_session_{user_id}"
 
-        try:
-            request_otp = int(request_otp)
-        except Exception as e:  # pylint: disable=W0718
-            logger.error("Error sending email: %s", e)
-            return False
+    @staticmethod
+    def _connection():
+        """Raw Redis client behind the default cache."""
+        return get_redis_connection("default")
 
-        if stored_otp != request_otp:
+    @classmethod
+    def _store(cls, user_id, session, replace):
+        """Write the session fields, dropping the previous session if replace."""
+        key = cls._key(user_id)
+        session["sent_at"] = int(time.time())
+        pipe = cls._connection().pipeline(transaction=True)
+        if replace:
+            pipe.delete(key)
+            session["attempts"] = 0
+        pipe.hset(key, mapping=session)
+        pipe.expire(key, cls.EXPIRY_SECONDS)
+        pipe.execute()
+
+    @classmethod
+    def create(cls, user_id, email, otp):
+        """Start a new session, replacing any previous one."""
+        session = {"email": email, "otp": str(otp)}
+        cls._store(user_id, session, replace=True)
+
+    @classmethod
+    def resend(cls, user_id, email, otp):
+        """Replace the OTP of the session, keeping the attempts already used."""
+        session = {"email": email, "otp": str(otp)}
+        cls._store(user_id, session, replace=False)
+
+    @classmethod
+    def get(cls, user_id):
+        """Return the session data or None if the session has expired."""
+        data = cls._connection().hgetall(cls._key(user_id))
+
+        if not data:
+            return None
+
+        return {key.decode(): value.decode() for key, value in data.items()}
+
+    @classmethod
+    def recently_sent(cls, user_id):
+        """Check if an OTP was sent within the resend window."""
+        sent_at = cls._connection().hget(cls._key(user_id), "sent_at")
+
+        if sent_at is None:
             return False
-        cache.delete(f"otp_{request_otp}")
-        return True
+
+        return time.time() - int(sent_at) < cls.RESEND_SECONDS
+
+    @classmethod
+    def verify_otp(cls, user_id, request_otp):
+        """Verify the OTP and consume the session, a ValueError tells why the
+        OTP was refused."""
+        try:
+            request_otp = str(int(request_otp))
+        except (TypeError, ValueError):
+            request_otp = ""  # Still counts as an attempt
+
+        # Runs with EVALSHA, the script body is only sent the first time
+        verify_script = cls._connection().register_script(cls.VERIFY_SCRIPT)
+        result = verify_script(
+            keys=[cls._key(user_id)], args=[request_otp, cls.MAX_OTP_ATTEMPTS]
+        )
+
+        if result[0] == -1:
+            raise ValueError("Too many invalid OTP attempts. Please login again.")
+        if result[0] == -2:
+            raise ValueError("Invalid OTP")
+        if result[0] == 0:
+            raise ValueError("Session expired. Please login again.")
+
+    @classmethod
+    def delete(cls, user_id):
+        """End the session."""
+        cls._connection().delete(cls._key(user_id))
+
+
+class LoginFailures:
+    """Failed login counter per user.
+
+    Counted in a Redis key whose TTL restarts with every failure, so the user
+    row is only written when the lockout limit is reached.
+    """
+
+    EXPIRY_SECONDS = 600  # 10 minutes since the last failure
+
+    @staticmethod
+    def _key(user_id):
+        """Redis key of the user's failed login count."""
+        return f"login_failures_{user_id}"
+
+    @staticmethod
+    def _connection():
+        """Raw Redis client behind the default cache."""
+        return get_redis_connection("default")
+
+    @classmethod
+    def register(cls, user_id):
+        """Count a failed login and return the failures in the window."""
+        pipeline = cls._connection().pipeline()
+        pipeline.incr(cls._key(user_id))
+        pipeline.expire(cls._key(user_id), cls.EXPIRY_SECONDS)
+        return pipeline.execute()[0]
+
+    @classmethod
+    def reset(cls, user_id):
+        """Forget the failed logins."""
+        cls._connection().delete(cls._key(user_id))
 
 
 class EmailLink:
@@ -109,7 +255,7 @@ class EmailLink:
         link = cls._generate_link(email, "email-verification")
 
         try:
-            email_message = EmailMessage(
+            queue_email(
                 subject="Verify Your Email",
                 body=(
                     f"Hi {email}, Welcome to {APP_NAME}\n\n"
@@ -117,8 +263,8 @@ class EmailLink:
                     f"link: {link}\n\nThis link will expire in 10 minutes."
                 ),
                 to=[email],
+                expires=cls.EXPIRY_SECONDS,
             )
-            email_message.send()
             return True
         except Exception as e:  # pylint: disable=W0718
             logger.error("Error sending email: %s", e)
@@ -130,7 +276,7 @@ class EmailLink:
         link = cls._generate_link(email, "password-reset")
 
         try:
-            email_message = EmailMessage(
+            queue_email(
                 subject="Reset Your Password",
                 body=(
                     f"Hi {email}, Welcome to {APP_NAME}\n\n"
@@ -138,8 +284,8 @@ class EmailLink:
                     f"link: {link}\n\nThis link will expire in 10 minutes."
                 ),
                 to=[email],
+                expires=cls.EXPIRY_SECONDS,
             )
-            email_message.send()
             return True
         except Exception as e:  # pylint: disable=W0718
             logger.error("Error sending email: %s", e)
@@ -198,3 +344,113 @@ class PhoneOtp:
             return False
         cache.delete(f"phone_otp_{phone}")
         return True
+
+
+class Recaptcha:
+    """reCAPTCHA verifier.
+
+    Uses one keep-alive session with a tight timeout, remembers the result of
+    each token and stops calling Google for a while after repeated failures
+    (circuit breaker). While Google is unavailable tokens are accepted if
+    FAIL_OPEN, else rejected.
+    """
+
+    VERIFY_URL = settings.RECAPTCHA_VERIFY_URL
+    SECRET_KEY = settings.RECAPTCHA_SECRET_KEY
+    TIMEOUT = settings.RECAPTCHA_TIMEOUT  # (connect, read) seconds
+    FAIL_OPEN = settings.RECAPTCHA_FAIL_OPEN
+    FAILURE_THRESHOLD = settings.RECAPTCHA_FAILURE_THRESHOLD
+    RESET_SECONDS = settings.RECAPTCHA_RESET_SECONDS
+    RESULT_EXPIRY_SECONDS = 120  # reCAPTCHA tokens are valid for 2 minutes
+
+    _session = None
+    _failures = 0
+    _opened_at = None
+    _lock = threading.Lock()
+
+    @classmethod
+    def _get_session(cls):
+        """Keep-alive session shared by the requests of the process."""
+        if cls._session is None:
+            session = requests.Session()
+            session.mount("https://", HTTPAdapter(pool_maxsize=10, max_retries=0))
+            session.mount("http://", HTTPAdapter(pool_maxsize=10, max_retries=0))
+            cls._session = session
+        return cls._session
+
+    @staticmethod
+    def _key(token):
+        """Cache key of the token's result."""
+        return f"recaptcha_{hashlib.sha256(token.encode()).hexdigest()}"
+
+    @classmethod
+    def is_open(cls):
+        """Whether the breaker skips Google, it lets a request through after
+        RESET_SECONDS to check if Google is back."""
+        with cls._lock:
+            if cls._opened_at is None:
+                return False
+            if time.monotonic() - cls._opened_at >= cls.RESET_SECONDS:
+                cls._opened_at = time.monotonic()
+                return False
+            return True
+
+    @classmethod
+    def _record(cls, success):
+        with cls._lock:
+            if success:
+                cls._failures = 0
+                cls._opened_at = None
+                return
+
+            cls._failures += 1
+            if cls._failures >= cls.FAILURE_THRESHOLD:
+                cls._opened_at = time.monotonic()
+
+    @classmethod
+    def reset(cls):
+        """Close the breaker."""
+        with cls._lock:
+            cls._failures = 0
+            cls._opened_at = None
+
+    @classmethod
+    def _unavailable(cls, reason):
+        logger.warning(
+            "reCAPTCHA unavailable (%s), failing %s",
+            reason,
+            "open" if cls.FAIL_OPEN else "closed",
+        )
+        if cls.FAIL_OPEN:
+            return True
+        raise ValueError("reCAPTCHA validation is unavailable. Try again later.")
+
+    @classmethod
+    def verify(cls, token):
+        """Verify the token, raises ValueError if Google is unavailable and the
+        verifier fails closed."""
+        if not token:
+            return False
+
+        result = cache.get(cls._key(token))
+        if result is not None:
+            return result
+
+        if cls.is_open():
+            return cls._unavailable("circuit open")
+
+        try:
+            response = cls._get_session().post(
+                cls.VERIFY_URL,
+                data={"secret": cls.SECRET_KEY, "response": token},
+                timeout=cls.TIMEOUT,
+            )
+            response.raise_for_status()
+            result = bool(response.json().get("success"))
+        except (requests.RequestException, ValueError) as e:
+            cls._record(False)
+            return cls._unavailable(e)
+
+        cls._record(True)
+        cache.set(cls._key(token), result, timeout=cls.RESULT_EXPIRY_SECONDS)
+        return result
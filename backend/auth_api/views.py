@@ -1,18 +1,16 @@
 """Views for Auth API."""  # pylint: disable=C0302
 
 import json
+from functools import partial
 from datetime import datetime, timezone, timedelta
-import requests
+from asgiref.sync import sync_to_async
 from rest_framework import status
 from rest_framework.viewsets import ModelViewSet
 from rest_framework.views import APIView
 from rest_framework.permissions import AllowAny, IsAuthenticated, IsAdminUser
-from rest_framework.throttling import ScopedRateThrottle
 from rest_framework.response import Response
 from rest_framework.decorators import action
 from rest_framework.parsers import MultiPartParser, FormParser
-from rest_framework_simplejwt.authentication import JWTAuthentication
-from rest_framework_simplejwt.tokens import RefreshToken
 from rest_framework_simplejwt.views import TokenObtainPairView, TokenRefreshView
 from rest_framework_simplejwt.exceptions import InvalidToken, TokenError
 from django_filters.rest_framework import DjangoFilterBackend
@@ -20,20 +18,47 @@ from drf_spectacular.utils import extend_schema, OpenApiResponse, OpenApiParamet
 from django.conf import settings
 from django.contrib.auth import get_user_model
 from django.core.cache import cache
+from django.core.handlers.asgi import ASGIRequest
+from django.db import transaction
+from django.http import JsonResponse
+from django.views import View
 from django.utils.timezone import now
 from django.middleware.csrf import get_token
 from django.utils.decorators import method_decorator
-from django.views.decorators.csrf import csrf_protect
+from django.views.decorators.csrf import csrf_exempt, csrf_protect
 from social_django.utils import load_backend, load_strategy
 from social_core.exceptions import AuthException
+from backend.conditional import ConditionalRetrieveMixin
 from backend.renderers import ViewRenderer
+from backend.streaming import StreamingListMixin
 from .paginations import UserPagination
 from .filters import UserFilter
-from .utils import EmailOtp, EmailLink, PhoneOtp
-from .throttles import check_throttle_duration, start_throttle
+from .principals import Principal, get_principal, get_user_role, with_role
+from .authentication import ClaimsJWTAuthentication
+from .backends import KeyRing, token_backend
+from .tokens import ClaimsRefreshToken
+from .social import SocialProviders
+from .images import discard_profile_image
+from .uploads import DirectUpload, ProfileImageUploadHandler
+from .tasks import process_profile_image
+from .utils import (
+    EmailOtp,
+    EmailLink,
+    PhoneOtp,
+    AuthSession,
+    LoginFailures,
+    Recaptcha,
+)
+from .throttles import (
+    RedisScopedRateThrottle,
+    check_throttle_duration,
+    start_throttle,
+)
 from .serializers import (
     UserSerializer,
     UserImageSerializer,
+    ImagePresignSerializer,
+    ImageConfirmSerializer,
     UserListSerializer,
     UserAdminListSerializer,
     UserActionSerializer,
@@ -84,16 +109,8 @@ def check_token_validity(request):
     return email
 
 
-def check_user_validity(email):
-    """Check if user is valid using email."""
-    user = get_user_model().objects.filter(email=email).first()
-
-    # Check if user exists
-    if not user:
-        return Response(
-            {"error": "Invalid credentials"}, status=status.HTTP_400_BAD_REQUEST
-        )
-
+def validate_user(user):
+    """Check if user (or its cached principal) is allowed to authenticate."""
     if user.auth_provider != "email":
         return Response(
             {
@@ -122,24 +139,21 @@ def check_user_validity(email):
     return user
 
 
-def get_user_role(user):
-    """Get user role."""
-    user_groups = user.groups.all()
+def check_user_validity(email):
+    """Check if user is valid using email. The role is loaded in the same query."""
+    user = with_role(get_user_model().objects.filter(email=email)).first()
 
-    if user_groups.filter(name="Default").exists():
-        user_role = "Default"
-    elif user_groups.filter(name="Admin").exists():
-        user_role = "Admin"
-    elif user_groups.filter(name="Superuser").exists():
-        user_role = "Superuser"
-    else:
-        user_role = "UnAuthorized"
+    # Check if user exists
+    if not user:
+        return Response(
+            {"error": "Invalid credentials"}, status=status.HTTP_400_BAD_REQUEST
+        )
 
-    return user_role
+    return validate_user(user)
 
 
 def check_user_id(user_id):
-    """Check if user id is valid."""
+    """Check if user id is valid. Returns the cached principal of the user."""
     if not user_id:
         return Response(
             {"error": "Session expired. Please login again."},
@@ -154,36 +168,26 @@ def check_user_id(user_id):
             {"error": "Invalid Session"}, status=status.HTTP_400_BAD_REQUEST
         )
 
-    user = get_user_model().objects.filter(id=user_id).first()
+    principal = get_principal(user_id)
 
-    if not user:
+    if not principal:
         return Response(
             {"error": "Invalid Session"}, status=status.HTTP_400_BAD_REQUEST
         )
 
-    return check_user_validity(user.email)
+    return validate_user(principal)
 
 
-def create_otp(user_id, email, password):
+def create_otp(user_id, email, resend=False):
     """Generate a 6 digit OTP and send it to the user's email."""
     otp = EmailOtp.generate_otp()
     otp_email = EmailOtp.send_email_otp(email, otp)
 
     # Check if the email was sent
     if otp_email:
-        # Setting the cache data
-        cache.set(
-            f"id_{user_id}", user_id, timeout=60
-        )  # Cache id for 1 minute (used for email verification)
-        cache.set(
-            f"otp_{user_id}", otp, timeout=600
-        )  # Cache otp for 1 minute (used for otp verification)
-        cache.set(
-            f"email_{user_id}", email, timeout=600
-        )  # Cache email for 10 minutes (used for otp verification)
-        cache.set(
-            f"password_{user_id}", password, timeout=600
-        )  # Store password in cache for verification
+        # Store the otp and email in one session for 10 minutes
+        store = AuthSession.resend if resend else AuthSession.create
+        store(user_id, email, otp)
         return Response(
             {"success": "Email sent", "otp": True, "user_id": user_id},
             status=status.HTTP_200_OK,
@@ -197,6 +201,22 @@ def create_otp(user_id, email, password):
     )
 
 
+def generate_tokens(user):
+    """Generate JWT tokens for an already verified user (or its principal)."""
+    if isinstance(user, Principal):
+        refresh = ClaimsRefreshToken.for_user(user.as_user())
+    else:
+        refresh = ClaimsRefreshToken.for_user(user)
+
+    return {
+        "access_token": str(refresh.access_token),
+        "refresh_token": str(refresh),
+        "access_token_expiry": (now() + timedelta(minutes=5)).isoformat(),
+        "user_role": get_user_role(user),
+        "user_id": user.id,
+    }
+
+
 class CSRFTokenView(APIView):
     """CSRF Token View."""
 
@@ -264,6 +284,64 @@ class CSRFTokenView(APIView):
             )
 
 
+class JWKSView(APIView):
+    """JSON Web Key Set View."""
+
+    permission_classes = [AllowAny]
+    authentication_classes = []
+    renderer_classes = [ViewRenderer]
+
+    @extend_schema(
+        summary="Get JWT Signing Keys",
+        description="Returns the public keys verifying the issued JWTs, by kid.",
+        responses={
+            200: OpenApiResponse(
+                description="Active public keys",
+                response={
+                    "type": "object",
+                    "properties": {
+                        "keys": {
+                            "type": "array",
+                            "items": {
+                                "type": "object",
+                                "example": {
+                                    "kty": "OKP",
+                                    "crv": "Ed25519",
+                                    "x": "11qYAYKxCrfVS_7TyWQHOg7hcvPapiMlrwIaaPcHURo",
+                                    "kid": "Xmn3nV7lBq3eUo0M",
+                                    "alg": "EdDSA",
+                                    "use": "sig",
+                                },
+                            },
+                        }
+                    },
+                },
+            ),
+            500: OpenApiResponse(
+                description="Internal Server Error",
+                response={
+                    "type": "object",
+                    "properties": {
+                        "errors": {"type": "string", "example": "Internal Server Error"}
+                    },
+                },
+            ),
+        },
+    )
+    def get(self, request, *args, **kwargs):
+        """Get Method for JWKS."""
+        try:
+            response = Response(
+                token_backend.key_ring.jwks(), status=status.HTTP_200_OK
+            )
+            response["Cache-Control"] = f"public, max-age={KeyRing.RELOAD_SECONDS}"
+            return response
+        except Exception as e:  # pylint: disable=W0718
+            return Response(
+                {"error": str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR
+            )
+
+
 class RecaptchaValidationView(APIView):
     """Recaptcha Validation View."""
 
@@ -316,17 +394,7 @@ class RecaptchaValidationView(APIView):
         try:
             recaptcha_token = request.data.get("recaptcha_token")
 
-            recaptcha_response = requests.post(
-                "https://www.google.com/recaptcha/api/siteverify",
-                data={
-                    "secret": settings.RECAPTCHA_SECRET_KEY,
-                    "response": recaptcha_token,
-                },
-                timeout=30,
-            )
-            result = recaptcha_response.json()
-
-            if result.get("success"):
+            if Recaptcha.verify(recaptcha_token):
                 return Response(
                     {"success": "reCAPTCHA validation successful."},
                     status=status.HTTP_200_OK,
@@ -335,10 +403,8 @@ class RecaptchaValidationView(APIView):
                 {"error": "Invalid reCAPTCHA token."},
                 status=status.HTTP_400_BAD_REQUEST,
             )
-        except json.JSONDecodeError:
-            return Response(
-                {"error": "Invalid JSON."}, status=status.HTTP_400_BAD_REQUEST
-            )
+        except ValueError as e:
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
         except Exception as e:  # pylint: disable=W0718
             return Response(
                 {"error": str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR
@@ -350,7 +416,7 @@ class LoginView(APIView):
 
     permission_classes = [AllowAny]
     renderer_classes = [ViewRenderer]
-    throttle_classes = [ScopedRateThrottle]
+    throttle_classes = [RedisScopedRateThrottle]
     throttle_scope = "email_otp"
 
     def check_throttles(self, request):
@@ -360,14 +426,17 @@ class LoginView(APIView):
         """
         throttle_durations = check_throttle_duration(self, request)
 
+        if not throttle_durations:
+            return
+
         user = get_user_model().objects.filter(email=request.data.get("email")).first()
 
         if user:
-            cached_id = cache.get(f"id_{user.id}")
+            otp_sent = AuthSession.recently_sent(user.id)
         else:
-            cached_id = None
+            otp_sent = False
 
-        if throttle_durations and cached_id:
+        if otp_sent:
             start_throttle(throttle_durations, request)
 
     @extend_schema(
@@ -496,16 +565,15 @@ class LoginView(APIView):
 
             # Check if password is correct
             if not user.check_password(password):
-                # Increment failed login attempts
-                if now() - user.last_failed_login_time <= timedelta(minutes=10):
-                    user.failed_login_attempts += 1
-                else:
-                    user.failed_login_attempts = 1
+                # Count the failure in Redis, the user row is only written on lockout
+                failed_login_attempts = LoginFailures.register(user.id)
 
-                user.last_failed_login_time = now()
-                user.save()
+                # Concurrent failures may count past the limit before the reset
+                if failed_login_attempts >= settings.MAX_LOGIN_FAILURE_LIMIT:
+                    LoginFailures.reset(user.id)
+                    user.failed_login_attempts = failed_login_attempts
+                    user.last_failed_login_time = now()
 
-                if user.failed_login_attempts == settings.MAX_LOGIN_FAILURE_LIMIT:
                     # Lock account
                     if user.is_superuser:
                         user.is_email_verified = False
@@ -531,9 +599,9 @@ class LoginView(APIView):
                         status=status.HTTP_400_BAD_REQUEST,
                     )
 
-                if user.failed_login_attempts >= 3:
+                if failed_login_attempts >= 3:
                     remaining_attempts = (
-                        settings.MAX_LOGIN_FAILURE_LIMIT - user.failed_login_attempts
+                        settings.MAX_LOGIN_FAILURE_LIMIT - failed_login_attempts
                     )
                     return Response(
                         {
@@ -550,20 +618,18 @@ class LoginView(APIView):
                 )
 
             # Reset failed login attempts
+            LoginFailures.reset(user.id)
             if user.failed_login_attempts > 0:
                 user.failed_login_attempts = 0
                 user.save()
 
             if user.is_two_fa:
                 # Generate OTP
-                response = create_otp(user.id, email, password)
+                response = create_otp(user.id, email)
                 return response
-            new_data = request.data.copy()
-            new_data["user_id"] = user.id
-            new_request = request._request  # pylint: disable=W0212
-            new_request.POST = new_data
-            token_view = TokenView.as_view()
-            return token_view(new_request, *args, **kwargs)
+
+            # Password is already verified, no need to authenticate again
+            return Response(generate_tokens(user), status=status.HTTP_200_OK)
 
         except Exception as e:  # pylint: disable=W0718
             return Response(
@@ -576,7 +642,7 @@ class ResendOtpView(APIView):
 
     permission_classes = [AllowAny]
     renderer_classes = [ViewRenderer]
-    throttle_classes = [ScopedRateThrottle]
+    throttle_classes = [RedisScopedRateThrottle]
     throttle_scope = "email_otp"
 
     def check_throttles(self, request):
@@ -586,9 +652,9 @@ class ResendOtpView(APIView):
         """
         throttle_durations = check_throttle_duration(self, request)
 
-        cached_id = cache.get(f"id_{request.data.get('user_id')}")
+        otp_sent = AuthSession.recently_sent(request.data.get("user_id"))
 
-        if throttle_durations and cached_id:
+        if throttle_durations and otp_sent:
             start_throttle(throttle_durations, request)
 
     @extend_schema(
@@ -671,17 +737,16 @@ class ResendOtpView(APIView):
             if isinstance(user, Response):
                 return user
 
-            email = cache.get(f"email_{user.id}")
-            password = cache.get(f"password_{user.id}")
+            session = AuthSession.get(user.id)
 
-            if not email or not password:
+            if not session:
                 return Response(
                     {"error": "Session expired. Please login again."},
                     status=status.HTTP_400_BAD_REQUEST,
                 )
 
             # Generate OTP
-            response = create_otp(user.id, email, password)
+            response = create_otp(user.id, session["email"], resend=True)
 
             return response
 
@@ -733,6 +798,7 @@ class TokenView(TokenObtainPairView):
                             "items": {"type": "string"},
                             "example": [
                                 "Invalid OTP",
+                                "Too many invalid OTP attempts. Please login again.",
                                 "Session expired. Please login again.",
                                 "Invalid credentials",
                                 (
@@ -771,29 +837,17 @@ class TokenView(TokenObtainPairView):
             if user.is_two_fa:
                 otp_from_request = request.data.pop("otp", None)
 
-                # Get email and password from the cache
-                email = cache.get(f"email_{user.id}")
-                password = cache.get(f"password_{user.id}")
-
-                if not email or not password:
+                # Verify OTP and consume the session (the login ticket) in one step
+                try:
+                    AuthSession.verify_otp(user.id, otp_from_request)
+                except ValueError as e:
                     return Response(
-                        {"error": "Session expired. Please login again."},
-                        status=status.HTTP_400_BAD_REQUEST,
+                        {"error": str(e)}, status=status.HTTP_400_BAD_REQUEST
                     )
 
-                # Verify OTP
-                otp_verify = EmailOtp.verify_otp(user.id, otp_from_request)
+                return Response(generate_tokens(user), status=status.HTTP_200_OK)
 
-                if not otp_verify:
-                    return Response(
-                        {"error": "Invalid OTP"}, status=status.HTTP_400_BAD_REQUEST
-                    )
-
-                # Set email and password in the request
-                request.data["email"] = email
-                request.data["password"] = password
-
-            # Generate token
+            # Generate token (users without 2FA must provide their password)
             response = super().post(request, *args, **kwargs)
 
             response.data["access_token_expiry"] = (
@@ -809,11 +863,6 @@ class TokenView(TokenObtainPairView):
             response.data.pop("access")
             response.data.pop("refresh")
 
-            # Delete cache entries after successful login
-            if user.is_two_fa:
-                cache.delete(f"email_{user.id}")
-                cache.delete(f"password_{user.id}")
-
             return response
 
         except Exception as e:  # pylint: disable=W0718
@@ -925,7 +974,7 @@ class RefreshTokenView(TokenRefreshView):
                 )
 
             # Decode the access token to extract user details
-            decoded_token = RefreshToken(refresh_token)
+            decoded_token = ClaimsRefreshToken(refresh_token)
             user_id = decoded_token.get("user_id", None)
             if not user_id:
                 raise InvalidToken("Invalid refresh token")
@@ -964,7 +1013,7 @@ class EmailVerifyView(APIView):
 
     permission_classes = [AllowAny]
     renderer_classes = [ViewRenderer]
-    throttle_classes = [ScopedRateThrottle]
+    throttle_classes = [RedisScopedRateThrottle]
     throttle_scope = "email_verify"
 
     def check_throttles(self, request):
@@ -1196,9 +1245,9 @@ class PhoneVerifyView(APIView):
     """Phone Verification View."""
 
     permission_classes = [IsAuthenticated]
-    authentication_classes = [JWTAuthentication]
+    authentication_classes = [ClaimsJWTAuthentication]
     renderer_classes = [ViewRenderer]
-    throttle_classes = [ScopedRateThrottle]
+    throttle_classes = [RedisScopedRateThrottle]
     throttle_scope = "phone_otp"
 
     def check_throttles(self, request):
@@ -1397,7 +1446,7 @@ class PasswordResetView(APIView):
 
     permission_classes = [AllowAny]
     renderer_classes = [ViewRenderer]
-    throttle_classes = [ScopedRateThrottle]
+    throttle_classes = [RedisScopedRateThrottle]
     throttle_scope = "password_reset"
 
     def check_throttles(self, request):
@@ -1727,13 +1776,13 @@ class PasswordResetView(APIView):
         )
 
 
-class UserViewSet(ModelViewSet):
+class UserViewSet(ConditionalRetrieveMixin, StreamingListMixin, ModelViewSet):
     """Viewset for User APIs."""
 
     queryset = get_user_model().objects.all()  # get all the users
     serializer_class = UserSerializer  # User Serializer initialized
-    authentication_classes = [JWTAuthentication]  # Using jwtoken
-    throttle_classes = [ScopedRateThrottle]
+    authentication_classes = [ClaimsJWTAuthentication]  # Using jwtoken
+    throttle_classes = [RedisScopedRateThrottle]
     throttle_scope = "email_verify"
     renderer_classes = [ViewRenderer]
     filter_backends = [DjangoFilterBackend]
@@ -1775,6 +1824,10 @@ class UserViewSet(ModelViewSet):
             return UserActionSerializer
         if self.action == "upload_image":  # Image handled with different serializer
             return UserImageSerializer
+        if self.action == "presign_image":
+            return ImagePresignSerializer
+        if self.action == "confirm_image":
+            return ImageConfirmSerializer
         return super().get_serializer_class()
 
     def check_throttles(self, request):
@@ -1784,9 +1837,12 @@ class UserViewSet(ModelViewSet):
         """
         throttle_durations = check_throttle_duration(self, request)
 
-        cached_email = cache.get(f"email_{request.data.get('email')}")
-
-        if throttle_durations and cached_email and request.method == "POST":
+        # Only POST bodies are read here, images are parsed by their action
+        if (
+            throttle_durations
+            and request.method == "POST"
+            and cache.get(f"email_{request.data.get('email')}")
+        ):
             start_throttle(throttle_durations, request)
 
     def http_method_not_allowed(self, request, *args, **kwargs):
@@ -1803,8 +1859,22 @@ class UserViewSet(ModelViewSet):
         description=(
             "List of all users using Pagination and Filters. "
             "Admins (is_staff=True) receive extended details, "
-            "while regular users receive basic details."
+            "while regular users receive basic details. "
+            "Admins can stream every matching user, unpaginated, with stream."
         ),
+        parameters=[
+            OpenApiParameter(
+                name="stream",
+                description=(
+                    "Stream the whole list as a JSON array (json) "
+                    "or as newline delimited JSON (ndjson). Admins only."
+                ),
+                required=False,
+                type=str,
+                enum=["json", "ndjson"],
+                location=OpenApiParameter.QUERY,
+            ),
+        ],
         responses={
             200: {
                 "description": "Successful response with user list",
@@ -2333,16 +2403,15 @@ class UserViewSet(ModelViewSet):
                 status=status.HTTP_400_BAD_REQUEST,
             )
 
-        # Check and delete the profile image if it's not the default image
-        default_image_path = "profile_images/default_profile.jpg"
-        if (
-            user_to_delete.profile_img
-            and user_to_delete.profile_img.name != default_image_path
-        ):
-            user_to_delete.profile_img.delete(save=False)
-
         email = user_to_delete.email
-        response = super().destroy(request, *args, **kwargs)
+        with transaction.atomic():
+            response = super().destroy(request, *args, **kwargs)
+
+            # Release the profile image if it's not the default image, the
+            # files are deleted once the user deletion is committed
+            discard_profile_image(
+                user_to_delete.profile_img.name, user_to_delete.profile_img_variants
+            )
 
         if response.status_code == status.HTTP_204_NO_CONTENT:
             return Response(
@@ -2442,13 +2511,8 @@ class UserViewSet(ModelViewSet):
         user = self.get_object()  # get the user
         current_user = self.request.user  # Get the user making the request
 
-        if not request.data:
-            return Response(
-                {"error": "No profile image provided."},
-                status=status.HTTP_400_BAD_REQUEST,
-            )
-
-        # Ensure the request is made by the user themselves or a superuser
+        # Ensure the request is made by the user themselves or a superuser,
+        # before the body is read
         if current_user.id != user.id and not current_user.is_superuser:
             return Response(
                 {
@@ -2457,14 +2521,25 @@ class UserViewSet(ModelViewSet):
                 status=status.HTTP_403_FORBIDDEN,
             )
 
+        # The image is checked while received, invalid uploads stop early
+        upload = ProfileImageUploadHandler(request)
+        request.upload_handlers.insert(0, upload)
+
+        data = request.data
+        if upload.error:
+            return Response({"error": upload.error}, status=status.HTTP_400_BAD_REQUEST)
+
+        if not data:
+            return Response(
+                {"error": "No profile image provided."},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
         default_image_path = (
             "profile_images/default_profile.jpg"  # Define the default image path
         )
-
-        # Check if the user has an existing image that is not the default image
-        if user.profile_img and user.profile_img.name != default_image_path:
-            # Remove the previous image file
-            user.profile_img.delete(save=False)
+        previous = (user.profile_img.name, user.profile_img_variants)
+        user.profile_img_variants = {}
 
         image = request.data.get("profile_img")
 
@@ -2478,6 +2553,193 @@ class UserViewSet(ModelViewSet):
             serializer.is_valid(raise_exception=True)  # returns 400 if fails
             serializer.save()
 
+            # The variants are rendered off the request by the media queue
+            transaction.on_commit(
+                partial(process_profile_image.delay, user.id, user.profile_img.name)
+            )
+
+        # Released after the new image is saved, an identical image is kept
+        discard_profile_image(*previous)
+
+        return Response(
+            {"success": "Image uploaded successfully."}, status=status.HTTP_200_OK
+        )
+
+    @extend_schema(
+        summary="Presign Image Upload",
+        description=(
+            "Returns a presigned S3 POST form to upload the profile image directly"
+            " to the storage (JPEG or PNG, up to 2MB). Post the fields and the file"
+            " to the URL, then confirm the upload with the upload id."
+        ),
+        request=ImagePresignSerializer,
+        responses={
+            200: OpenApiResponse(
+                description="Presigned upload",
+                response={
+                    "type": "object",
+                    "properties": {
+                        "url": {
+                            "type": "string",
+                            "example": "https://bucket.s3.amazonaws.com/",
+                        },
+                        "fields": {"type": "object"},
+                        "upload_id": {"type": "string"},
+                        "expires_in": {"type": "integer", "example": 300},
+                    },
+                },
+            ),
+            400: OpenApiResponse(
+                description="Invalid request",
+                response={
+                    "type": "object",
+                    "properties": {
+                        "errors": {
+                            "type": "string",
+                            "example": "Profile image type should be JPEG, PNG",
+                        }
+                    },
+                },
+            ),
+            403: OpenApiResponse(
+                description="Permission denied",
+                response={
+                    "type": "object",
+                    "properties": {
+                        "errors": {
+                            "type": "string",
+                            "example": (
+                                "You do not have permission "
+                                "to upload an image for this user."
+                            ),
+                        },
+                    },
+                },
+            ),
+        },
+    )
+    @action(
+        detail=True,
+        methods=["POST"],
+        url_path="upload-image/presign",
+        url_name="presign-image",
+    )
+    def presign_image(self, request, pk=None):  # pylint: disable=unused-argument
+        """Presign a direct upload of the user profile image"""
+        user = self.get_object()
+
+        if request.user.id != user.id and not request.user.is_superuser:
+            return Response(
+                {
+                    "error": "You do not have permission to upload an image for this user."
+                },
+                status=status.HTTP_403_FORBIDDEN,
+            )
+
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+
+        try:
+            upload = DirectUpload.presign(
+                user.id, serializer.validated_data["content_type"]
+            )
+        except ValueError as e:
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+        return Response(upload, status=status.HTTP_200_OK)
+
+    @extend_schema(
+        summary="Confirm Image Upload",
+        description=(
+            "Checks a direct upload and sets it as the profile image,"
+            " the resized variants are rendered in the background."
+        ),
+        request=ImageConfirmSerializer,
+        responses={
+            200: OpenApiResponse(
+                description="Image uploaded",
+                response={
+                    "type": "object",
+                    "properties": {
+                        "success": {
+                            "type": "string",
+                            "example": "Image uploaded successfully.",
+                        }
+                    },
+                },
+            ),
+            400: OpenApiResponse(
+                description="Invalid request",
+                response={
+                    "type": "object",
+                    "properties": {
+                        "errors": {
+                            "type": "array",
+                            "items": {"type": "string"},
+                            "example": [
+                                "Invalid or expired upload.",
+                                "The profile image was not uploaded.",
+                                "Profile image size should not exceed 2MB.",
+                                "Profile image type should be JPEG, PNG",
+                            ],
+                        }
+                    },
+                },
+            ),
+            403: OpenApiResponse(
+                description="Permission denied",
+                response={
+                    "type": "object",
+                    "properties": {
+                        "errors": {
+                            "type": "string",
+                            "example": (
+                                "You do not have permission "
+                                "to upload an image for this user."
+                            ),
+                        },
+                    },
+                },
+            ),
+        },
+    )
+    @action(
+        detail=True,
+        methods=["POST"],
+        url_path="upload-image/confirm",
+        url_name="confirm-image",
+    )
+    def confirm_image(self, request, pk=None):  # pylint: disable=unused-argument
+        """Attach a direct upload as the user profile image"""
+        user = self.get_object()
+
+        if request.user.id != user.id and not request.user.is_superuser:
+            return Response(
+                {
+                    "error": "You do not have permission to upload an image for this user."
+                },
+                status=status.HTTP_403_FORBIDDEN,
+            )
+
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+
+        try:
+            name = DirectUpload.confirm(user.id, serializer.validated_data["upload_id"])
+        except ValueError as e:
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+        # Confirming the same upload twice must not delete it
+        if user.profile_img.name != name:
+            previous = (user.profile_img.name, user.profile_img_variants)
+            user.profile_img = name
+            user.profile_img_variants = {}
+            user.save()
+            discard_profile_image(*previous)
+
+            # The variants are rendered off the request by the media queue
+            transaction.on_commit(partial(process_profile_image.delay, user.id, name))
+
         return Response(
             {"success": "Image uploaded successfully."}, status=status.HTTP_200_OK
         )
@@ -3027,7 +3289,7 @@ class LogoutView(APIView):
                 )
 
             # Blacklist refresh token
-            token = RefreshToken(refresh_token)
+            token = ClaimsRefreshToken(refresh_token)
             token.blacklist()
 
             return Response(
@@ -3123,20 +3385,7 @@ class SocialAuthView(APIView):
                         status=400,
                     )
                 # Generate JWT tokens for the authenticated user
-                refresh = RefreshToken.for_user(user)
-                access_token_expiry = (now() + timedelta(minutes=5)).isoformat()
-                user_role = get_user_role(user)
-
-                return Response(
-                    {
-                        "access_token": str(refresh.access_token),
-                        "refresh_token": str(refresh),
-                        "access_token_expiry": access_token_expiry,
-                        "user_role": user_role,
-                        "user_id": user.id,
-                    },
-                    status=200,
-                )
+                return Response(generate_tokens(user), status=200)
             return Response(
                 {"error": "Authentication failed, user not found."}, status=400
             )
@@ -3148,3 +3397,62 @@ class SocialAuthView(APIView):
             return Response(
                 {"error": str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR
             )
+
+
+def error_response(error, status_code):
+    """JSON error response in the envelope of ViewRenderer."""
+    return JsonResponse({"errors": error}, status=status_code)
+
+
+@method_decorator(csrf_exempt, name="dispatch")
+class AsyncSocialAuthView(View):
+    """Social Login served under ASGI (backend.asgi).
+
+    Same request and responses as SocialAuthView, but the calls to Google,
+    Facebook and GitHub do not block, so a worker handles many logins at once.
+    Only the pipeline (user lookup and creation) runs in a thread."""
+
+    http_method_names = ["post"]
+
+    async def post(self, request, *args, **kwargs):  # pylint: disable=R0911
+        if request.content_type == "application/json":
+            try:
+                data = json.loads(request.body or b"{}")
+            except ValueError:
+                data = {}
+        else:
+            data = request.POST
+
+        token = data.get("token")
+        provider = data.get("provider")
+        if not token or not provider:
+            return error_response("Token and provider are required", 400)
+
+        try:
+            strategy = load_strategy(request)
+            backend = load_backend(strategy, provider, redirect_uri=None)
+            response = await SocialProviders.user_data(backend, token)
+            user = await sync_to_async(strategy.authenticate)(
+                backend=backend, response=response
+            )
+
+            if isinstance(user, Response):
+                return error_response(
+                    user.data.get("error", user.data), user.status_code
+                )
+
+            if user:
+                if not user.is_active:
+                    return error_response(
+                        "Account is deactivated. Contact your admin.", 400
+                    )
+                return JsonResponse(await sync_to_async(generate_tokens)(user))
+            return error_response("Authentication failed, user not found.", 400)
+        except AuthException as e:
+            return error_response(str(e), status.HTTP_500_INTERNAL_SERVER_ERROR)
+        except Exception as e:  # pylint: disable=W0718
+            return error_response(str(e), status.HTTP_500_INTERNAL_SERVER_ERROR)
+        finally:
+            # Under WSGI the event loop only lives for this request
+            if not isinstance(request, ASGIRequest):
+                await SocialProviders.close()
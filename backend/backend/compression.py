@@ -0,0 +1,173 @@
+"""Response bodies of public endpoints, cached already compressed."""
+
+import gzip
+import hashlib
+import logging
+import brotli
+import zstandard
+from celery import shared_task
+from django.conf import settings
+from django.core.cache import cache
+from django.http import HttpResponse
+from django.utils.cache import patch_vary_headers
+from kombu.exceptions import OperationalError
+
+
+logger = logging.getLogger(__name__)
+
+
+def compress_br(body, quality=11):
+    return brotli.compress(body, quality=quality)
+
+
+def compress_zstd(body, level=19):
+    # Compressor instances are not thread safe
+    return zstandard.ZstdCompressor(level=level).compress(body)
+
+
+def compress_gzip(body, level=9):
+    # Without a timestamp the same body always compresses to the same bytes
+    return gzip.compress(body, compresslevel=level, mtime=0)
+
+
+# Content codings in order of preference
+COMPRESSORS = {
+    "br": compress_br,
+    "zstd": compress_zstd,
+    "gzip": compress_gzip,
+}
+
+# Levels cheap enough for the request thread, the defaults are left to a task
+FAST_LEVELS = {
+    "br": 5,
+    "zstd": 3,
+    "gzip": 6,
+}
+
+
+def accepted_coding(request):
+    """Preferred coding of COMPRESSORS in the request's Accept-Encoding, None
+    for an uncompressed body."""
+    qualities = {}
+    for item in request.META.get("HTTP_ACCEPT_ENCODING", "").split(","):
+        coding, _, params = item.partition(";")
+        params = params.replace(" ", "").lower()
+        try:
+            quality = float(params[2:]) if params.startswith("q=") else 1.0
+        except ValueError:
+            quality = 0.0
+        qualities[coding.strip().lower()] = quality
+
+    best, best_quality = None, 0.0
+    for coding in COMPRESSORS:
+        quality = qualities.get(coding, qualities.get("*", 0.0))
+        if quality > best_quality:
+            best, best_quality = coding, quality
+    return best
+
+
+class CompressedResponses:
+    """Rendered GET responses cached with every content coding applied.
+
+    An entry is keyed by the URL, the negotiated coding and the version of
+    the data it was rendered from. A hit is sent as it was stored, without
+    the ORM or a compressor, and a change to the data bumps the version so
+    the old entries miss and expire. A miss compresses only the negotiated
+    coding, at a fast level, and a task stores every coding at the best
+    level. Bodies that compression would not shrink are stored uncompressed.
+    """
+
+    @staticmethod
+    def digest(request):
+        """Digest of the request's URL."""
+        return hashlib.md5(
+            request.get_full_path().encode(), usedforsecurity=False
+        ).hexdigest()
+
+    @staticmethod
+    def key(digest, version, coding):
+        """Cache key of the URL digest at version, with coding."""
+        return f"compressed_response:{digest}:{version}:{coding or 'identity'}"
+
+    @staticmethod
+    def entry(coding, content_type, body, compressed):
+        """Cache entry of body compressed with coding, the body itself if
+        compression did not shrink it."""
+        if len(compressed) < len(body):
+            return (coding, content_type, compressed)
+        return (None, content_type, body)
+
+    @staticmethod
+    def encode(response, coding, body):
+        """Send body, encoded with coding, as the content of response."""
+        response.content = body
+        if coding:
+            response["Content-Encoding"] = coding
+        patch_vary_headers(response, ("Accept-Encoding",))
+        return response
+
+    @classmethod
+    def get(cls, request, version):
+        """Cached response to the request at version, None on a miss."""
+        key = cls.key(cls.digest(request), version, accepted_coding(request))
+        entry = cache.get(key)
+        if entry is None:
+            return None
+        coding, content_type, body = entry
+        return cls.encode(HttpResponse(content_type=content_type), coding, body)
+
+    @classmethod
+    def cache(cls, request, version, response, view):
+        """Render the view's response and cache its body uncompressed and in the
+        request's coding, the response is returned with that body. The other
+        codings are compressed by a background task.
+
+        Only 200 responses are cached, others are returned as they are.
+        """
+        if response.status_code != 200:
+            return response
+
+        response = view.finalize_response(request, response)
+        response.render()
+        content_type, body = response["Content-Type"], response.content
+
+        digest, coding = cls.digest(request), accepted_coding(request)
+        entries = {cls.key(digest, version, None): (None, content_type, body)}
+        if coding:
+            compressed = COMPRESSORS[coding](body, FAST_LEVELS[coding])
+            entries[cls.key(digest, version, coding)] = cls.entry(
+                coding, content_type, body, compressed
+            )
+        cache.set_many(entries, settings.RESPONSE_CACHE_TIMEOUT)
+        try:
+            precompress_response.delay(digest, version)
+        except OperationalError as e:
+            # The other codings are an optimization, misses compress them again
+            logger.warning("Could not queue the precompression of %s: %s", digest, e)
+
+        coding, _, body = entries[cls.key(digest, version, coding)]
+        return cls.encode(response, coding, body)
+
+    @classmethod
+    def precompress(cls, digest, version):
+        """Cache the uncompressed response of the URL digest at version in
+        every coding, at the best level."""
+        entry = cache.get(cls.key(digest, version, None))
+        if entry is None:
+            return
+        _, content_type, body = entry
+        cache.set_many(
+            {
+                cls.key(digest, version, coding): cls.entry(
+                    coding, content_type, body, compress(body)
+                )
+                for coding, compress in COMPRESSORS.items()
+            },
+            settings.RESPONSE_CACHE_TIMEOUT,
+        )
+
+
+# Background task to store a cached response in every coding at the best level
+@shared_task
+def precompress_response(digest, version):
+    CompressedResponses.precompress(digest, version)
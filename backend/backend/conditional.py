@@ -0,0 +1,140 @@
+"""Conditional GETs, answered with a 304 from cheap validators."""
+
+import time
+from django.core.cache import cache
+from django.core.exceptions import ValidationError
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date, quote_etag
+from rest_framework.permissions import BasePermission
+from rest_framework.response import Response
+
+# Request headers making a GET conditional
+CONDITIONAL_HEADERS = (
+    "HTTP_IF_MATCH",
+    "HTTP_IF_NONE_MATCH",
+    "HTTP_IF_MODIFIED_SINCE",
+    "HTTP_IF_UNMODIFIED_SINCE",
+)
+
+
+def is_conditional(request):
+    """Whether the request carries a precondition."""
+    return any(header in request.META for header in CONDITIONAL_HEADERS)
+
+
+def make_etag(*parts):
+    """Strong ETag of the representation identified by parts."""
+    return quote_etag("-".join(str(part) for part in parts))
+
+
+def conditional_response(request, etag, last_modified=None):
+    """304 (412 for a failed If-Match) when the validators answer the request's
+    preconditions, None when the full response is due."""
+    timestamp = int(last_modified.timestamp()) if last_modified else None
+    return get_conditional_response(request, etag=etag, last_modified=timestamp)
+
+
+def set_validators(response, etag, last_modified=None, private=False):
+    """Set the validators of the response, revalidated before each reuse."""
+    # A compressed body is another representation, weak ETags still match it
+    encoded = response.has_header("Content-Encoding")
+    response["ETag"] = f"W/{etag}" if encoded else etag
+    if last_modified is not None:
+        response["Last-Modified"] = http_date(last_modified.timestamp())
+    visibility = {"private": True} if private else {}
+    patch_cache_control(response, no_cache=True, **visibility)
+    return response
+
+
+def cache_version(key):
+    """Version of the rows counted at key in the cache.
+
+    A missing version (evicted or flushed) restarts from the current time in
+    nanoseconds, above the versions handed out before it, so an ETag made
+    from an older version is never matched again.
+    """
+    version = cache.get(key)
+    if version is None:
+        cache.add(key, time.time_ns(), timeout=None)
+        version = cache.get(key)
+    return version
+
+
+def bump_cache_version(key):
+    """Count a change to the rows versioned at key."""
+    try:
+        return cache.incr(key)
+    except ValueError:
+        cache.add(key, time.time_ns(), timeout=None)
+        return cache.get(key)
+
+
+class ConditionalRetrieveMixin:
+    """Retrieve action of a generic view answering conditional GETs.
+
+    The validators of an object come from its `updated_at`, the ETag adds the
+    serializer class since requesters may get different representations. A
+    conditional request reads that column alone, so a current copy gets its
+    304 before the row is loaded or serialized. Views with object permissions
+    load the object and check them first, only the serializer is skipped.
+    """
+
+    # Representations are kept by the requester's own cache only
+    private_validators = True
+
+    def get_etag(self, updated_at):
+        """ETag of the looked up object at updated_at."""
+        lookup_url_kwarg = self.lookup_url_kwarg or self.lookup_field
+        return make_etag(
+            self.get_queryset().model._meta.model_name,
+            self.kwargs[lookup_url_kwarg],
+            f"{updated_at.timestamp():.6f}",
+            self.get_serializer_class().__name__,
+        )
+
+    def get_updated_at(self):
+        """updated_at of the looked up object, None if there is none."""
+        lookup_url_kwarg = self.lookup_url_kwarg or self.lookup_field
+        queryset = self.filter_queryset(self.get_queryset())
+        try:
+            return (
+                queryset.filter(**{self.lookup_field: self.kwargs[lookup_url_kwarg]})
+                .values_list("updated_at", flat=True)
+                .first()
+            )
+        except (TypeError, ValueError, ValidationError):
+            return None
+
+    def checks_object_permissions(self):
+        """Whether a permission of the view checks the object itself."""
+        return any(
+            type(permission).has_object_permission
+            is not BasePermission.has_object_permission
+            for permission in self.get_permissions()
+        )
+
+    def retrieve(self, request, *args, **kwargs):
+        instance = None
+        if is_conditional(request):
+            if self.checks_object_permissions():
+                instance = self.get_object()
+                updated_at = instance.updated_at
+            else:
+                updated_at = self.get_updated_at()
+            if updated_at is not None:
+                etag = self.get_etag(updated_at)
+                response = conditional_response(request, etag, updated_at)
+                if response is not None:
+                    return set_validators(
+                        response, etag, updated_at, self.private_validators
+                    )
+
+        if instance is None:
+            instance = self.get_object()
+        serializer = self.get_serializer(instance)
+        return set_validators(
+            Response(serializer.data),
+            self.get_etag(instance.updated_at),
+            instance.updated_at,
+            self.private_validators,
+        )
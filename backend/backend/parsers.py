@@ -0,0 +1,14 @@
+import orjson
+from rest_framework.exceptions import ParseError
+from rest_framework.parsers import JSONParser
+
+
+class ORJSONParser(JSONParser):
+    """JSONParser reading with orjson, UTF-8 only as JSON requires."""
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        """Parse the request body, rejecting NaN and Infinity like DRF."""
+        try:
+            return orjson.loads(stream.read())
+        except orjson.JSONDecodeError as exc:
+            raise ParseError(f"JSON parse error - {exc}") from exc
@@ -1,7 +1,59 @@
+import datetime
+import decimal
+import orjson
+from django.db.models.query import QuerySet
+from django.utils.encoding import force_str
+from django.utils.functional import Promise
+from phonenumber_field.phonenumber import PhoneNumber
 from rest_framework.renderers import JSONRenderer
 
+# Serializer output is mostly plain types, orjson writes them without Python
+ORJSON_OPTIONS = orjson.OPT_UTC_Z | orjson.OPT_NON_STR_KEYS
 
-class ViewRenderer(JSONRenderer):
+
+def orjson_default(obj):  # pylint: disable=R0911
+    """Types orjson does not know, as DRF's encoder writes them."""
+    if isinstance(obj, (Promise, PhoneNumber)):
+        return force_str(obj)
+    if isinstance(obj, decimal.Decimal):
+        return float(obj)
+    if isinstance(obj, datetime.timedelta):
+        return str(obj.total_seconds())
+    if isinstance(obj, bytes):
+        return obj.decode()
+    if isinstance(obj, QuerySet):
+        return tuple(obj)
+    if hasattr(obj, "tolist"):
+        return obj.tolist()
+    if hasattr(obj, "__iter__"):
+        return tuple(obj)
+    raise TypeError(f"Type is not JSON serializable: {type(obj).__name__}")
+
+
+def orjson_dumps(data, options=ORJSON_OPTIONS):
+    """JSON bytes of data, escaped as DRF does for JSON embedded in JavaScript."""
+    ret = orjson.dumps(data, default=orjson_default, option=options)
+    if b"\xe2\x80\xa8" in ret or b"\xe2\x80\xa9" in ret:
+        ret = ret.replace(b"\xe2\x80\xa8", b"\\u2028")
+        ret = ret.replace(b"\xe2\x80\xa9", b"\\u2029")
+    return ret
+
+
+class ORJSONRenderer(JSONRenderer):
+    """JSONRenderer writing with orjson, compact and UTF-8 like DRF's defaults."""
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b""
+
+        options = ORJSON_OPTIONS
+        if self.get_indent(accepted_media_type, renderer_context or {}):
+            options |= orjson.OPT_INDENT_2  # the only indent orjson has
+
+        return orjson_dumps(data, options)
+
+
+class ViewRenderer(ORJSONRenderer):
     """Render Class for All Response."""
 
     def render(self, data, accepted_media_type=None, renderer_context=None):
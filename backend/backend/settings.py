@@ -11,6 +11,7 @@ https://docs.djangoproject.com/en/5.1/ref/settings/
 """
 
 import os
+import sys
 from pathlib import Path
 from datetime import timedelta
 
@@ -178,6 +179,14 @@ if DJANGO_ENV == "development":
     else:
         MEDIA_URL = HTTP_MEDIA_URL
     MEDIA_ROOT = "/app/media"
+    STORAGES = {
+        "default": {
+            "BACKEND": "core_db.storage.ContentAddressedFileSystemStorage",
+        },
+        "staticfiles": {
+            "BACKEND": "django.contrib.staticfiles.storage.StaticFilesStorage",
+        },
+    }
 else:
     AWS_ACCESS_KEY_ID = os.getenv("AWS_ACCESS_KEY_ID")
     AWS_SECRET_ACCESS_KEY = os.getenv("AWS_SECRET_ACCESS_KEY")
@@ -185,7 +194,7 @@ else:
     AWS_S3_REGION_NAME = os.getenv("AWS_S3_REGION_NAME")
     STORAGES = {
         "default": {
-            "BACKEND": "storages.backends.s3boto3.S3StaticStorage",
+            "BACKEND": "core_db.storage.ContentAddressedS3Storage",
         },
         "staticfiles": {
             "BACKEND": "django.contrib.staticfiles.storage.StaticFilesStorage",
@@ -197,6 +206,11 @@ else:
 
 DATA_UPLOAD_MAX_MEMORY_SIZE = 5 * 1024 * 1024  # 5MB
 FILE_UPLOAD_MAX_MEMORY_SIZE = 5 * 1024 * 1024
+# Uploads are hashed while received, for the content addressed storage
+FILE_UPLOAD_HANDLERS = [
+    "core_db.storage.HashingMemoryFileUploadHandler",
+    "core_db.storage.HashingTemporaryFileUploadHandler",
+]
 
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.1/ref/settings/#default-auto-field
@@ -254,6 +268,39 @@ SOCIAL_AUTH_FACEBOOK_PROFILE_EXTRA_PARAMS = {
 SOCIAL_AUTH_GITHUB_KEY = os.getenv("GITHUB_CLIENT_ID")
 SOCIAL_AUTH_GITHUB_SECRET = os.getenv("GITHUB_CLIENT_SECRET")
 
+# Async social login, provider calls and cached discovery documents and JWKS
+SOCIAL_AUTH_PROVIDER_TIMEOUT = 5  # seconds per provider call
+SOCIAL_AUTH_METADATA_TIMEOUT = 60 * 60  # 1 hour
+SOCIAL_AUTH_GOOGLE_DISCOVERY_URL = (
+    "https://accounts.google.com/.well-known/openid-configuration"
+)
+
+# Social login avatars, imported into the media storage by a task
+SOCIAL_AVATAR_SIZE = 720  # pixels, square, the largest profile image variant
+SOCIAL_AVATAR_MAX_BYTES = 5 * 1024 * 1024  # 5MB
+SOCIAL_AVATAR_TIMEOUT = (2, 5)  # connect and read timeouts in seconds
+
+# Shared profile images, never deleted with a user
+DEFAULT_PROFILE_IMAGES = (
+    "profile_images/default_profile.jpg",
+    "profile_images/default.png",
+)
+# Square profile image variants in pixels, each in WebP and JPEG
+PROFILE_IMAGE_SIZES = (64, 256, 720)
+PROFILE_IMAGE_MAX_BYTES = 2 * 1024 * 1024  # 2MB
+# Lifetime of the presigned POSTs of direct uploads to S3
+DIRECT_UPLOAD_EXPIRY_SECONDS = 300
+# Local media are authorized by Django, then sent by the front proxy with this
+# header: X-Accel-Redirect (nginx) or X-Sendfile (Apache, lighttpd). Unset,
+# Django sends the files itself
+MEDIA_SENDFILE_HEADER = os.getenv("MEDIA_SENDFILE_HEADER")
+# Internal nginx location aliasing MEDIA_ROOT, for X-Accel-Redirect
+MEDIA_ACCEL_REDIRECT_PREFIX = "/protected-media/"
+# Media anyone may fetch, other files need an authenticated user
+MEDIA_PUBLIC_PREFIXES = ("profile_images/",)
+# Media URLs kept in the process, signed URLs for at most half their expiry
+MEDIA_URL_CACHE_TIMEOUT = 5 * 60  # 5 minutes
+
 # Twilio Settings
 
 TWILIO_ACCOUNT_SID = os.getenv("TWILIO_ACCOUNT_SID")
@@ -263,6 +310,13 @@ TWILIO_PHONE_NUMBER = os.getenv("TWILIO_PHONE_NUMBER")
 # Recaptcha Settings
 RECAPTCHA_SITE_KEY = os.getenv("RECAPTCHA_SITE_KEY")
 RECAPTCHA_SECRET_KEY = os.getenv("RECAPTCHA_SECRET_KEY")
+RECAPTCHA_VERIFY_URL = "https://www.google.com/recaptcha/api/siteverify"
+RECAPTCHA_TIMEOUT = (1, 2)  # connect and read timeouts in seconds
+# Accept tokens while Google is unavailable instead of rejecting them
+RECAPTCHA_FAIL_OPEN = os.getenv("RECAPTCHA_FAIL_OPEN") == "True"
+# Failures in a row that stop the calls to Google for RECAPTCHA_RESET_SECONDS
+RECAPTCHA_FAILURE_THRESHOLD = 5
+RECAPTCHA_RESET_SECONDS = 30
 
 # REST Framework Settings
 
@@ -270,14 +324,14 @@ RECAPTCHA_SECRET_KEY = os.getenv("RECAPTCHA_SECRET_KEY")
 REST_FRAMEWORK = {
     "DEFAULT_SCHEMA_CLASS": ("drf_spectacular.openapi.AutoSchema"),
     "DEFAULT_AUTHENTICATION_CLASSES": (
-        "rest_framework_simplejwt.authentication.JWTAuthentication",
+        "auth_api.authentication.ClaimsJWTAuthentication",
     ),
     "DEFAULT_PERMISSION_CLASSES": (
         "rest_framework.permissions.IsAuthenticated",
         "rest_framework.permissions.IsAdminUser",
     ),
     "DEFAULT_FILTER_BACKENDS": ("django_filters.rest_framework.DjangoFilterBackend",),
-    "DEFAULT_THROTTLE_CLASSES": ("rest_framework.throttling.ScopedRateThrottle",),
+    "DEFAULT_THROTTLE_CLASSES": ("auth_api.throttles.RedisScopedRateThrottle",),
     "DEFAULT_THROTTLE_RATES": {
         "email_otp": "1/min",
         "email_verify": "1/min",
@@ -285,9 +339,20 @@ REST_FRAMEWORK = {
         "phone_otp": "1/min",
     },
     "DEFAULT_RENDERER_CLASSES": ("backend.renderers.ViewRenderer",),
+    "DEFAULT_PARSER_CLASSES": (
+        "backend.parsers.ORJSONParser",
+        "rest_framework.parsers.FormParser",
+        "rest_framework.parsers.MultiPartParser",
+    ),
     "ORDERING_PARAM": "ordering",
 }
 
+# Rows read from the database and encoded at a time by streamed list responses
+STREAM_CHUNK_SIZE = 500
+
+# Seconds a compressed response body stays cached, a version bump misses it before
+RESPONSE_CACHE_TIMEOUT = 3600
+
 # Simple JWT Settings
 
 REST_USE_JWT = True
@@ -296,8 +361,8 @@ SIMPLE_JWT = {
     # 10 second window for access_token_expiry setup
     "ACCESS_TOKEN_LIFETIME": timedelta(minutes=5, seconds=10),
     "REFRESH_TOKEN_LIFETIME": timedelta(days=1),
-    # Set the RS256 algorithm
-    "ALGORITHM": "RS256",
+    # Algorithm of the key pair below (RS256, ES256, EdDSA, ...)
+    "ALGORITHM": os.getenv("JWT_ALGORITHM", "RS256"),
     # Set the private key for signing the token
     "SIGNING_KEY": PRIVATE_KEY,
     # Set the public key for verifying the token
@@ -306,8 +371,27 @@ SIMPLE_JWT = {
     "USER_ID_CLAIM": "user_id",
     "ROTATE_REFRESH_TOKENS": True,
     "BLACKLIST_AFTER_ROTATION": True,
+    # Stamp the user claims on the tokens so requests skip the user lookup
+    "TOKEN_OBTAIN_SERIALIZER": "auth_api.serializers.ClaimsTokenObtainPairSerializer",
+    "TOKEN_REFRESH_SERIALIZER": "auth_api.serializers.ClaimsTokenRefreshSerializer",
+    # Verified through the token backend with parsed keys and the verified-token LRU
+    "AUTH_TOKEN_CLASSES": ("auth_api.tokens.ClaimsAccessToken",),
 }
 
+# Verified access tokens remembered per process until they expire
+JWT_VERIFIED_TOKEN_CACHE_SIZE = 4096
+
+# Key ring written by `manage.py rotate_jwt_keys`, the key pair above is used
+# while it does not exist
+JWT_KEY_RING_FILE = os.getenv("JWT_KEY_RING_FILE", "")
+
+# Issued and revoked refresh tokens, auth_api.token_state.DatabaseTokenState
+# keeps them in the token_blacklist tables instead
+TOKEN_STATE_BACKEND = "auth_api.token_state.RedisTokenState"
+# Copy the Redis token state to the token_blacklist tables in the background
+TOKEN_STATE_ARCHIVE = os.getenv("TOKEN_STATE_ARCHIVE") == "True"
+TOKEN_ARCHIVE_BATCH_SIZE = 1000
+
 # CORS Settings
 
 CORS_ALLOWED_ORIGINS = os.getenv("CORS_ALLOWED_ORIGINS", "http://localhost:3000").split(
@@ -339,6 +423,31 @@ CELERY_ACCEPT_CONTENT = ["json"]
 CELERY_TASK_SERIALIZER = "json"
 CELERY_RESULT_SERIALIZER = "json"
 CELERY_TIMEZONE = "UTC"
+# Emails are sent by the workers consuming the email queue
+CELERY_TASK_ROUTES = {
+    "auth_api.tasks.send_emails": {"queue": "email"},
+    "auth_api.tasks.process_profile_image": {"queue": "media"},
+    "core_db.tasks.delete_tombstoned_media": {"queue": "media"},
+    "core_db.tasks.scan_orphaned_media": {"queue": "media"},
+}
+# Task modules outside the apps' tasks.py
+CELERY_IMPORTS = ("backend.compression",)
+# Run the tasks inline when running the tests, no broker is needed
+CELERY_TASK_ALWAYS_EAGER = "test" in sys.argv
+
+# Expired token cleanup, deleted in id chunks with a pause between them
+TOKEN_CLEANUP_BATCH_SIZE = 5000
+TOKEN_CLEANUP_PAUSE_SECONDS = 0.1
+TOKEN_CLEANUP_MAX_SECONDS = 300  # then the rest continues in a new task
+
+# Released media objects are deleted in batches after a delay
+MEDIA_CLEANUP_DELAY_SECONDS = 60
+MEDIA_CLEANUP_BATCH_SIZE = 1000  # keys of one S3 DeleteObjects request
+# A cleanup claim older than this is taken over, its worker is assumed gone
+MEDIA_CLEANUP_CLAIM_SECONDS = 5 * 60  # 5 minutes
+# Unreferenced media older than the grace period are deleted by the daily scan
+MEDIA_ORPHAN_SCAN_PREFIXES = ("profile_images/",)
+MEDIA_ORPHAN_GRACE_SECONDS = 24 * 60 * 60  # 1 day
 
 # Celery Beat Schedule
 CELERY_BEAT_SCHEDULE = {
@@ -350,6 +459,18 @@ CELERY_BEAT_SCHEDULE = {
         "task": "core_db.tasks.cleanup_expired_tokens",
         "schedule": 21600,  # Run every 6 hours
     },
+    "archive-refresh-tokens-every-minute": {
+        "task": "auth_api.tasks.archive_refresh_tokens",
+        "schedule": 60,  # Run every 1 minute
+    },
+    "delete-tombstoned-media-every-hour": {
+        "task": "core_db.tasks.delete_tombstoned_media",
+        "schedule": 3600,  # Run every 1 hour, retrying failed deletions
+    },
+    "scan-orphaned-media-every-day": {
+        "task": "core_db.tasks.scan_orphaned_media",
+        "schedule": 86400,  # Run every 1 day
+    },
 }
 
 # User Settings
@@ -366,9 +487,12 @@ EMAIL_HOST = "smtp.gmail.com"
 EMAIL_PORT = 587
 EMAIL_HOST_USER = os.getenv("EMAIL_HOST_USER")
 EMAIL_HOST_PASSWORD = os.getenv("EMAIL_HOST_PASSWORD")
+# Seconds a worker reuses its SMTP session before opening a new one
+EMAIL_CONNECTION_MAX_AGE = 60
 
 # Security Settings
 MAX_LOGIN_FAILURE_LIMIT = 5
+MAX_OTP_ATTEMPTS = 5
 SECURE_PROXY_SSL_HEADER = (
     "HTTP_X_FORWARDED_PROTO",
     "https",
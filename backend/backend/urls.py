@@ -15,20 +15,24 @@ Including another URLconf
     2. Add a URL to urlpatterns:  path('blog/', include('blog.urls'))
 """
 
+import re
+from urllib.parse import urlsplit
 from django.contrib import admin
-from django.urls import path, include
+from django.urls import path, re_path, include
 from django.conf import settings
-from django.conf.urls.static import static
 from drf_spectacular.views import (
     SpectacularAPIView,
     SpectacularSwaggerView,
     SpectacularRedocView,
 )
+from auth_api.views import JWKSView
+from core_db.views import MediaView
 
 urlpatterns = [
     path("admin/", admin.site.urls),
     path("auth-api/", include("auth_api.urls")),
     path("blog-api/", include("blog_api.urls")),
+    path(".well-known/jwks.json", JWKSView.as_view(), name="jwks"),
     path("swagger-api/schema/", SpectacularAPIView.as_view(), name="schema"),
     path(
         "swagger-api/docs/",
@@ -42,5 +46,13 @@ urlpatterns = [
     ),
 ]
 
-if settings.DEBUG:
-    urlpatterns += static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
+# Local media, authorized here and sent by the front proxy
+if settings.MEDIA_ROOT and settings.MEDIA_URL:
+    media_prefix = urlsplit(settings.MEDIA_URL).path.lstrip("/")
+    urlpatterns += [
+        re_path(
+            rf"^{re.escape(media_prefix)}(?P<path>.+)$",
+            MediaView.as_view(),
+            name="media",
+        ),
+    ]
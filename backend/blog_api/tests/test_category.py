@@ -1,9 +1,17 @@
 # pylint: skip-file
 
+import gzip
+import json
+import brotli
+import zstandard
+from unittest.mock import patch
+from django.core.cache import cache
 from django.urls import reverse
 from django.contrib.auth import get_user_model
 from rest_framework.test import APITestCase, APIClient
 from core_db.models import Category, User_Category
+from kombu.exceptions import OperationalError
+from backend.compression import precompress_response
 
 # import logging
 
@@ -32,6 +40,7 @@ def create_user(**params):
 
 class PublicCategoryTest(APITestCase):
     def setUp(self):
+        cache.clear()
         self.client = APIClient()
         self.category = Category.objects.create(name="Sample Category")
 
@@ -86,6 +95,7 @@ class PublicCategoryTest(APITestCase):
 
 class PrivateCategoryTest(APITestCase):
     def setUp(self):
+        cache.clear()
         self.superuser = get_user_model().objects.create_superuser(
             email="superuser@example.com",
             password="SuperUser@123",
@@ -391,3 +401,139 @@ class PrivateUserCategoryTest(APITestCase):
             user_category_detail_url(self.user_category.id), payload
         )
         self.assertEqual(res.status_code, 405)
+
+
+class ConditionalCategoryTest(APITestCase):
+    """Test conditional GETs of categories"""
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.category = Category.objects.create(name="Sample Category")
+
+    def test_list_not_modified(self):
+        """A current list is answered without a query"""
+        etag = self.client.get(CATEGORY_URL)["ETag"]
+
+        with self.assertNumQueries(0):
+            res = self.client.get(CATEGORY_URL, HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(res.status_code, 304)
+        self.assertEqual(res["ETag"], etag)
+        self.assertEqual(res["Cache-Control"], "no-cache")
+
+    def test_change_outdates_etags(self):
+        """Saving or deleting a category bumps the version once committed"""
+        list_etag = self.client.get(CATEGORY_URL)["ETag"]
+        detail_etag = self.client.get(category_detail_url(self.category.id))["ETag"]
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Category.objects.create(name="Other Category")
+
+        res = self.client.get(CATEGORY_URL, HTTP_IF_NONE_MATCH=list_etag)
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(len(res.data), 2)
+        res = self.client.get(
+            category_detail_url(self.category.id), HTTP_IF_NONE_MATCH=detail_etag
+        )
+        self.assertEqual(res.status_code, 200)
+
+        url, etag = category_detail_url(self.category.id), res["ETag"]
+        with self.captureOnCommitCallbacks(execute=True):
+            self.category.delete()
+        res = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(res.status_code, 404)
+
+    def test_detail_not_modified(self):
+        """A current category is answered before it is looked up"""
+        url = category_detail_url(self.category.id)
+        etag = self.client.get(url)["ETag"]
+
+        cache.delete_pattern("compressed_response:*")
+
+        with self.assertNumQueries(0):
+            res = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(res.status_code, 304)
+
+
+class CompressedCategoryTest(APITestCase):
+    """Test the category responses cached compressed"""
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        for i in range(20):
+            Category.objects.create(name=f"Category number {i}")
+
+    def test_codings(self):
+        """Each accepted coding gets the same body, compressed"""
+        decompress = {
+            "gzip": gzip.decompress,
+            "br": brotli.decompress,
+            "zstd": zstandard.ZstdDecompressor().decompress,
+        }
+        plain = self.client.get(CATEGORY_URL)
+        self.assertFalse(plain.has_header("Content-Encoding"))
+
+        for coding, decode in decompress.items():
+            res = self.client.get(CATEGORY_URL, HTTP_ACCEPT_ENCODING=coding)
+            self.assertEqual(res["Content-Encoding"], coding)
+            self.assertIn("Accept-Encoding", res["Vary"])
+            self.assertEqual(res["ETag"], f"W/{plain['ETag']}")
+            self.assertEqual(decode(res.content), plain.content)
+
+    def test_hit_without_queries(self):
+        """Hits are sent from the cache"""
+        self.client.get(CATEGORY_URL)
+
+        with self.assertNumQueries(0):
+            res = self.client.get(CATEGORY_URL, HTTP_ACCEPT_ENCODING="gzip")
+
+        self.assertEqual(len(json.loads(gzip.decompress(res.content))), 20)
+
+    def test_change_misses(self):
+        """A committed change is not served from the older entries"""
+        self.client.get(CATEGORY_URL)
+        with self.captureOnCommitCallbacks(execute=True):
+            Category.objects.create(name="Another Category")
+
+        res = self.client.get(CATEGORY_URL, HTTP_ACCEPT_ENCODING="br")
+
+        self.assertEqual(len(json.loads(brotli.decompress(res.content))), 21)
+
+    def test_small_body_uncompressed(self):
+        """Bodies that do not shrink are sent uncompressed"""
+        category = Category.objects.first()
+
+        res = self.client.get(
+            category_detail_url(category.id), HTTP_ACCEPT_ENCODING="gzip"
+        )
+
+        self.assertFalse(res.has_header("Content-Encoding"))
+        self.assertEqual(res.data, {"id": category.id, "name": category.name})
+
+    def test_miss_compresses_negotiated_coding(self):
+        """A miss compresses the requested coding, the task the others"""
+        with patch("backend.compression.precompress_response") as task:
+            res = self.client.get(CATEGORY_URL, HTTP_ACCEPT_ENCODING="br")
+
+        self.assertEqual(res["Content-Encoding"], "br")
+        self.assertEqual(len(json.loads(brotli.decompress(res.content))), 20)
+        self.assertEqual(len(cache.keys("compressed_response:*")), 2)
+        task.delay.assert_called_once()
+
+        precompress_response(*task.delay.call_args.args)
+        self.assertEqual(len(cache.keys("compressed_response:*")), 4)
+
+    def test_broker_down(self):
+        """A miss is still answered when the task cannot be queued"""
+        with patch(
+            "backend.compression.precompress_response.delay",
+            side_effect=OperationalError("Connection refused"),
+        ), self.assertLogs("backend.compression", "WARNING"):
+            res = self.client.get(CATEGORY_URL, HTTP_ACCEPT_ENCODING="gzip")
+
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(len(json.loads(gzip.decompress(res.content))), 20)
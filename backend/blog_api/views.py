@@ -4,10 +4,17 @@ from rest_framework.views import APIView
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
 from rest_framework import status
-from rest_framework_simplejwt.authentication import JWTAuthentication
 from django.contrib.auth import get_user_model
 from drf_spectacular.utils import extend_schema, OpenApiResponse
-from core_db.models import Category, User_Category
+from core_db.models import CATEGORY_VERSION_KEY, Category, User_Category
+from auth_api.authentication import ClaimsJWTAuthentication
+from backend.compression import CompressedResponses
+from backend.conditional import (
+    cache_version,
+    conditional_response,
+    make_etag,
+    set_validators,
+)
 from backend.renderers import ViewRenderer
 from .serializers import CategorySerializer, UserCategorySerializer
 
@@ -15,7 +22,7 @@ from .serializers import CategorySerializer, UserCategorySerializer
 class CategoryView(APIView):
     """Category Get and Create View."""
 
-    authentication_classes = [JWTAuthentication]
+    authentication_classes = [ClaimsJWTAuthentication]
     permission_classes = [IsAuthenticated]
     renderer_classes = [ViewRenderer]
 
@@ -39,9 +46,21 @@ class CategoryView(APIView):
     )
     def get(self, request, *args, **kwargs):
         """List all the categories or retrieve a single category."""
-        categories = Category.objects.all()
-        serializer = CategorySerializer(categories, many=True)
-        return Response(serializer.data, status=status.HTTP_200_OK)
+        version = cache_version(CATEGORY_VERSION_KEY)
+        etag = make_etag("categories", version)
+        response = conditional_response(request, etag) or CompressedResponses.get(
+            request, version
+        )
+        if response is None:
+            categories = Category.objects.all()
+            serializer = CategorySerializer(categories, many=True)
+            response = CompressedResponses.cache(
+                request,
+                version,
+                Response(serializer.data, status=status.HTTP_200_OK),
+                self,
+            )
+        return set_validators(response, etag)
 
     @extend_schema(
         summary="Create a Category",
@@ -101,7 +120,7 @@ class CategoryView(APIView):
 class CategoryViewID(APIView):
     """Category Get and Delete View."""
 
-    authentication_classes = [JWTAuthentication]
+    authentication_classes = [ClaimsJWTAuthentication]
     permission_classes = [IsAuthenticated]
     renderer_classes = [ViewRenderer]
 
@@ -153,14 +172,29 @@ class CategoryViewID(APIView):
         cat_id = kwargs.get("cat_id")
 
         if cat_id:
-            try:
-                category = Category.objects.get(id=cat_id)
+            version = cache_version(CATEGORY_VERSION_KEY)
+            etag = make_etag("category", cat_id, version)
+            # The ETag was sent for a category that existed at this version, a
+            # deletion bumps it, so a current copy is answered before any lookup
+            response = conditional_response(request, etag) or CompressedResponses.get(
+                request, version
+            )
+            if response is None:
+                try:
+                    category = Category.objects.get(id=cat_id)
+                except Category.DoesNotExist:
+                    return Response(
+                        {"error": "Category not found"},
+                        status=status.HTTP_404_NOT_FOUND,
+                    )
                 serializer = CategorySerializer(category)
-                return Response(serializer.data, status=status.HTTP_200_OK)
-            except Category.DoesNotExist:
-                return Response(
-                    {"error": "Category not found"}, status=status.HTTP_404_NOT_FOUND
+                response = CompressedResponses.cache(
+                    request,
+                    version,
+                    Response(serializer.data, status=status.HTTP_200_OK),
+                    self,
                 )
+            return set_validators(response, etag)
 
         return Response(
             {"error": "Category ID not provided."},
@@ -247,7 +281,7 @@ class CategoryViewID(APIView):
 class UserCategoryView(APIView):
     """User Category Create and Delete View."""
 
-    authentication_classes = [JWTAuthentication]
+    authentication_classes = [ClaimsJWTAuthentication]
     permission_classes = [IsAuthenticated]
     renderer_classes = [ViewRenderer]
 
@@ -268,7 +302,7 @@ class UserCategoryView(APIView):
     def get(self, request, *args, **kwargs):
         """List all the User Categories."""
         try:
-            user_categories = User_Category.objects.filter(user=request.user)
+            user_categories = User_Category.objects.filter(user_id=request.user.id)
             serializer = UserCategorySerializer(user_categories, many=True)
             return Response(serializer.data, status=status.HTTP_200_OK)
         except Exception as e:  # pylint: disable=W0718
@@ -358,7 +392,7 @@ class UserCategoryView(APIView):
 class UserCategoryViewID(APIView):
     """User Category Get and Delete View."""
 
-    authentication_classes = [JWTAuthentication]
+    authentication_classes = [ClaimsJWTAuthentication]
     permission_classes = [IsAuthenticated]
     renderer_classes = [ViewRenderer]
 
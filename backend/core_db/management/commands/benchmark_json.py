@@ -0,0 +1,111 @@
+"""Microbenchmark of the JSON renderer and parser."""
+
+import io
+import timeit
+from datetime import timedelta
+from functools import partial
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from rest_framework.parsers import JSONParser
+from rest_framework.renderers import JSONRenderer
+from rest_framework.response import Response
+from auth_api.serializers import UserSerializer
+from backend.parsers import ORJSONParser
+from backend.renderers import ViewRenderer
+from blog_api.serializers import BlogSerializer
+from core_db.models import Blog
+
+
+def parse(parser, body):
+    """Parse a request body with the parser."""
+    return parser.parse(io.BytesIO(body))
+
+
+class Command(BaseCommand):
+    """Compare DRF's JSON renderer and parser with the orjson ones, on unsaved
+    rows shaped like a user list and a blog feed page."""
+
+    help = "Benchmark rendering and parsing API responses with json and orjson."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--number", type=int, default=200)
+        parser.add_argument("--users", type=int, default=100)
+        parser.add_argument("--blogs", type=int, default=20)
+
+    def report(self, label, seconds, number):
+        """Write the time per operation and the throughput."""
+        self.stdout.write(
+            f"{label:<40} {seconds / number * 1e6:10.1f} us/op"
+            f" {number / seconds:12.0f} ops/s"
+        )
+
+    def pages(self, users, blogs):
+        """Serialized pages of users and blogs, as the list views return them."""
+        now = timezone.now()
+        user_rows = [
+            get_user_model()(
+                id=i,
+                email=f"user{i}@example.com",
+                username=f"user{i}",
+                first_name="First",
+                last_name="Last",
+                bio="Writes about software, travel and food. " * 3,
+                phone_number=f"+1415555{i:04d}",
+                slug=f"user{i}",
+            )
+            for i in range(1, users + 1)
+        ]
+        blog_rows = [
+            Blog(
+                id=i,
+                title=f"Blog post number {i}",
+                content="Lorem ipsum dolor sit amet, consectetur adipiscing. " * 40,
+                overview="An overview of the post. " * 4,
+                author_id=i,
+                likes=i * 3,
+                status="Published",
+                visibility=True,
+                created_at=now - timedelta(hours=i),
+                score=1 / i,
+                slug=f"blog-post-number-{i}",
+            )
+            for i in range(1, blogs + 1)
+        ]
+
+        def page(results):
+            return {"count": len(results), "next": None, "results": results}
+
+        return {
+            f"user list ({users} rows)": page(
+                UserSerializer(user_rows, many=True).data
+            ),
+            f"blog feed ({blogs} rows)": page(
+                BlogSerializer(blog_rows, many=True).data
+            ),
+        }
+
+    def handle(self, *args, **options):
+        number = options["number"]
+        context = {"response": Response(status=200)}
+        renderers = (("json", JSONRenderer()), ("orjson", ViewRenderer()))
+        parsers = (("json", JSONParser()), ("orjson", ORJSONParser()))
+
+        for name, data in self.pages(options["users"], options["blogs"]).items():
+            body = JSONRenderer().render(data)
+            self.stdout.write(f"\n{name}, {len(body)} bytes")
+
+            for label, renderer in renderers:
+                self.report(
+                    f"render ({label})",
+                    timeit.timeit(
+                        partial(renderer.render, data, None, context), number=number
+                    ),
+                    number,
+                )
+            for label, parser in parsers:
+                self.report(
+                    f"parse ({label})",
+                    timeit.timeit(partial(parse, parser, body), number=number),
+                    number,
+                )
@@ -0,0 +1,18 @@
+# Generated by Django 5.1.6 on 2026-10-19 10:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("core_db", "0016_blog_score_blog_core_db_blo_score_4cbf3b_idx_and_more"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="user",
+            name="profile_img_source",
+            field=models.URLField(blank=True, max_length=500, null=True),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.1.6 on 2026-10-19 11:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("core_db", "0017_user_profile_img_source"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="user",
+            name="profile_img_variants",
+            field=models.JSONField(blank=True, default=dict),
+        ),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 5.1.6 on 2026-10-19 11:40
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("core_db", "0021_user_updated_at_blog_updated_at"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="mediablob",
+            name="updated_at",
+            field=models.DateTimeField(
+                auto_now=True, default=django.utils.timezone.now
+            ),
+            preserve_default=False,
+        ),
+        migrations.AddField(
+            model_name="mediatombstone",
+            name="claimed_at",
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
@@ -84,6 +84,10 @@ class User(AbstractBaseUser, PermissionsMixin):
     profile_img = models.ImageField(
         upload_to="profile_images/", blank=True, null=True, max_length=500
     )
+    # Provider URL the social login avatar was imported from
+    profile_img_source = models.URLField(blank=True, null=True, max_length=500)
+    # Resized copies of profile_img, written by the image processing task
+    profile_img_variants = models.JSONField(default=dict, blank=True)
     strikes = models.IntegerField(
         default=0,
         validators=[MaxValueValidator(getattr(settings, "MAX_STRIKES", 3))],
@@ -100,6 +104,7 @@ class User(AbstractBaseUser, PermissionsMixin):
         max_length=20, choices=AUTH_PROVIDER, default="email"
     )
     slug = models.SlugField(unique=True, blank=True, null=True)
+    updated_at = models.DateTimeField(auto_now=True)
 
     objects = UserManager()
 
@@ -188,6 +193,10 @@ class User(AbstractBaseUser, PermissionsMixin):
         return f"{self.email}"
 
 
+# Cache key of the categories version, bumped by every change to a category
+CATEGORY_VERSION_KEY = "category_version"
+
+
 class Category(models.Model):
     """Category Model"""
 
@@ -244,6 +253,7 @@ class Blog(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     score = models.FloatField(default=0.0)
     slug = models.SlugField(unique=True, blank=True, null=True)
+    updated_at = models.DateTimeField(auto_now=True)
 
     class Meta:
         indexes = [
@@ -300,3 +310,30 @@ class Blog_Category(models.Model):
 
     def __str__(self):
         return f"{self.blog.title} - {self.category.name}"
+
+
+class MediaBlob(models.Model):
+    """Stored media object under a content hash name, shared by every file
+    with the same content and deleted with its last reference"""
+
+    name = models.CharField(max_length=500, unique=True)
+    size = models.BigIntegerField()
+    ref_count = models.PositiveIntegerField(default=1)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.name} ({self.ref_count})"
+
+
+class MediaTombstone(models.Model):
+    """Stored media object to delete, recorded with the transaction releasing
+    it and deleted in batches once committed"""
+
+    name = models.CharField(max_length=500, unique=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    # Set while a cleanup deletes the object, outside of any transaction
+    claimed_at = models.DateTimeField(blank=True, null=True)
+
+    def __str__(self):
+        return self.name
@@ -1,11 +1,17 @@
 """Signals used before or after saving a model"""
 
-from django.db.models.signals import pre_save, post_save
+from functools import partial
+from django.core.signals import setting_changed
+from django.db import transaction
+from django.db.models.signals import pre_save, post_save, post_delete
 from django.contrib.auth.models import Group
 from django.dispatch import receiver
 from django.utils.text import slugify
 from django.utils.timezone import now
-from .models import User, Blog
+from backend.conditional import bump_cache_version
+from .models import CATEGORY_VERSION_KEY, User, Category, Blog, MediaTombstone
+from .storage import MediaURLs
+from .tasks import schedule_media_cleanup
 
 
 @receiver(pre_save, sender=User)
@@ -62,3 +68,26 @@ def save_blog_slug(
     if created or (slugify(instance.title) != instance.slug):
         instance.slug = slugify(instance.title)
         instance.save()
+
+
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+def bump_category_version(sender, **kwargs):  # pylint: disable=unused-argument
+    """Outdate the category ETags once the change is committed"""
+    transaction.on_commit(partial(bump_cache_version, CATEGORY_VERSION_KEY))
+
+
+@receiver(setting_changed)
+def clear_media_urls(setting, **kwargs):  # pylint: disable=unused-argument
+    """Forget the resolved media URLs when the storages change"""
+    if setting in ("STORAGES", "MEDIA_URL"):
+        MediaURLs.clear()
+
+
+@receiver(post_save, sender=MediaTombstone)
+def delete_tombstoned_media_on_commit(
+    sender, instance, created, **kwargs
+):  # pylint: disable=unused-argument
+    """Delete the released media objects once the release is committed"""
+    if created:
+        transaction.on_commit(schedule_media_cleanup)
@@ -0,0 +1,296 @@
+"""Content addressed media storage, saving each distinct file once."""
+
+import re
+import time
+import hashlib
+import weakref
+import posixpath
+from datetime import timedelta, timezone
+from django.apps import apps
+from django.conf import settings
+from django.core.files import File
+from django.core.files.storage import FileSystemStorage, storages
+from django.core.files.uploadhandler import (
+    MemoryFileUploadHandler,
+    TemporaryFileUploadHandler,
+)
+from django.core.files.utils import validate_file_name
+from django.db import IntegrityError, transaction
+from django.db.models import F
+from django.utils.encoding import filepath_to_uri
+from django.utils.timezone import now
+from storages.backends.s3 import S3StaticStorage
+
+# Content hash names never change content, caches may keep them forever
+IMMUTABLE_MAX_AGE = 365 * 24 * 60 * 60  # 1 year
+IMMUTABLE_CACHE_CONTROL = f"public, max-age={IMMUTABLE_MAX_AGE}, immutable"
+# .../ab/<SHA-256>.ext, where ab are the first two hex digits of the digest
+CONTENT_NAME_PATTERN = re.compile(r"(?:^|/)([0-9a-f]{2})/\1[0-9a-f]{62}(?:\.\w+)?$")
+# Most keys a single S3 DeleteObjects request takes
+DELETE_OBJECTS_MAX_KEYS = 1000
+# Pause between two checks of a tombstone claimed by a cleanup
+CLAIM_POLL_SECONDS = 0.1
+
+
+def content_digest(content):
+    """SHA-256 of the file, from the upload handler if it already hashed it."""
+    digest = getattr(content, "sha256", None)
+    if digest:
+        return digest
+
+    hasher = hashlib.sha256()
+    for chunk in content.chunks():
+        hasher.update(chunk)
+    content.seek(0)
+    return hasher.hexdigest()
+
+
+def content_name(name, digest):
+    """Content hash name of the file, in the directory it was saved to."""
+    directory, filename = posixpath.split(name)
+    extension = posixpath.splitext(filename)[1].lower()
+    return posixpath.join(directory, digest[:2], f"{digest}{extension}")
+
+
+def is_content_name(name):
+    """Whether name is a content hash name, see content_name."""
+    return CONTENT_NAME_PATTERN.search(name) is not None
+
+
+class ContentAddressedStorageMixin:
+    """Stores files under the SHA-256 of their content, with a reference count.
+
+    Saving a file already stored only increments its MediaBlob's count, deleting
+    decrements it. The last reference, or a name that was not saved this way
+    (e.g. a direct upload), leaves a MediaTombstone in the same transaction:
+    objects are only deleted once it is committed, in batches by
+    `core_db.tasks.delete_tombstoned_media`.
+    """
+
+    @staticmethod
+    def _blobs():
+        return apps.get_model("core_db", "MediaBlob").objects
+
+    @staticmethod
+    def _tombstones():
+        return apps.get_model("core_db", "MediaTombstone").objects
+
+    def save(self, name, content, max_length=None):  # pylint: disable=W0613
+        if name is None:
+            name = content.name
+        if not hasattr(content, "chunks"):
+            content = File(content, name)
+
+        name = content_name(name, content_digest(content))
+        validate_file_name(name, allow_relative_path=True)
+        blobs = self._blobs()
+
+        # A duplicate is only a metadata write
+        if blobs.filter(name=name).update(
+            ref_count=F("ref_count") + 1, updated_at=now()
+        ):
+            return name
+
+        # Content saved again before its deletion is kept, a deletion already
+        # in progress is waited for and the object written again
+        self._keep_tombstoned(name)
+        if not self.exists(name):
+            name = self._save(name, content)
+
+        try:
+            with transaction.atomic():
+                blobs.create(name=name, size=content.size)
+        except IntegrityError:
+            # Saved concurrently by another request
+            blobs.filter(name=name).update(
+                ref_count=F("ref_count") + 1, updated_at=now()
+            )
+
+        return name
+
+    def _keep_tombstoned(self, name):
+        """Delete the tombstone of name, once a cleanup that claimed it within
+        MEDIA_CLEANUP_CLAIM_SECONDS has deleted the object."""
+        while True:
+            with transaction.atomic():
+                tombstone = (
+                    self._tombstones().select_for_update().filter(name=name).first()
+                )
+                if tombstone is None:
+                    return
+
+                stale = now() - timedelta(seconds=settings.MEDIA_CLEANUP_CLAIM_SECONDS)
+                if tombstone.claimed_at is None or tombstone.claimed_at < stale:
+                    tombstone.delete()
+                    return
+
+            time.sleep(CLAIM_POLL_SECONDS)
+
+    def delete(self, name):
+        with transaction.atomic():
+            blob = self._blobs().select_for_update().filter(name=name).first()
+
+            if blob is not None and blob.ref_count > 1:
+                blob.ref_count -= 1
+                blob.save(update_fields=["ref_count", "updated_at"])
+                return
+
+            if blob is not None:
+                blob.delete()
+            self._tombstones().get_or_create(name=name)
+
+    def purge(self, names):
+        """Delete the objects at names right away, returns the names deleted."""
+        for name in names:
+            super().delete(name)
+        return list(names)
+
+    def iter_objects(self, prefix):
+        """Names and modification times of the objects under prefix."""
+        directories, files = self.listdir(prefix)
+        for filename in files:
+            name = posixpath.join(prefix, filename)
+            yield name, self.get_modified_time(name)
+        for directory in directories:
+            yield from self.iter_objects(posixpath.join(prefix, directory))
+
+
+class ContentAddressedFileSystemStorage(
+    ContentAddressedStorageMixin, FileSystemStorage
+):
+    """Content addressed media on the local filesystem."""
+
+
+class ContentAddressedS3Storage(  # pylint: disable=W0223
+    ContentAddressedStorageMixin, S3StaticStorage
+):
+    """Content addressed media in S3, served with far-future cache headers."""
+
+    def get_object_parameters(self, name):
+        params = super().get_object_parameters(name)
+        params.setdefault("CacheControl", IMMUTABLE_CACHE_CONTROL)
+        return params
+
+    def purge(self, names):
+        """Delete the objects with DeleteObjects, DELETE_OBJECTS_MAX_KEYS per
+        request. Keys S3 failed to delete are left out of the names returned."""
+        client = self.connection.meta.client
+        deleted = []
+
+        for start in range(0, len(names), DELETE_OBJECTS_MAX_KEYS):
+            batch = {
+                self._normalize_name(name): name
+                for name in names[start : start + DELETE_OBJECTS_MAX_KEYS]
+            }
+            response = client.delete_objects(
+                Bucket=self.bucket_name,
+                Delete={"Objects": [{"Key": key} for key in batch], "Quiet": True},
+            )
+            failed = {error["Key"] for error in response.get("Errors", [])}
+            deleted += [name for key, name in batch.items() if key not in failed]
+
+        return deleted
+
+    def iter_objects(self, prefix):
+        """Names and modification times of the objects under prefix, from the
+        bucket listing."""
+        location = self._normalize_name("")
+        paginator = self.connection.meta.client.get_paginator("list_objects_v2")
+        pages = paginator.paginate(
+            Bucket=self.bucket_name, Prefix=self._normalize_name(prefix)
+        )
+
+        for page in pages:
+            for item in page.get("Contents", []):
+                name = item["Key"][len(location) :].lstrip("/")
+                yield name, item["LastModified"].astimezone(timezone.utc)
+
+
+class HashingUploadHandlerMixin:
+    """Hashes the uploaded file while it is received, so storing it does not
+    read it again. The digest is set as the file's `sha256`."""
+
+    def new_file(self, *args, **kwargs):
+        self.hasher = hashlib.sha256()  # pylint: disable=W0201
+        super().new_file(*args, **kwargs)
+
+    def receive_data_chunk(self, raw_data, start):
+        remaining = super().receive_data_chunk(raw_data, start)
+        # Only the handler keeping the chunk hashes it
+        if remaining is None:
+            self.hasher.update(raw_data)
+        return remaining
+
+    def file_complete(self, file_size):
+        uploaded = super().file_complete(file_size)
+        if uploaded is not None:
+            uploaded.sha256 = self.hasher.hexdigest()
+        return uploaded
+
+
+class HashingMemoryFileUploadHandler(
+    HashingUploadHandlerMixin, MemoryFileUploadHandler
+):
+    """In memory upload handler hashing the file."""
+
+
+class HashingTemporaryFileUploadHandler(
+    HashingUploadHandlerMixin, TemporaryFileUploadHandler
+):
+    """Temporary file upload handler hashing the file."""
+
+
+class MediaURLs:
+    """URLs of stored files, memoized per storage and name.
+
+    Storages serving public objects (local media, S3 without querystring auth)
+    use a fast unsigned mode: their URL prefix is resolved once and names are
+    appended to it, without a storage call per file. Signed URLs are kept for
+    URL_TIMEOUT seconds, at most half of their expiry.
+    """
+
+    URL_TIMEOUT = settings.MEDIA_URL_CACHE_TIMEOUT
+    MAX_URLS = 10000  # signed URLs kept per storage
+    PROBE = "url-probe"
+
+    _prefixes = weakref.WeakKeyDictionary()
+    _urls = weakref.WeakKeyDictionary()
+
+    @classmethod
+    def url(cls, name, storage=None):
+        """URL of the file at name, in the default storage if none is given."""
+        storage = storage or storages["default"]
+
+        prefix = cls._prefix(storage)
+        if prefix is not None:
+            return prefix + filepath_to_uri(name).lstrip("/")
+
+        urls = cls._urls.setdefault(storage, {})
+        cached = urls.get(name)
+        if cached is not None and cached[0] > time.monotonic():
+            return cached[1]
+
+        if len(urls) >= cls.MAX_URLS:
+            urls.clear()
+        timeout = min(cls.URL_TIMEOUT, storage.querystring_expire // 2)
+        url = storage.url(name)
+        urls[name] = (time.monotonic() + timeout, url)
+        return url
+
+    @classmethod
+    def _prefix(cls, storage):
+        """URL prefix of a storage of public objects, None if URLs are signed."""
+        if storage not in cls._prefixes:
+            prefix = None
+            if not getattr(storage, "querystring_auth", False):
+                url = storage.url(cls.PROBE)
+                if url.endswith(cls.PROBE):
+                    prefix = url[: -len(cls.PROBE)]
+            cls._prefixes[storage] = prefix
+        return cls._prefixes[storage]
+
+    @classmethod
+    def clear(cls):
+        """Forget every resolved URL."""
+        cls._prefixes.clear()
+        cls._urls.clear()
@@ -1,11 +1,20 @@
 import math
+import time
 import random
 import logging
+from datetime import timedelta
 from celery import shared_task
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.files.storage import default_storage
 from django.utils import timezone
-from django.db import models
-from rest_framework_simplejwt.tokens import OutstandingToken
-from core_db.models import Blog
+from django.db import models, transaction
+from rest_framework_simplejwt.token_blacklist.models import (
+    BlacklistedToken,
+    OutstandingToken,
+)
+from core_db.models import Blog, MediaBlob, MediaTombstone
 
 
 logger = logging.getLogger(__name__)
@@ -30,11 +39,209 @@ def update_blog_scores():
     Blog.objects.bulk_update(blogs_to_update, ["score"])
 
 
+# Cursor of an interrupted token cleanup, the next run resumes after it
+TOKEN_CLEANUP_CURSOR_KEY = "token_cleanup_cursor"
+
+
+def delete_expired_token_batch(cursor, cutoff, batch_size):
+    """Delete the next chunk of expired tokens after the cursor id.
+    Returns the last id of the chunk (None when done) and the deleted counts."""
+    ids = list(
+        OutstandingToken.objects.filter(id__gt=cursor, expires_at__lt=cutoff)
+        .order_by("id")
+        .values_list("id", flat=True)[:batch_size]
+    )
+
+    if not ids:
+        return None, 0, 0
+
+    # The chunk bounds the rows the collector loads, blacklisted tokens cascade
+    _, deleted = OutstandingToken.objects.filter(id__in=ids).delete()
+
+    return (
+        ids[-1],
+        deleted.get(OutstandingToken._meta.label, 0),
+        deleted.get(BlacklistedToken._meta.label, 0),
+    )
+
+
 # Background task to clean up expired refresh tokens
+@shared_task(bind=True)
+def cleanup_expired_tokens(self, batch_size=None, max_seconds=None):
+    """Clean up expired refresh tokens in id chunks, resuming an interrupted run."""
+    batch_size = batch_size or settings.TOKEN_CLEANUP_BATCH_SIZE
+    max_seconds = max_seconds or settings.TOKEN_CLEANUP_MAX_SECONDS
+    cutoff = timezone.now()
+    cursor = cache.get(TOKEN_CLEANUP_CURSOR_KEY, 0)
+    started = time.monotonic()
+    stats = {"batches": 0, "outstanding": 0, "blacklisted": 0, "finished": False}
+
+    while True:
+        last_id, outstanding, blacklisted = delete_expired_token_batch(
+            cursor, cutoff, batch_size
+        )
+
+        if last_id is None:
+            cache.delete(TOKEN_CLEANUP_CURSOR_KEY)
+            stats["finished"] = True
+            break
+
+        cursor = last_id
+        cache.set(TOKEN_CLEANUP_CURSOR_KEY, cursor, timeout=None)
+        stats["batches"] += 1
+        stats["outstanding"] += outstanding
+        stats["blacklisted"] += blacklisted
+
+        if time.monotonic() - started >= max_seconds:
+            # Hand the rest to a new task so workers are not held by one run
+            self.apply_async(
+                kwargs={"batch_size": batch_size, "max_seconds": max_seconds},
+                countdown=settings.TOKEN_CLEANUP_PAUSE_SECONDS,
+            )
+            break
+
+        # Yield between chunks to let other queries through
+        time.sleep(settings.TOKEN_CLEANUP_PAUSE_SECONDS)
+
+    elapsed = time.monotonic() - started
+    stats["seconds"] = round(elapsed, 3)
+    stats["rows_per_second"] = (
+        round(stats["outstanding"] / elapsed, 1) if elapsed else 0
+    )
+    logger.info(
+        "Deleted %s expired refresh tokens and %s blacklist entries in %s batches "
+        "(%.1f rows/s, cursor %s, finished %s)",
+        stats["outstanding"],
+        stats["blacklisted"],
+        stats["batches"],
+        stats["rows_per_second"],
+        cursor,
+        stats["finished"],
+    )
+    return stats
+
+
+# Set while a media cleanup is scheduled, deletions made meanwhile wait for it
+MEDIA_CLEANUP_SCHEDULED_KEY = "media_cleanup_scheduled"
+
+
+def schedule_media_cleanup():
+    """Delete the tombstoned media objects after MEDIA_CLEANUP_DELAY_SECONDS,
+    in one task for every deletion recorded until then."""
+    delay = settings.MEDIA_CLEANUP_DELAY_SECONDS
+    if cache.add(MEDIA_CLEANUP_SCHEDULED_KEY, True, timeout=2 * delay):
+        delete_tombstoned_media.apply_async(countdown=delay)
+
+
+# Background task to delete the tombstoned media objects
 @shared_task
-def cleanup_expired_tokens():
-    """Clean up expired refresh tokens."""
-    expired_tokens = OutstandingToken.objects.filter(expires_at__lt=timezone.now())
-    count = expired_tokens.count()
-    expired_tokens.delete()
-    logger.info("Deleted %s expired refresh tokens", count)
+def delete_tombstoned_media(batch_size=None):
+    """Delete the tombstoned objects in batches (one DeleteObjects request on
+    S3). Objects that failed to delete keep their tombstone for the next run."""
+    cache.delete(MEDIA_CLEANUP_SCHEDULED_KEY)
+    batch_size = batch_size or settings.MEDIA_CLEANUP_BATCH_SIZE
+    stored = MediaBlob.objects.values("name")
+    cursor = 0
+    stats = {"deleted": 0, "failed": 0}
+
+    # Content saved again since it was released is kept
+    MediaTombstone.objects.filter(name__in=stored).delete()
+
+    while True:
+        claimed_at = timezone.now()
+        stale = claimed_at - timedelta(seconds=settings.MEDIA_CLEANUP_CLAIM_SECONDS)
+        with transaction.atomic():
+            # Claimed, not locked, while deleted: a save of the same content
+            # waits for the claim instead of a transaction
+            tombstones = dict(
+                MediaTombstone.objects.select_for_update(skip_locked=True)
+                .filter(
+                    models.Q(claimed_at=None) | models.Q(claimed_at__lt=stale),
+                    id__gt=cursor,
+                )
+                .exclude(name__in=stored)
+                .order_by("id")
+                .values_list("name", "id")[:batch_size]
+            )
+            MediaTombstone.objects.filter(id__in=tombstones.values()).update(
+                claimed_at=claimed_at
+            )
+        if not tombstones:
+            break
+
+        deleted = []
+        try:
+            deleted = default_storage.purge(list(tombstones))
+        finally:
+            with transaction.atomic():
+                MediaTombstone.objects.filter(
+                    id__in=[tombstones[name] for name in deleted]
+                ).delete()
+                # Failed objects go back to the queue of the next run
+                MediaTombstone.objects.filter(id__in=tombstones.values()).update(
+                    claimed_at=None
+                )
+
+        cursor = max(tombstones.values())
+        stats["deleted"] += len(deleted)
+        stats["failed"] += len(tombstones) - len(deleted)
+        if len(tombstones) < batch_size:
+            break
+
+    logger.info(
+        "Deleted %s tombstoned media objects, %s failed",
+        stats["deleted"],
+        stats["failed"],
+    )
+    return stats
+
+
+def referenced_media():
+    """Names of the stored media the database refers to or already tombstoned.
+
+    MediaBlob rows are not references, a count leaked by a save that was never
+    released must not keep its object."""
+    referenced = set(settings.DEFAULT_PROFILE_IMAGES)
+    referenced.update(MediaTombstone.objects.values_list("name", flat=True))
+
+    users = get_user_model().objects.values_list("profile_img", "profile_img_variants")
+    for name, variants in users.iterator():
+        referenced.add(name)
+        for size, names in (variants or {}).items():
+            if size != "source":
+                referenced.update(names.values())
+
+    return referenced
+
+
+# Background task to tombstone the media objects nothing references
+@shared_task
+def scan_orphaned_media():
+    """Tombstone the objects under MEDIA_ORPHAN_SCAN_PREFIXES that nothing
+    references, e.g. direct uploads never confirmed. Objects younger than
+    MEDIA_ORPHAN_GRACE_SECONDS may still be about to be referenced."""
+    cutoff = timezone.now() - timedelta(seconds=settings.MEDIA_ORPHAN_GRACE_SECONDS)
+    referenced = referenced_media()
+
+    orphans = [
+        name
+        for prefix in settings.MEDIA_ORPHAN_SCAN_PREFIXES
+        for name, modified in default_storage.iter_objects(prefix)
+        if modified < cutoff and name not in referenced
+    ]
+
+    with transaction.atomic():
+        # Leaked counts, unless counted again within the grace period
+        MediaBlob.objects.filter(name__in=orphans, updated_at__lt=cutoff).delete()
+        stored = set(
+            MediaBlob.objects.filter(name__in=orphans).values_list("name", flat=True)
+        )
+        orphans = [name for name in orphans if name not in stored]
+        MediaTombstone.objects.bulk_create(
+            [MediaTombstone(name=name) for name in orphans], ignore_conflicts=True
+        )
+    if orphans:
+        schedule_media_cleanup()
+
+    logger.info("Tombstoned %s orphaned media objects", len(orphans))
+    return len(orphans)
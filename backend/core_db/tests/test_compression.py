@@ -0,0 +1,28 @@
+"""Test Cases for the compressed response cache"""
+
+# pylint: skip-file
+
+from django.test import SimpleTestCase
+from django.test.client import RequestFactory
+from backend.compression import accepted_coding
+
+
+class AcceptedCodingTests(SimpleTestCase):
+    """Test the negotiation of the content coding"""
+
+    def coding(self, accept_encoding):
+        request = RequestFactory().get("/", HTTP_ACCEPT_ENCODING=accept_encoding)
+        return accepted_coding(request)
+
+    def test_preference(self):
+        """Equal qualities pick the preferred coding, higher qualities win"""
+        self.assertEqual(self.coding("gzip, deflate, br, zstd"), "br")
+        self.assertEqual(self.coding("gzip, zstd"), "zstd")
+        self.assertEqual(self.coding("br;q=0.5, gzip"), "gzip")
+        self.assertEqual(self.coding("*;q=0.1, br;q=0"), "zstd")
+
+    def test_uncompressed(self):
+        """No acceptable coding sends the body uncompressed"""
+        self.assertIsNone(accepted_coding(RequestFactory().get("/")))
+        self.assertIsNone(self.coding("identity, deflate"))
+        self.assertIsNone(self.coding("gzip;q=0, br;q=invalid"))
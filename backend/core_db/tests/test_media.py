@@ -0,0 +1,93 @@
+"""Test Cases for the media view"""
+
+# pylint: skip-file
+
+import os
+import shutil
+import tempfile
+from django.contrib.auth import get_user_model
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.test import TestCase, override_settings
+from django.utils.http import http_date
+from rest_framework.test import APIRequestFactory, force_authenticate
+from core_db.views import MediaView
+
+
+class MediaViewTests(TestCase):
+    """Test the local media files sent by the front proxy"""
+
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root, ignore_errors=True)
+        settings_override = override_settings(
+            MEDIA_ROOT=self.media_root, MEDIA_URL="/media/"
+        )
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        self.factory = APIRequestFactory()
+        self.name = default_storage.save("profile_images/a.png", ContentFile(b"png"))
+
+    def get(self, path, user=None, **headers):
+        request = self.factory.get(f"/media/{path}", **headers)
+        if user is not None:
+            force_authenticate(request, user=user)
+        return MediaView.as_view()(request, path=path)
+
+    def store(self, name):
+        """Write a file that was not content addressed"""
+        path = os.path.join(self.media_root, name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "wb") as stored:
+            stored.write(b"content")
+        return name
+
+    def test_file_response(self):
+        """Without a proxy header the file is streamed, immutable when hashed"""
+        res = self.get(self.name)
+
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(b"".join(res.streaming_content), b"png")
+        self.assertEqual(res["Content-Type"], "image/png")
+        self.assertEqual(res["Cache-Control"], "max-age=31536000, immutable, public")
+
+    @override_settings(MEDIA_SENDFILE_HEADER="X-Accel-Redirect")
+    def test_accel_redirect(self):
+        """nginx is handed the internal location of the file"""
+        res = self.get(self.name)
+
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(res.content, b"")
+        self.assertEqual(res["X-Accel-Redirect"], f"/protected-media/{self.name}")
+
+    @override_settings(MEDIA_SENDFILE_HEADER="X-Sendfile")
+    def test_sendfile(self):
+        """Apache is handed the path of the file"""
+        res = self.get(self.name)
+
+        self.assertEqual(res["X-Sendfile"], os.path.join(self.media_root, self.name))
+
+    def test_not_modified(self):
+        """Unchanged files are not sent again"""
+        modified = os.stat(default_storage.path(self.name)).st_mtime
+
+        res = self.get(self.name, HTTP_IF_MODIFIED_SINCE=http_date(modified))
+
+        self.assertEqual(res.status_code, 304)
+
+    def test_protected_media(self):
+        """Files outside the public prefixes need an authenticated user"""
+        name = self.store("private/report.txt")
+        user = get_user_model().objects.create_user(
+            email="one@example.com", password="Testpass123!"
+        )
+
+        self.assertEqual(self.get(name).status_code, 401)
+        res = self.get(name, user=user)
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(res["Cache-Control"], "no-cache, private")
+
+    def test_missing_file(self):
+        """Missing files and paths outside MEDIA_ROOT are not found"""
+        self.assertEqual(self.get("profile_images/missing.png").status_code, 404)
+        self.assertEqual(self.get("profile_images/../../etc/passwd").status_code, 404)
@@ -0,0 +1,102 @@
+"""Test Cases for the orjson renderer and parser"""
+
+# pylint: skip-file
+
+import io
+import json
+import uuid
+import decimal
+import datetime
+from django.test import SimpleTestCase
+from django.utils.translation import gettext_lazy
+from phonenumber_field.phonenumber import PhoneNumber
+from rest_framework.exceptions import ParseError
+from rest_framework.parsers import JSONParser
+from rest_framework.renderers import JSONRenderer
+from rest_framework.response import Response
+from backend.parsers import ORJSONParser
+from backend.renderers import ViewRenderer
+
+
+def render(data, status_code=200, accepted_media_type="application/json"):
+    """Render data as ViewRenderer would for a response with the status"""
+    context = {"response": Response(status=status_code)}
+    return ViewRenderer().render(data, accepted_media_type, context)
+
+
+class ViewRendererTests(SimpleTestCase):
+    """Test the orjson ViewRenderer"""
+
+    def test_same_output_as_drf(self):
+        """Rich types are written as DRF's JSON encoder writes them"""
+        data = {
+            "created_at": datetime.datetime(
+                2025, 1, 2, 3, 4, 5, 678000, tzinfo=datetime.timezone.utc
+            ),
+            "local": datetime.datetime(2025, 1, 2, 3, 4, 5),
+            "day": datetime.date(2025, 1, 2),
+            "price": decimal.Decimal("12.50"),
+            "message": gettext_lazy("Image uploaded successfully."),
+            "id": uuid.UUID("12345678-1234-5678-1234-567812345678"),
+            "duration": datetime.timedelta(minutes=1),
+            "name": "café\u2028",
+            1: [None, True, 1.5],
+        }
+
+        rendered = render(data)
+
+        self.assertEqual(json.loads(rendered), json.loads(JSONRenderer().render(data)))
+        self.assertIn("café".encode(), rendered)
+        self.assertIn(b"\\u2028", rendered)
+
+    def test_phone_number(self):
+        """Phone numbers are written in their configured format"""
+        rendered = render({"phone": PhoneNumber.from_string("+14155552671")})
+
+        self.assertEqual(json.loads(rendered), {"phone": "+14155552671"})
+
+    def test_error_envelope(self):
+        """Error payloads keep the errors envelope"""
+        self.assertEqual(
+            json.loads(render({"error": "Invalid"}, 400)), {"errors": "Invalid"}
+        )
+        self.assertEqual(
+            json.loads(render({"detail": "Not found."}, 404)),
+            {"errors": "Not found."},
+        )
+        self.assertEqual(
+            json.loads(render({"email": ["Required."]}, 400)),
+            {"errors": {"email": ["Required."]}},
+        )
+        self.assertEqual(
+            json.loads(render({"errors": "Locked"}, 423)), {"errors": "Locked"}
+        )
+
+    def test_indent(self):
+        """Indented output is requested with the media type"""
+        rendered = render({"a": 1}, accepted_media_type="application/json; indent=4")
+
+        self.assertEqual(rendered, b'{\n  "a": 1\n}')
+
+    def test_empty(self):
+        """No data renders an empty body"""
+        self.assertEqual(render(None), b"")
+
+
+class ORJSONParserTests(SimpleTestCase):
+    """Test the orjson parser"""
+
+    def test_parse(self):
+        """Bodies parse as with DRF's parser"""
+        body = '{"email": "café@example.com", "ids": [1, 2.5, null]}'.encode()
+
+        self.assertEqual(
+            ORJSONParser().parse(io.BytesIO(body)),
+            JSONParser().parse(io.BytesIO(body)),
+        )
+
+    def test_invalid(self):
+        """Invalid JSON, NaN included, is a parse error"""
+        for body in (b"{", b'{"a": NaN}'):
+            with self.assertRaises(ParseError):
+                ORJSONParser().parse(io.BytesIO(body))
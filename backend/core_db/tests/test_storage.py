@@ -0,0 +1,394 @@
+"""Test Cases for the content addressed storage"""
+
+# pylint: skip-file
+
+import io
+import os
+import time
+import shutil
+import hashlib
+import tempfile
+import boto3
+from datetime import timedelta
+from unittest.mock import patch
+from moto import mock_aws
+from PIL import Image
+from django.contrib.auth import get_user_model
+from django.core.files.base import ContentFile
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.files.storage import default_storage
+from django.test import TestCase, RequestFactory, override_settings
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.test import APIClient
+from django.db import transaction
+from core_db.models import MediaBlob, MediaTombstone
+from core_db.tasks import delete_tombstoned_media, scan_orphaned_media
+from storages.backends.s3 import S3Storage
+from core_db.storage import (
+    IMMUTABLE_CACHE_CONTROL,
+    ContentAddressedFileSystemStorage,
+    MediaURLs,
+)
+
+BUCKET = "media-bucket"
+
+
+def png_bytes(color="red"):
+    """PNG image of one color"""
+    output = io.BytesIO()
+    Image.new("RGB", (100, 100), color).save(output, "PNG")
+    return output.getvalue()
+
+
+class ContentAddressedStorageTests(TestCase):
+    """Test the reference counted content addressed storage"""
+
+    def setUp(self):
+        self.location = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.location, ignore_errors=True)
+        settings_override = override_settings(
+            MEDIA_ROOT=self.location, MEDIA_URL="/media/"
+        )
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        self.storage = default_storage
+
+    def test_content_name(self):
+        """Files are named after the SHA-256 of their content"""
+        digest = hashlib.sha256(b"content").hexdigest()
+
+        name = self.storage.save("profile_images/Avatar.PNG", ContentFile(b"content"))
+
+        self.assertEqual(name, f"profile_images/{digest[:2]}/{digest}.png")
+        self.assertEqual(MediaBlob.objects.get(name=name).size, 7)
+
+    def test_duplicate_save(self):
+        """Saving the same content again only counts a reference"""
+        first = self.storage.save("images/a.png", ContentFile(b"content"))
+        second = self.storage.save("images/b.png", ContentFile(b"content"))
+
+        self.assertEqual(first, second)
+        self.assertEqual(MediaBlob.objects.get(name=first).ref_count, 2)
+        self.assertEqual(len(self.storage.listdir(f"images/{first[7:9]}")[1]), 1)
+
+    def test_delete_last_reference(self):
+        """The file is deleted with its last reference"""
+        name = self.storage.save("images/a.png", ContentFile(b"content"))
+        self.storage.save("images/b.png", ContentFile(b"content"))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.storage.delete(name)
+        self.assertTrue(self.storage.exists(name))
+        self.assertEqual(MediaBlob.objects.get(name=name).ref_count, 1)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.storage.delete(name)
+            # Deleted once the transaction is committed
+            self.assertTrue(self.storage.exists(name))
+            self.assertTrue(MediaTombstone.objects.filter(name=name).exists())
+        self.assertFalse(self.storage.exists(name))
+        self.assertFalse(MediaBlob.objects.filter(name=name).exists())
+        self.assertFalse(MediaTombstone.objects.exists())
+
+    def test_delete_rolled_back(self):
+        """Files released in a rolled back transaction are kept"""
+        name = self.storage.save("images/a.png", ContentFile(b"content"))
+
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            with self.assertRaises(RuntimeError), transaction.atomic():
+                self.storage.delete(name)
+                raise RuntimeError
+
+        self.assertEqual(callbacks, [])
+        self.assertTrue(self.storage.exists(name))
+        self.assertFalse(MediaTombstone.objects.exists())
+
+    def test_saved_again_before_deletion(self):
+        """Content stored again before its deletion is kept"""
+        name = self.storage.save("images/a.png", ContentFile(b"content"))
+        self.storage.delete(name)
+
+        self.assertEqual(
+            self.storage.save("images/b.png", ContentFile(b"content")), name
+        )
+        delete_tombstoned_media()
+
+        self.assertTrue(self.storage.exists(name))
+        self.assertFalse(MediaTombstone.objects.exists())
+
+    def test_saved_again_while_deleted(self):
+        """A save waits for a cleanup deleting the same content, then writes it"""
+        name = self.storage.save("images/a.png", ContentFile(b"content"))
+        self.storage.delete(name)
+        MediaTombstone.objects.update(claimed_at=timezone.now())
+
+        def cleanup_finished(seconds):
+            self.storage.purge([name])
+            MediaTombstone.objects.all().delete()
+
+        with patch("core_db.storage.time.sleep", side_effect=cleanup_finished):
+            self.storage.save("images/b.png", ContentFile(b"content"))
+
+        self.assertTrue(self.storage.exists(name))
+        self.assertEqual(MediaBlob.objects.get(name=name).ref_count, 1)
+
+    def test_failed_deletion_requeued(self):
+        """Objects are deleted outside the claim, failures are queued again"""
+        name = self.storage.save("images/a.png", ContentFile(b"content"))
+        self.storage.delete(name)
+
+        def purge(names):
+            # Claimed before the deletion starts
+            self.assertIsNotNone(MediaTombstone.objects.get(name=name).claimed_at)
+            return []
+
+        with patch.object(self.storage, "purge", side_effect=purge):
+            stats = delete_tombstoned_media()
+
+        self.assertEqual(stats, {"deleted": 0, "failed": 1})
+        self.assertIsNone(MediaTombstone.objects.get(name=name).claimed_at)
+        self.assertTrue(self.storage.exists(name))
+
+    def test_delete_unreferenced_name(self):
+        """Files that were not saved by the storage are deleted directly"""
+        with open(f"{self.location}/legacy.png", "wb") as legacy:
+            legacy.write(b"content")
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.storage.delete("legacy.png")
+
+        self.assertFalse(self.storage.exists("legacy.png"))
+
+    def test_upload_handler_digest(self):
+        """Uploads are hashed while received"""
+        factory = RequestFactory()
+        request = factory.post(
+            "/", {"file": SimpleUploadedFile("a.png", b"content", "image/png")}
+        )
+
+        uploaded = request.FILES["file"]
+
+        self.assertEqual(uploaded.sha256, hashlib.sha256(b"content").hexdigest())
+
+
+class SharedProfileImageTests(TestCase):
+    """Test profile images shared between users"""
+
+    def setUp(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root, ignore_errors=True)
+        settings_override = override_settings(
+            MEDIA_ROOT=media_root, MEDIA_URL="/media/"
+        )
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        self.client = APIClient()
+
+    def upload(self, user, color="red"):
+        self.client.force_authenticate(user=user)
+        image = SimpleUploadedFile("avatar.png", png_bytes(color), "image/png")
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.patch(
+                reverse("user-upload-image", args=[user.id]), {"profile_img": image}
+            )
+        user.refresh_from_db()
+
+    def test_same_image_stored_once(self):
+        """Users uploading the same image share one file until both replace it"""
+        users = [
+            get_user_model().objects.create_user(
+                email=email, username=email, password="Testpass123!"
+            )
+            for email in ("one@example.com", "two@example.com")
+        ]
+        for user in users:
+            self.upload(user)
+        name = users[0].profile_img.name
+
+        self.assertEqual(users[1].profile_img.name, name)
+        self.assertEqual(MediaBlob.objects.get(name=name).ref_count, 2)
+
+        self.upload(users[0], color="blue")
+        self.assertTrue(default_storage.exists(name))
+
+        self.upload(users[1], color="blue")
+        self.assertFalse(default_storage.exists(name))
+
+    def test_same_image_uploaded_again(self):
+        """Uploading the current image again keeps it"""
+        user = get_user_model().objects.create_user(
+            email="one@example.com", username="one@example.com", password="Pass123!"
+        )
+        self.upload(user)
+        self.upload(user)
+
+        self.assertTrue(default_storage.exists(user.profile_img.name))
+        self.assertEqual(MediaBlob.objects.get(name=user.profile_img.name).ref_count, 1)
+
+
+@override_settings(
+    STORAGES={
+        "default": {
+            "BACKEND": "core_db.storage.ContentAddressedS3Storage",
+            "OPTIONS": {
+                "bucket_name": BUCKET,
+                "region_name": "us-east-1",
+                "access_key": "testing",
+                "secret_key": "testing",
+            },
+        },
+        "staticfiles": {
+            "BACKEND": "django.contrib.staticfiles.storage.StaticFilesStorage",
+        },
+    }
+)
+class ContentAddressedS3StorageTests(TestCase):
+    """Test the content addressed storage against a mocked S3"""
+
+    def setUp(self):
+        mock = mock_aws()
+        mock.start()
+        self.addCleanup(mock.stop)
+        self.s3 = boto3.client("s3", region_name="us-east-1")
+        self.s3.create_bucket(Bucket=BUCKET)
+
+    def test_immutable_cache_control(self):
+        """Objects are stored once with far-future cache headers"""
+        name = default_storage.save("images/a.png", ContentFile(b"content"))
+        default_storage.save("images/b.png", ContentFile(b"content"))
+
+        head = self.s3.head_object(Bucket=BUCKET, Key=name)
+
+        self.assertEqual(head["CacheControl"], IMMUTABLE_CACHE_CONTROL)
+        self.assertEqual(self.s3.list_objects_v2(Bucket=BUCKET)["KeyCount"], 1)
+
+    def test_batched_deletion(self):
+        """Tombstoned objects are deleted with batched DeleteObjects requests"""
+        names = [
+            default_storage.save(f"images/{i}.png", ContentFile(f"{i}".encode()))
+            for i in range(5)
+        ]
+        for name in names:
+            default_storage.delete(name)
+        client = default_storage.connection.meta.client
+
+        with patch("core_db.storage.DELETE_OBJECTS_MAX_KEYS", 2), patch.object(
+            client, "delete_objects", wraps=client.delete_objects
+        ) as delete_objects:
+            stats = delete_tombstoned_media()
+
+        self.assertEqual(stats, {"deleted": 5, "failed": 0})
+        self.assertEqual(delete_objects.call_count, 3)
+        self.assertEqual(self.s3.list_objects_v2(Bucket=BUCKET)["KeyCount"], 0)
+        self.assertFalse(MediaTombstone.objects.exists())
+
+
+class OrphanedMediaScanTests(TestCase):
+    """Test the scan of the media nothing references"""
+
+    def setUp(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root, ignore_errors=True)
+        settings_override = override_settings(
+            MEDIA_ROOT=media_root, MEDIA_URL="/media/"
+        )
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+    def store(self, name, age_days=2):
+        """Write a file directly, as a direct upload would"""
+        path = default_storage.path(name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "wb") as stored:
+            stored.write(b"content")
+        modified = time.time() - age_days * 24 * 60 * 60
+        os.utime(path, (modified, modified))
+        return name
+
+    def test_scan(self):
+        """Old unreferenced files are deleted, referenced and recent ones kept"""
+        abandoned = self.store("profile_images/uploads/1/abandoned.png")
+        recent = self.store("profile_images/uploads/1/recent.png", age_days=0)
+        default = self.store("profile_images/default_profile.jpg")
+        current = self.store("profile_images/uploads/2/current.png")
+        variant = self.store("profile_images/variants/current_64.webp")
+        get_user_model().objects.create_user(
+            email="one@example.com",
+            password="Testpass123!",
+            profile_img=current,
+            profile_img_variants={"source": current, "64": {"webp": variant}},
+        )
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(scan_orphaned_media(), 1)
+
+        self.assertFalse(default_storage.exists(abandoned))
+        for name in (recent, default, current, variant):
+            self.assertTrue(default_storage.exists(name))
+
+    def test_scan_leaked_reference(self):
+        """Counted files nothing refers to are deleted once the count is old"""
+        leaked = default_storage.save("profile_images/a.png", ContentFile(b"leaked"))
+        recent = default_storage.save("profile_images/b.png", ContentFile(b"recent"))
+        old = time.time() - 2 * 24 * 60 * 60
+        for name in (leaked, recent):
+            os.utime(default_storage.path(name), (old, old))
+        MediaBlob.objects.filter(name=leaked).update(
+            updated_at=timezone.now() - timedelta(days=2)
+        )
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(scan_orphaned_media(), 1)
+
+        self.assertFalse(default_storage.exists(leaked))
+        self.assertFalse(MediaBlob.objects.filter(name=leaked).exists())
+        self.assertTrue(default_storage.exists(recent))
+        self.assertTrue(MediaBlob.objects.filter(name=recent).exists())
+
+
+class MediaURLsTests(TestCase):
+    """Test the memoized media URLs"""
+
+    def setUp(self):
+        MediaURLs.clear()
+        self.addCleanup(MediaURLs.clear)
+
+    def test_public_urls(self):
+        """Public storages resolve their prefix once"""
+        storage = ContentAddressedFileSystemStorage(base_url="/media/")
+        names = [f"profile_images/{i} a.png" for i in range(3)]
+
+        with patch.object(storage, "url", wraps=storage.url) as url:
+            urls = [MediaURLs.url(name, storage) for name in names]
+
+        self.assertEqual(url.call_count, 1)
+        self.assertEqual(urls, [storage.url(name) for name in names])
+
+    def test_signed_urls(self):
+        """Signed URLs are memoized for less than their expiry"""
+        storage = S3Storage(
+            bucket_name=BUCKET,
+            region_name="us-east-1",
+            access_key="testing",
+            secret_key="testing",
+            querystring_expire=120,
+        )
+
+        with patch.object(storage, "url", wraps=storage.url) as url:
+            first = MediaURLs.url("images/a.png", storage)
+            self.assertEqual(MediaURLs.url("images/a.png", storage), first)
+            self.assertEqual(url.call_count, 1)
+
+            with patch("core_db.storage.time.monotonic", return_value=1e12):
+                MediaURLs.url("images/a.png", storage)
+            self.assertEqual(url.call_count, 2)
+
+        self.assertIn("Signature=", first)
+
+    def test_settings_change(self):
+        """Resolved prefixes are forgotten with the media settings"""
+        with override_settings(MEDIA_URL="/first/"):
+            self.assertEqual(MediaURLs.url("a.png"), "/first/a.png")
+        with override_settings(MEDIA_URL="/second/"):
+            self.assertEqual(MediaURLs.url("a.png"), "/second/a.png")
@@ -0,0 +1,80 @@
+"""Test Cases for Tasks"""
+
+# pylint: skip-file
+
+from datetime import timedelta
+from unittest.mock import patch
+from django.test import TestCase, override_settings
+from django.utils import timezone
+from django.core.cache import cache
+from django.contrib.auth import get_user_model
+from rest_framework_simplejwt.token_blacklist.models import (
+    BlacklistedToken,
+    OutstandingToken,
+)
+from core_db.tasks import TOKEN_CLEANUP_CURSOR_KEY, cleanup_expired_tokens
+
+
+@override_settings(TOKEN_CLEANUP_PAUSE_SECONDS=0)
+class CleanupExpiredTokensTests(TestCase):
+    """Test the expired token cleanup"""
+
+    def setUp(self):
+        cache.delete(TOKEN_CLEANUP_CURSOR_KEY)
+        self.user = get_user_model().objects.create_user(
+            email="tokens@example.com", password="Django@123"
+        )
+        now = timezone.now()
+        self.expired = [self.create_token(f"expired-{i}", now) for i in range(5)]
+        self.valid = [self.create_token(f"valid-{i}", now, days=1) for i in range(2)]
+        for token in self.expired[:3] + self.valid[:1]:
+            BlacklistedToken.objects.create(token=token)
+
+    def tearDown(self):
+        cache.delete(TOKEN_CLEANUP_CURSOR_KEY)
+
+    def create_token(self, jti, now, days=-1):
+        return OutstandingToken.objects.create(
+            user=self.user,
+            jti=jti,
+            token=jti,
+            created_at=now,
+            expires_at=now + timedelta(days=days),
+        )
+
+    def test_deletes_expired_tokens_in_batches(self):
+        """Expired tokens and their blacklist entries are deleted in chunks"""
+        stats = cleanup_expired_tokens(batch_size=2)
+
+        self.assertTrue(stats["finished"])
+        self.assertEqual(stats["batches"], 3)
+        self.assertEqual(stats["outstanding"], 5)
+        self.assertEqual(stats["blacklisted"], 3)
+        self.assertEqual(
+            set(OutstandingToken.objects.values_list("jti", flat=True)),
+            {"valid-0", "valid-1"},
+        )
+        self.assertEqual(BlacklistedToken.objects.count(), 1)
+        self.assertIsNone(cache.get(TOKEN_CLEANUP_CURSOR_KEY))
+
+    def test_chunk_queries(self):
+        """Each chunk is one id query, the chunk's rows and two deletes"""
+        # ids, chunk rows, cascaded and chunk deletes, then the empty ids query
+        with self.assertNumQueries(5):
+            cleanup_expired_tokens(batch_size=10)
+
+    @patch("core_db.tasks.cleanup_expired_tokens.apply_async")
+    def test_time_budget_continues_in_new_task(self, mock_apply_async):
+        """A run over its time budget stops and resumes from the cursor"""
+        stats = cleanup_expired_tokens(batch_size=2, max_seconds=-1)
+
+        self.assertFalse(stats["finished"])
+        self.assertEqual(stats["outstanding"], 2)
+        self.assertEqual(cache.get(TOKEN_CLEANUP_CURSOR_KEY), self.expired[1].id)
+        mock_apply_async.assert_called_once()
+
+        stats = cleanup_expired_tokens(batch_size=2)
+
+        self.assertTrue(stats["finished"])
+        self.assertEqual(stats["outstanding"], 3)
+        self.assertEqual(OutstandingToken.objects.count(), 2)
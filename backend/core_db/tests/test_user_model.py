@@ -332,5 +332,8 @@ class UserModelImageTests(TestCase):
         self.image_path = os.path.join(settings.MEDIA_ROOT, self.user.profile_img.name)
 
         self.assertTrue(self.user.profile_img)
-        self.assertEqual(self.user.profile_img.name, "profile_images/test_image.jpg")
+        # Stored under the SHA-256 of its content
+        self.assertRegex(
+            self.user.profile_img.name, r"^profile_images/\w{2}/\w{64}\.jpg$"
+        )
         self.assertTrue(os.path.exists(self.image_path))
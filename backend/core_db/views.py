@@ -0,0 +1,71 @@
+"""Local media files, authorized by Django and sent by the front proxy."""
+
+import os
+import mimetypes
+from urllib.parse import quote
+from django.conf import settings
+from django.core.exceptions import SuspiciousFileOperation
+from django.http import FileResponse, Http404, HttpResponse, HttpResponseNotModified
+from django.utils._os import safe_join
+from django.utils.cache import patch_cache_control
+from django.utils.http import http_date
+from django.views.static import was_modified_since
+from drf_spectacular.utils import extend_schema
+from rest_framework.exceptions import NotAuthenticated
+from rest_framework.permissions import AllowAny
+from rest_framework.views import APIView
+from .storage import IMMUTABLE_MAX_AGE, is_content_name
+
+
+class MediaView(APIView):
+    """Media file under MEDIA_ROOT.
+
+    Files outside MEDIA_PUBLIC_PREFIXES need an authenticated user. The
+    transfer is handed to the front proxy with MEDIA_SENDFILE_HEADER
+    (X-Accel-Redirect for nginx, X-Sendfile for Apache or lighttpd), without
+    it the file is returned as a FileResponse, sent with the server's
+    file_wrapper (sendfile) when it has one. Content hash names are immutable.
+    """
+
+    permission_classes = [AllowAny]
+
+    @extend_schema(exclude=True)
+    def get(self, request, path):
+        """Send the media file at path."""
+        public = path.startswith(settings.MEDIA_PUBLIC_PREFIXES)
+        if not public and not request.user.is_authenticated:
+            raise NotAuthenticated()
+
+        try:
+            full_path = safe_join(settings.MEDIA_ROOT, path)
+        except SuspiciousFileOperation as e:
+            raise Http404("Media file not found.") from e
+        if not os.path.isfile(full_path):
+            raise Http404("Media file not found.")
+
+        modified = os.stat(full_path).st_mtime
+        header = settings.MEDIA_SENDFILE_HEADER
+        content_type = mimetypes.guess_type(full_path)[0] or "application/octet-stream"
+
+        if not was_modified_since(request.META.get("HTTP_IF_MODIFIED_SINCE"), modified):
+            response = HttpResponseNotModified()
+        elif header == "X-Accel-Redirect":
+            response = HttpResponse(content_type=content_type)
+            response[header] = settings.MEDIA_ACCEL_REDIRECT_PREFIX + quote(path)
+        elif header:
+            response = HttpResponse(content_type=content_type)
+            response[header] = full_path
+        else:
+            # pylint: disable=R1732
+            response = FileResponse(open(full_path, "rb"), content_type=content_type)
+
+        response["Last-Modified"] = http_date(modified)
+        visibility = {"public": True} if public else {"private": True}
+        if is_content_name(path):
+            # The content of a hash name never changes
+            patch_cache_control(
+                response, max_age=IMMUTABLE_MAX_AGE, immutable=True, **visibility
+            )
+        else:
+            patch_cache_control(response, no_cache=True, **visibility)
+        return response
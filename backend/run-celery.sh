@@ -25,5 +25,5 @@ infisical run --path="/Sphere/backend" -- sh -c '
 
   # Start Celery worker
   echo "Starting Celery worker..."
-  celery -A backend worker --loglevel=info --uid nobody
+  celery -A backend worker -Q celery,email,media --loglevel=info --uid nobody
 '
\ No newline at end of file